@@ -18,9 +18,13 @@ from urllib.parse import urlsplit, urlunsplit
 import requests
 from requests.auth import HTTPBasicAuth
 
+from model import parse_fleet
+
 from .event_handler import GameEventHandler
 from .client import GameClient
+from .board_view import BOARD_SIZE
 from .gui import GUI
+from .wire import JSON_PROTOCOL, BINARY_PROTOCOL
 
 DEFAULT_URL = "ws://127.0.0.1:10020"
 
@@ -30,6 +34,12 @@ def parse_args():
     parser.add_argument("-u", "--uid", help="user ID for the API server")
     parser.add_argument("-p", "--password", help="password for the API server")
     parser.add_argument("-g", "--game-url", default=DEFAULT_URL, help="URL for the game")
+    parser.add_argument("--rows", type=int, default=BOARD_SIZE, help="number of rows on each board")
+    parser.add_argument("--cols", type=int, default=BOARD_SIZE, help="number of columns on each board")
+    parser.add_argument("--fleet", default="",
+                        help="ships to place as comma-separated name:size items (default: classic fleet)")
+    parser.add_argument("--protocol", choices=(JSON_PROTOCOL, BINARY_PROTOCOL), default=JSON_PROTOCOL,
+                        help="encoding of messages exchanged with the game server")
     args = parser.parse_args()
     if args.uid or args.password:
         if not args.uid or not args.password:
@@ -97,15 +107,17 @@ if __name__ == "__main__":
     event_handler = GameEventHandler()
 
     # Create a GameClient instance, and set its `on_event` callback to our event handler.
-    client = GameClient(url=server_url, token=token, on_event=event_handler.handle_event)
+    client = GameClient(url=server_url, token=token, on_event=event_handler.handle_event, protocol=args.protocol)
     # Start the client -- it runs its own service thread and returns here immediately
     client.start()
+    # Catch up on a game already in progress (for example, after restarting the GUI)
+    client.send_resume(event_handler.last_seq)
 
     # Create our GUI.
     # The GUI gets a reference to our client, and to the event handler that it will use
     # to receive in-game events. We also pass the player name so that it can be displayed
     # in the window title.
-    gui = GUI(client, event_handler, player_name)
+    gui = GUI(client, event_handler, player_name, rows=args.rows, cols=args.cols, fleet=parse_fleet(args.fleet))
 
     # We run the GUI on the main thread.
     # We won't return here until the GUI exits.
@@ -2,6 +2,9 @@ import pygame
 
 # Constants for drawing
 GRID_SIZE = 40
+BOARD_SIZE = 10
+# Largest width or height (in pixels) a board may take up in the window
+MAX_BOARD_PIXELS = 400
 HIT_COLOR = (255, 0, 0)     # Red
 MISS_COLOR = (0, 0, 255)    # Blue
 SHIP_COLOR = (0, 255, 0)    # Green
@@ -9,26 +12,42 @@ EMPTY_COLOR = (255, 255, 255)  # White
 LINE_COLOR = (0, 0, 0)      # Black
 
 class BoardView:
-    def __init__(self, surface, client, is_player_board=True, top_left=(0, 0)):
+    def __init__(self, surface, client, is_player_board=True, top_left=(0, 0),
+                 rows=BOARD_SIZE, cols=BOARD_SIZE):
         """
-        Initialize a visual 10x10 board grid.
+        Initialize a visual board grid.
         :param surface: Pygame surface to draw on
         :param client: GameClient for sending attacks
         :param is_player_board: True for player board, False for opponent
         :param top_left: Top-left position (x, y) for drawing the board
+        :param rows: Number of rows on the board
+        :param cols: Number of columns on the board
         """
         self.surface = surface
         self.client = client
         self.is_player_board = is_player_board
         self.top_left = top_left  # Where to draw this board
-        self.board = [["empty" for _ in range(10)] for _ in range(10)]
+        self.rows = rows
+        self.cols = cols
+        # Shrink the cells of large boards so that the whole board fits in the window
+        self.cell_size = max(1, min(GRID_SIZE, MAX_BOARD_PIXELS // max(rows, cols)))
+        self.board = [["empty" for _ in range(cols)] for _ in range(rows)]
         self.ships = []
 
+    def cell_at(self, x, y):
+        """Returns the (row, col) under window position (x, y), or None if it's off the board."""
+        offset_x, offset_y = self.top_left
+        row = (y - offset_y) // self.cell_size
+        col = (x - offset_x) // self.cell_size
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row, col
+        return None
+
     def draw(self):
         """Draw the board with all states."""
         offset_x, offset_y = self.top_left
-        for row in range(10):
-            for col in range(10):
+        for row in range(self.rows):
+            for col in range(self.cols):
                 cell = self.board[row][col]
 
                 # Determine color
@@ -42,10 +61,10 @@ class BoardView:
                     color = EMPTY_COLOR
 
                 # Compute position and draw cell
-                x = offset_x + col * GRID_SIZE
-                y = offset_y + row * GRID_SIZE
-                pygame.draw.rect(self.surface, color, pygame.Rect(x, y, GRID_SIZE, GRID_SIZE))
-                pygame.draw.rect(self.surface, LINE_COLOR, pygame.Rect(x, y, GRID_SIZE, GRID_SIZE), 1)
+                x = offset_x + col * self.cell_size
+                y = offset_y + row * self.cell_size
+                pygame.draw.rect(self.surface, color, pygame.Rect(x, y, self.cell_size, self.cell_size))
+                pygame.draw.rect(self.surface, LINE_COLOR, pygame.Rect(x, y, self.cell_size, self.cell_size), 1)
 
     def handle_attack(self, row, col):
         """Send an attack to the server."""
@@ -60,10 +79,10 @@ class BoardView:
         horizontal = ship['horizontal']
 
         # Ensure the ship fits on the board
-        if horizontal and col + size > 10:
+        if horizontal and col + size > self.cols:
             print(f"Ship '{ship['name']}' doesn't fit horizontally at ({row},{col})")
             return
-        if not horizontal and row + size > 10:
+        if not horizontal and row + size > self.rows:
             print(f"Ship '{ship['name']}' doesn't fit vertically at ({row},{col})")
             return
 
@@ -75,7 +94,7 @@ class BoardView:
                 c += i
             else:
                 r += i
-            if 0 <= r < 10 and 0 <= c < 10:
+            if 0 <= r < self.rows and 0 <= c < self.cols:
                 self.board[r][c] = "ship"
 
         self.ships.append(ship)
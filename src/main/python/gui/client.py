@@ -3,9 +3,16 @@
 # This module defines the GameClient class.
 #
 
+import json
+import logging
+
 import gamecomm.client
+from gamecomm.client import ConnectionClosed
 
 from .protocol import EVENT_KEY, STATUS_KEY, OK_STATUS
+from .wire import JSON_PROTOCOL, BINARY_PROTOCOL, encode_command, decode_message
+
+logger = logging.getLogger(__name__)
 
 
 class GameClient(gamecomm.client.GameClient):
@@ -13,10 +20,54 @@ class GameClient(gamecomm.client.GameClient):
     Minimal GameClient implementation that simply implements the methods
     necessary to distinguish events from command responses received via
     the client's WebSocket connection.
+
+    With `protocol` set to BINARY_PROTOCOL, the client asks the server for the
+    compact binary encoding (see wire.py) when it starts, and sends its attack
+    commands in that encoding too. Messages are decoded according to the type
+    of frame they arrive in, so it doesn't matter when the server switches.
     """
 
-    def __init__(self, url, token=None, on_event=None):
+    def __init__(self, url, token=None, on_event=None, protocol: str = JSON_PROTOCOL):
         super().__init__(url, token, on_event)
+        self.protocol = protocol
+
+    def start(self):
+        super().start()
+        if self.protocol != JSON_PROTOCOL:
+            self.send({ "command": "set_protocol", "protocol": self.protocol })
+
+    def send(self, message: dict, on_success=None, on_error=None):
+        """Sends a request to the server, encoded in the client's protocol."""
+        if self.protocol == BINARY_PROTOCOL:
+            with self._lock:
+                self._connection.send(encode_command(message))
+                self._pending_requests.append((on_success, on_error))
+        else:
+            super().send(message, on_success, on_error)
+
+    def _decode(self, message_data) -> dict:
+        if isinstance(message_data, bytes):
+            return decode_message(message_data)
+        return json.loads(message_data)
+
+    def _run(self):
+        # As in the parent class, but binary frames are decoded too
+        message_data = None
+        while not self._shutdown.is_set():
+            try:
+                message_data = self._connection.recv(self.RECV_TIMEOUT_SECONDS)
+                if message_data:
+                    message = self._decode(message_data)
+                    if self.is_event(message) and self.on_event:
+                        self.on_event(message)
+                    else:
+                        self._handle_response(message)
+            except KeyError as err:
+                logger.error(f"error processing message: {err}: {message_data}")
+            except ValueError as err:
+                logger.error(f"error decoding message: {err}: {message_data}")
+            except ConnectionClosed:
+                break
 
     def is_event(self, message: dict):
         """
@@ -52,3 +103,31 @@ class GameClient(gamecomm.client.GameClient):
         """Send an attack command to the server."""
         return self.send({ "command": "attack", "row": row, "col": col })
 
+    def send_add_bot(self):
+        """Ask the server to seat a computer opponent in this game."""
+        return self.send({ "command": "add_bot" })
+
+    def send_attack_batch(self, cells: list[tuple[int, int]]):
+        """Send a salvo of attacks to the server, resolved as a single move."""
+        return self.send({ "command": "attack_batch", "cells": [list(cell) for cell in cells] })
+
+    def send_resume(self, seq: int):
+        """
+        Ask the server for the events since the one numbered `seq`, or for a
+        snapshot of the game if it no longer has them all.
+        """
+        return self.send({ "command": "resume", "seq": seq })
+
+    def send_get_state(self, since: int = None, on_success=None):
+        """
+        Ask the server for the state of the boards, or only for the cells that
+        changed after the event numbered `since`; `on_success` receives the response.
+        """
+        message = { "command": "get_state" }
+        if since is not None:
+            message["since"] = since
+        return self.send(message, on_success=on_success)
+
+    def send_chat(self, message: str):
+        """Send a chat message to everyone in the game; the server echoes it back to us as well."""
+        return self.send({ "command": "chat", "message": message })
@@ -7,6 +7,8 @@
 
 from queue import Queue, Empty
 
+from .protocol import EVENT_KEY, BATCH_EVENT, EVENTS_KEY, SEQ_KEY
+
 
 class GameEventHandler:
     """
@@ -14,12 +16,25 @@ class GameEventHandler:
     in a thread safe Queue. An instance of this queue is used to asynchronously
     store game events as they are received. Later, when it is safe to update the UI,
     we can fetch all the pending events from the queue.
+
+    The server delivers the events caused by one command as a single batch;
+    the handler unpacks a batch into its individual events, in order. It also
+    remembers the sequence number of the latest event, from which the client
+    can resume after reconnecting.
     """
 
     def __init__(self):
         self._queue = Queue()
+        self.last_seq = 0
 
     def handle_event(self, event):
+        if event.get(EVENT_KEY) == BATCH_EVENT:
+            for batched_event in event[EVENTS_KEY]:
+                self.handle_event(batched_event)
+            return
+        seq = event.get(SEQ_KEY)
+        if isinstance(seq, int) and seq > self.last_seq:
+            self.last_seq = seq
         # Put the event on the end of the queue
         self._queue.put(event)
 
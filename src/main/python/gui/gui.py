@@ -1,10 +1,16 @@
+import base64
+import zlib
+
 import pygame
 
+from model import STANDARD_FLEET
+
 from .client import GameClient
-from .command_buttons import GRID_SIZE, CommandButtons
+from .command_buttons import CommandButtons
 from .event_handler import GameEventHandler
 from .event_view import EventView
-from .board_view import BoardView
+from .board_view import BoardView, BOARD_SIZE
+from .protocol import SNAPSHOT_EVENT, STATE_KEY
 
 # UI layout
 DISPLAY_SIZE = (1000, 600)
@@ -16,23 +22,19 @@ WINDOW_TITLE = "Battleship"
 PLAYER_BOARD_POS = (40, 80)
 OPPONENT_BOARD_POS = (520, 80)
 
-
 class GUI:
-    def __init__(self, client: GameClient, event_handler: GameEventHandler, player_name: str):
+    def __init__(self, client: GameClient, event_handler: GameEventHandler, player_name: str,
+                 rows: int = BOARD_SIZE, cols: int = BOARD_SIZE, fleet: tuple[tuple[str, int], ...] = STANDARD_FLEET):
         self.client = client
         self.event_handler = event_handler
         self.player_name = player_name
+        self.rows = rows
+        self.cols = cols
         self.is_placing_ships = True
         self.next_ship_index = 0
         self.chat_input = ""
         self.chat_history = []
-        self.ship_types = [
-            {"name": "Destroyer", "size": 2},
-            {"name": "Submarine", "size": 3},
-            {"name": "Cruiser", "size": 3},
-            {"name": "Battleship", "size": 4},
-            {"name": "Carrier", "size": 5},
-        ]
+        self.ship_types = [{"name": name, "size": size} for name, size in fleet]
         self.status_message = []
 
     def run(self):
@@ -42,8 +44,10 @@ class GUI:
 
         event_view = EventView(window, color=WINDOW_FG_COLOR)
         command_buttons = CommandButtons(window, client=self.client)
-        self.player_board = BoardView(window, self.client, is_player_board=True, top_left=PLAYER_BOARD_POS)
-        self.opponent_board = BoardView(window, self.client, is_player_board=False, top_left=OPPONENT_BOARD_POS)
+        self.player_board = BoardView(window, self.client, is_player_board=True, top_left=PLAYER_BOARD_POS,
+                                      rows=self.rows, cols=self.cols)
+        self.opponent_board = BoardView(window, self.client, is_player_board=False, top_left=OPPONENT_BOARD_POS,
+                                        rows=self.rows, cols=self.cols)
 
         clock = pygame.time.Clock()
         done = False
@@ -65,22 +69,31 @@ class GUI:
                             self.chat_history.pop(0)
 
                 elif event_type == "AttackEvent":
-                    msg = pending_event.get("message", "")
-                    coords = self._parse_attack_coords(msg)
-                    if coords:
-                        row, col = coords
-                        attacker = msg.split(" ")[0]
-                        result = "hit" if "hit" in msg else "miss"
-                        if attacker == self.player_name:
-                            self.opponent_board.board[row][col] = result
-                        else:
-                            self.player_board.board[row][col] = result
+                    attacker = pending_event.get("attacker_id")
+                    board = self.opponent_board if attacker == self.player_name else self.player_board
+                    board.mark_attack(pending_event["row"], pending_event["col"], pending_event["result"])
+
+                elif event_type == "SalvoEvent":
+                    attacker = pending_event.get("attacker_id")
+                    board = self.opponent_board if attacker == self.player_name else self.player_board
+                    for row, col, result in pending_event.get("shots", []):
+                        board.mark_attack(row, col, result)
+                    if pending_event.get("winner_id") is not None:
+                        self._show_game_over_screen(pending_event["winner_id"])
+                        done = True
 
                 elif event_type == "GameOverEvent":
                     winner = pending_event.get("winner_id", "Unknown")
                     self._show_game_over_screen(winner)
                     done = True
 
+                elif event_type == SNAPSHOT_EVENT:
+                    state = pending_event[STATE_KEY]
+                    self._apply_snapshot(state)
+                    if state.get("winner_id") is not None:
+                        self._show_game_over_screen(state["winner_id"])
+                        done = True
+
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     done = True
@@ -88,11 +101,8 @@ class GUI:
                     if event.key == pygame.K_RETURN:
                         if self.chat_input.strip():
                             try:
+                                # The server echoes our message back as a ChatEvent
                                 self.client.send_chat(self.chat_input.strip())
-                                # Also append to local chat history
-                                self.chat_history.append(f"{self.player_name}: {self.chat_input.strip()}")
-                                if len(self.chat_history) > 5:
-                                    self.chat_history.pop(0)
                             except Exception as e:
                                 print(f"[ERROR] Failed to send chat message: {e}")
                             self.chat_input = ""
@@ -103,10 +113,9 @@ class GUI:
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     x, y = pygame.mouse.get_pos()
                     if self.is_placing_ships:
-                        grid_x, grid_y = PLAYER_BOARD_POS
-                        col = (x - grid_x) // GRID_SIZE
-                        row = (y - grid_y) // GRID_SIZE
-                        if 0 <= row < 10 and 0 <= col < 10:
+                        cell = self.player_board.cell_at(x, y)
+                        if cell:
+                            row, col = cell
                             if self.next_ship_index < len(self.ship_types):
                                 ship_type = self.ship_types[self.next_ship_index]
                                 ship = {
@@ -121,11 +130,9 @@ class GUI:
                                 if self.next_ship_index == len(self.ship_types):
                                     self.finish_ship_placement()
                     else:
-                        grid_x, grid_y = OPPONENT_BOARD_POS
-                        col = (x - grid_x) // GRID_SIZE
-                        row = (y - grid_y) // GRID_SIZE
-                        if 0 <= row < 10 and 0 <= col < 10:
-                            self.opponent_board.handle_attack(row, col)
+                        cell = self.opponent_board.cell_at(x, y)
+                        if cell:
+                            self.opponent_board.handle_attack(*cell)
                 else:
                     command_buttons.consume_ui_event(event)
 
@@ -168,17 +175,26 @@ class GUI:
         self.client.send_place_ships(ships)
         self.is_placing_ships = False
 
-    def _parse_attack_coords(self, message: str):
-        try:
-            if "attacked" not in message:
-                return None
-            coord_part = message.split("attacked")[1].split("-")[0].strip()
-            coord_str = coord_part.strip("() ")
-            row, col = map(int, coord_str.split(","))
-            return row, col
-        except Exception as e:
-            print(f"[ERROR] Failed to parse coords: {e}")
-            return None
+    def _apply_snapshot(self, state: dict):
+        """
+        Marks both boards with the state of the game from a snapshot, which the
+        server sends when we resume a game whose events it no longer has.
+        """
+        for player_id, board in state["boards"].items():
+            own = player_id == self.player_name
+            view = self.player_board if own else self.opponent_board
+            if own and board.get("ships") and not view.ships:
+                for ship in board["ships"]:
+                    view.place_ship(ship)
+                self.next_ship_index = len(self.ship_types)
+                self.is_placing_ships = False
+            shots = int.from_bytes(zlib.decompress(base64.b64decode(board["shots"])), "little")
+            hits = int.from_bytes(zlib.decompress(base64.b64decode(board["hits"])), "little")
+            while shots:
+                bit = shots & -shots
+                row, col = divmod(bit.bit_length() - 1, self.cols)
+                view.mark_attack(row, col, "hit" if hits & bit else "miss")
+                shots ^= bit
 
     def _show_game_over_screen(self, winner_id):
         result_text = f"Game Over!"
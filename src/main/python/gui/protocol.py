@@ -10,3 +10,14 @@ EVENT_KEY = "event"
 STATUS_KEY = "status"
 OK_STATUS = "ok"
 
+
+# An event whose EVENTS_KEY holds a list of events, in the order they occurred
+BATCH_EVENT = "EventBatch"
+EVENTS_KEY = "events"
+
+# Every event carries its sequence number under SEQ_KEY. A client that resumes
+# (see GameClient.send_resume) gets the events it missed, or a SNAPSHOT_EVENT
+# whose STATE_KEY describes the game if too much was missed.
+SEQ_KEY = "seq"
+SNAPSHOT_EVENT = "SnapshotEvent"
+STATE_KEY = "state"
@@ -0,0 +1,116 @@
+#
+# wire.py:
+# This module defines the compact binary encoding of messages that the client
+# may choose (with the `set_protocol` command) instead of JSON. It is the
+# counterpart of server/wire.py; see that module for the layouts.
+#
+
+import json
+import struct
+
+JSON_PROTOCOL = "json"
+BINARY_PROTOCOL = "binary"
+
+# Commands (client to server)
+ATTACK_TAG = 0x01
+ATTACK_BATCH_TAG = 0x02
+
+# Responses and events (server to client)
+OK_TAG = 0x80
+ATTACK_EVENT_TAG = 0x90
+TURN_EVENT_TAG = 0x91
+SHIP_SUNK_EVENT_TAG = 0x92
+GAME_OVER_EVENT_TAG = 0x93
+BATCH_TAG = 0x94
+
+# Any message, as UTF-8 JSON
+JSON_TAG = 0xFF
+
+RESULTS = ("miss", "hit")
+
+_CELL = struct.Struct("<HH")
+_COUNT = struct.Struct("<H")
+_SEQ = struct.Struct("<I")
+_ATTACK_EVENT = struct.Struct("<HHB")
+
+
+def encode_command(command: dict) -> bytes:
+    """Encodes a command in the binary protocol."""
+    name = command.get("command")
+    try:
+        if name == "attack":
+            return bytes((ATTACK_TAG,)) + _CELL.pack(command["row"], command["col"])
+        if name == "attack_batch":
+            cells = command["cells"]
+            return (bytes((ATTACK_BATCH_TAG,)) + _COUNT.pack(len(cells))
+                    + b"".join(_CELL.pack(row, col) for row, col in cells))
+    except (KeyError, TypeError, ValueError, struct.error):
+        # Let the server report what is wrong with it
+        pass
+    return bytes((JSON_TAG,)) + json.dumps(command).encode("utf-8")
+
+
+def _unpack_string(data: bytes, offset: int) -> tuple[str, int]:
+    length = data[offset]
+    end = offset + 1 + length
+    if end > len(data):
+        raise ValueError("truncated string")
+    return data[offset + 1:end].decode("utf-8"), end
+
+
+def decode_message(data: bytes) -> dict:
+    """
+    Decodes a response or event sent in the binary protocol.
+    :return: the message in the same form as a JSON message
+    :raises ValueError: if the data isn't a well-formed binary message
+    """
+    try:
+        tag = data[0]
+        if tag == JSON_TAG:
+            return json.loads(data[1:].decode("utf-8"))
+        if tag == OK_TAG:
+            return {"status": "ok"}
+        if tag == ATTACK_EVENT_TAG:
+            seq, = _SEQ.unpack_from(data, 1)
+            attacker_id, offset = _unpack_string(data, 1 + _SEQ.size)
+            row, col, result = _ATTACK_EVENT.unpack_from(data, offset)
+            result = RESULTS[result]
+            return {
+                "event": "AttackEvent",
+                "attacker_id": attacker_id,
+                "row": row,
+                "col": col,
+                "result": result,
+                "seq": seq,
+            }
+        if tag == TURN_EVENT_TAG:
+            seq, = _SEQ.unpack_from(data, 1)
+            player_id, _ = _unpack_string(data, 1 + _SEQ.size)
+            return {"event": "TurnEvent", "player_id": player_id, "seq": seq}
+        if tag == SHIP_SUNK_EVENT_TAG:
+            seq, = _SEQ.unpack_from(data, 1)
+            attacker_id, offset = _unpack_string(data, 1 + _SEQ.size)
+            ship_name, _ = _unpack_string(data, offset)
+            return {
+                "event": "ShipSunkEvent",
+                "attacker_id": attacker_id,
+                "ship_name": ship_name,
+                "seq": seq,
+            }
+        if tag == GAME_OVER_EVENT_TAG:
+            seq, = _SEQ.unpack_from(data, 1)
+            winner_id, _ = _unpack_string(data, 1 + _SEQ.size)
+            return {"event": "GameOverEvent", "winner_id": winner_id, "seq": seq}
+        if tag == BATCH_TAG:
+            count, = _COUNT.unpack_from(data, 1)
+            offset = 1 + _COUNT.size
+            events = []
+            for _ in range(count):
+                length, = _COUNT.unpack_from(data, offset)
+                offset += _COUNT.size
+                events.append(decode_message(data[offset:offset + length]))
+                offset += length
+            return {"event": "EventBatch", "events": events}
+    except (IndexError, struct.error, UnicodeDecodeError) as err:
+        raise ValueError(f"malformed binary message: {err}") from None
+    raise ValueError(f"unknown binary message tag {data[0]:#x}")
@@ -2,7 +2,18 @@
 # These imports define the public API of the model which should
 # be used by code outside of this package.
 #
-from .errors import GameError
+from .errors import (GameError,
+    PlacementError,
+    RequestError,
+    TurnError,
+    OutOfBoundsError,
+    AlreadyAttackedError,
+    SalvoError,
+    SeatError,
+    FleetError,
+    RateLimitError,
+    UnavailableError,
+    SnapshotError)
 
 # TODO: be sure to update this import list to speicfy your game's event types
 from .events import (GameEvent,
@@ -10,6 +21,8 @@ from .events import (GameEvent,
     AttackEvent,
     ShipSunkEvent,
     GameOverEvent,
-    TurnEvent)
+    TurnEvent,
+    SalvoEvent)
 
 from .model import GameModel
+from .placement import STANDARD_FLEET, PlacementRejection, parse_fleet, validate_placement
@@ -0,0 +1,216 @@
+#
+# ai.py
+# This module defines a computer opponent that chooses shots using a
+# probability density over the fleet placements that are still possible.
+#
+
+import random
+from collections import Counter
+
+import numpy as np
+
+from .events import AttackEvent, ShipSunkEvent, TurnEvent, GameOverEvent, SalvoEvent
+from .placement_tables import random_fleet
+
+
+class ProbabilityStrategy:
+    """
+    A hunt/target strategy driven by a probability heatmap.
+
+    For every ship length still afloat, boolean arrays record which horizontal
+    and vertical placements (indexed by their starting cell) remain possible,
+    i.e. contain no miss and no cell of a sunk ship. The heatmap holds, for each
+    cell, the number of possible placements covering it, weighted by how many
+    ships of that length are afloat.
+
+    The heatmap is built once with sliding-window sums, and after that only the
+    placements through a newly blocked cell are subtracted, so a shot costs
+    O(ship length) array updates rather than a full recomputation. While there
+    are hits that don't yet belong to a sunk ship, placements through those hits
+    take priority (target mode).
+
+    The interface matches the strategies in sim.py.
+    """
+
+    def __init__(self, rows: int, cols: int, fleet, rng: random.Random = None):
+        self.rows = rows
+        self.cols = cols
+        self._rng = rng or random.Random()
+        self._sizes = dict(fleet)
+        self._afloat = Counter(size for _, size in fleet)
+        self._shot = np.zeros((rows, cols), dtype=np.bool_)
+        # hits that aren't yet known to belong to a sunk ship
+        self._hits = set()
+        self._last_shot = None
+        # length -> (possible horizontal starts, possible vertical starts)
+        self._valid: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+        # length -> possible placements of that length covering each cell (unweighted)
+        self._covered: dict[int, np.ndarray] = {}
+        self._density = np.zeros((rows, cols), dtype=np.int64)
+        for length, count in self._afloat.items():
+            horizontal = np.ones((rows, max(cols - length + 1, 0)), dtype=np.bool_)
+            vertical = np.ones((max(rows - length + 1, 0), cols), dtype=np.bool_)
+            self._valid[length] = (horizontal, vertical)
+            self._covered[length] = self._coverage(length)
+            self._density += count * self._covered[length]
+
+    def _coverage(self, length):
+        """Counts, for every cell, the possible placements of the given length that cover it."""
+        horizontal, vertical = self._valid[length]
+        coverage = np.zeros((self.rows, self.cols), dtype=np.int64)
+        for k in range(length):
+            coverage[:, k:k + horizontal.shape[1]] += horizontal
+            coverage[k:k + vertical.shape[0], :] += vertical
+        return coverage
+
+    def _block(self, row, col):
+        """Rules out every placement that covers (row, col) and removes them from the heatmap."""
+        for length, count in self._afloat.items():
+            if not count:
+                continue
+            horizontal, vertical = self._valid[length]
+            lo, hi = max(0, col - length + 1), min(col, self.cols - length)
+            if lo <= hi:
+                starts = lo + np.flatnonzero(horizontal[row, lo:hi + 1])
+                if starts.size:
+                    horizontal[row, starts] = False
+                    cells = (starts[:, None] + np.arange(length)).ravel()
+                    removed = np.bincount(cells, minlength=self.cols)
+                    self._covered[length][row] -= removed
+                    self._density[row] -= count * removed
+            lo, hi = max(0, row - length + 1), min(row, self.rows - length)
+            if lo <= hi:
+                starts = lo + np.flatnonzero(vertical[lo:hi + 1, col])
+                if starts.size:
+                    vertical[starts, col] = False
+                    cells = (starts[:, None] + np.arange(length)).ravel()
+                    removed = np.bincount(cells, minlength=self.rows)
+                    self._covered[length][:, col] -= removed
+                    self._density[:, col] -= count * removed
+
+    def _sunk_cells(self, length, row, col):
+        """Finds a line of `length` unresolved hits through (row, col): the cells of the ship just sunk."""
+        for dr, dc in ((0, 1), (1, 0)):
+            for offset in range(length):
+                r0, c0 = row - offset * dr, col - offset * dc
+                cells = [(r0 + i * dr, c0 + i * dc) for i in range(length)]
+                if all(cell in self._hits for cell in cells):
+                    return cells
+        return [(row, col)]
+
+    def record(self, row: int, col: int, result: str, sunk: str = None):
+        """Updates the heatmap with the outcome of one of our shots."""
+        self._shot[row, col] = True
+        self._last_shot = (row, col)
+        if result == "hit":
+            self._hits.add((row, col))
+        else:
+            self._block(row, col)
+        if sunk:
+            self.record_sunk(sunk)
+
+    def record_sunk(self, ship_name: str):
+        """
+        Updates the heatmap after our most recent shot sank the named ship: the
+        placements through its cells are ruled out, and with one ship of its
+        length fewer afloat, that length's coverage (which `_block` keeps up to
+        date) weighs one less.
+        """
+        length = self._sizes[ship_name]
+        for cell in self._sunk_cells(length, *self._last_shot):
+            self._hits.discard(cell)
+            self._block(*cell)
+        self._afloat[length] -= 1
+        self._density -= self._covered[length]
+
+    def _target_scores(self):
+        """Scores each cell by the possible placements that cover it and at least one unresolved hit."""
+        scores = np.zeros((self.rows, self.cols), dtype=np.int64)
+        for row, col in self._hits:
+            for length, count in self._afloat.items():
+                if not count:
+                    continue
+                horizontal, vertical = self._valid[length]
+                for start in range(max(0, col - length + 1), min(col, self.cols - length) + 1):
+                    if horizontal[row, start]:
+                        scores[row, start:start + length] += count
+                for start in range(max(0, row - length + 1), min(row, self.rows - length) + 1):
+                    if vertical[start, col]:
+                        scores[start:start + length, col] += count
+        return scores
+
+    def next_shot(self) -> tuple[int, int]:
+        scores = self._density
+        if self._hits:
+            target = self._target_scores()
+            target[self._shot] = 0
+            if target.any():
+                # target scores dominate; the heatmap only breaks ties between them
+                scores = target * (int(self._density.max()) + 1) + self._density
+        scores = np.where(self._shot, -1, scores)
+        best = np.flatnonzero(scores == scores.max())
+        return divmod(int(best[self._rng.randrange(best.size)]), self.cols)
+
+
+class BotPlayer:
+    """
+    Plays one seat of a GameModel using a ProbabilityStrategy.
+
+    The bot installs itself as the model's observer when it joins. It forwards every event to
+    the observer it replaced, feeds the outcome of its own shots to its strategy,
+    and attacks whenever the turn passes to it. Its moves therefore happen on the
+    thread that executed the opponent's command.
+    """
+
+    def __init__(self, model, player_id: str, rng: random.Random = None):
+        self.model = model
+        self.player_id = player_id
+        self._rng = rng or random.Random()
+        self.strategy = ProbabilityStrategy(model.rows, model.cols, model.fleet, self._rng)
+        self.observer = None
+        self._my_turn = False
+        self._moving = False
+
+    def join(self):
+        """
+        Installs the bot as the model's observer, places a random fleet for it,
+        and moves if that makes it the bot's turn. If the fleet can't be placed,
+        the previous observer is put back.
+        """
+        self.observer = self.model.observer
+        self.model.observer = self
+        try:
+            self.model.place_ships(self.player_id, random_fleet(self.model.rows, self.model.cols,
+                                                                self.model.fleet, self._rng))
+        except Exception:
+            self.model.observer = self.observer
+            raise
+        self._play()
+
+    def notify(self, event):
+        self.observer.notify(event)
+        if isinstance(event, AttackEvent):
+            if event.attacker_id == self.player_id:
+                self.strategy.record(event.row, event.col, event.result)
+        elif isinstance(event, ShipSunkEvent):
+            if event.attacker_id == self.player_id:
+                self.strategy.record_sunk(event.ship_name)
+        elif isinstance(event, TurnEvent):
+            self._my_turn = event.player_id == self.player_id
+        elif isinstance(event, SalvoEvent):
+            self._my_turn = event.next_turn == self.player_id
+        elif isinstance(event, GameOverEvent):
+            self._my_turn = False
+        self._play()
+
+    def _play(self):
+        # Our own attack publishes events back to us; only the outermost call moves
+        if self._moving:
+            return
+        self._moving = True
+        try:
+            while self._my_turn:
+                self._my_turn = False
+                self.model.attack(self.player_id, *self.strategy.next_shot())
+        finally:
+            self._moving = False
@@ -0,0 +1,121 @@
+#
+# array_board.py
+# This module defines a NumPy-backed board for large game variants.
+#
+
+import numpy as np
+
+from .errors import FleetError, OutOfBoundsError, AlreadyAttackedError
+
+
+class ArrayBoard:
+    """
+    A board with the same interface as Board (see model.py), for boards too
+    large for integer bitmasks. Every cell holds the index of the ship that
+    occupies it (or -1) in a flat array, and shots are kept in a parallel
+    boolean array, so an attack costs the same regardless of board size. A
+    whole fleet is validated and placed with a handful of vectorized
+    operations. `ship_type` is the class of the ships that `place_fleet`
+    creates (model.Ship, which is passed in because model.py imports this
+    module).
+    """
+
+    EMPTY = -1
+
+    def __init__(self, rows, cols, ship_type):
+        self.rows = rows
+        self.cols = cols
+        self.ship_type = ship_type
+        self.ships = []
+        self._ship_at = np.full(rows * cols, self.EMPTY, dtype=np.int32)
+        self._shots = np.zeros(rows * cols, dtype=np.bool_)
+        # number of placed ships that have not yet been sunk
+        self.ships_afloat = 0
+
+    @property
+    def attacks(self):
+        return {divmod(int(index), self.cols) for index in np.flatnonzero(self._shots)}
+
+    def in_bounds(self, row, col):
+        return 0 <= row < self.rows and 0 <= col < self.cols
+
+    def is_attacked(self, row, col):
+        return bool(self._shots[row * self.cols + col])
+
+    def _add_ships(self, ships):
+        count = len(ships)
+        if not count:
+            return
+        starts_row = np.fromiter((ship.row for ship in ships), dtype=np.int64, count=count)
+        starts_col = np.fromiter((ship.col for ship in ships), dtype=np.int64, count=count)
+        sizes = np.fromiter((ship.size for ship in ships), dtype=np.int64, count=count)
+        horizontal = np.fromiter((bool(ship.horizontal) for ship in ships), dtype=np.bool_, count=count)
+
+        # Expand each ship into its cells: the offset of every cell from its ship's start
+        # is its position in the concatenated cell list, minus where its ship began.
+        ship_ids = np.repeat(np.arange(count), sizes)
+        offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        along_row = np.repeat(horizontal, sizes)
+        rows = np.repeat(starts_row, sizes) + np.where(along_row, 0, offsets)
+        cols = np.repeat(starts_col, sizes) + np.where(along_row, offsets, 0)
+
+        if ((rows < 0) | (rows >= self.rows) | (cols < 0) | (cols >= self.cols)).any():
+            raise FleetError("Ship out of bounds")
+        cells = rows * self.cols + cols
+        if (self._ship_at[cells] != self.EMPTY).any() or np.unique(cells).size != cells.size:
+            raise FleetError("Ships overlap")
+
+        self._ship_at[cells] = ship_ids + len(self.ships)
+        self.ships.extend(ships)
+        self.ships_afloat += int(np.count_nonzero(sizes))
+
+    def place_ship(self, ship, row, col, horizontal=True):
+        ship.place(row, col, horizontal)
+        self._add_ships([ship])
+
+    def place_fleet(self, ship_data):
+        ships = []
+        for data in ship_data:
+            ship = self.ship_type(data['name'], data['size'])
+            ship.place(data['row'], data['col'], data.get('horizontal', True))
+            ships.append(ship)
+        self._add_ships(ships)
+
+    def shots_to_bytes(self):
+        """Returns the shot history as a bitmap, one bit per cell, least-significant bit first."""
+        return np.packbits(self._shots, bitorder="little").tobytes()
+
+    def hits_to_bytes(self):
+        """Returns the shots that hit a ship, as a bitmap in the same form as `shots_to_bytes`."""
+        return np.packbits(self._shots & (self._ship_at != self.EMPTY), bitorder="little").tobytes()
+
+    def load_shots(self, data):
+        """Replaces the shot history with a bitmap from `shots_to_bytes`, and updates ship damage to match."""
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=self.rows * self.cols, bitorder="little")
+        self._shots = bits.astype(np.bool_)
+        self.ships_afloat = 0
+        for ship in self.ships:
+            for i, (r, c) in enumerate(ship.positions):
+                if self._shots[r * self.cols + c]:
+                    ship.hit_segment(i)
+            if ship.remaining:
+                self.ships_afloat += 1
+
+    def receive_attack(self, row, col):
+        if not self.in_bounds(row, col):
+            raise OutOfBoundsError("Position out of bounds")
+        index = row * self.cols + col
+        if self._shots[index]:
+            raise AlreadyAttackedError("Position already attacked")
+        self._shots[index] = True
+        ship_id = int(self._ship_at[index])
+        if ship_id == self.EMPTY:
+            return 'miss', None
+        ship = self.ships[ship_id]
+        ship.hit_segment(ship.segment(row, col))
+        if not ship.remaining:
+            self.ships_afloat -= 1
+        return 'hit', ship
+
+    def all_ships_sunk(self):
+        return self.ships_afloat == 0
@@ -6,9 +6,69 @@
 class GameError(Exception):
     """
     A generic base class for errors generated within the model.
-    You could define subclasses of this exception type for different error
-    situations, if desired. See controller.py to see where/how this is used.
+    The subclasses below tell different error situations apart; the server
+    counts refused commands by subclass. See controller.py to see where/how
+    this is used.
     """
     pass
 
 
+class RequestError(GameError):
+    """Raised when a request is malformed, such as a position that isn't a pair of integers."""
+    pass
+
+
+class TurnError(GameError):
+    """Raised when a player moves out of turn."""
+    pass
+
+
+class OutOfBoundsError(GameError):
+    """Raised when an attack targets a position off the board."""
+    pass
+
+
+class AlreadyAttackedError(GameError):
+    """Raised when an attack targets a position that was attacked before."""
+    pass
+
+
+class SalvoError(GameError):
+    """Raised when a salvo is empty or has more positions than allowed."""
+    pass
+
+
+class SeatError(GameError):
+    """Raised when a player (or bot) can't take a seat, or a spectator tries to play."""
+    pass
+
+
+class FleetError(GameError):
+    """Raised when a fleet can't be laid out on the board at all."""
+    pass
+
+
+class RateLimitError(GameError):
+    """Raised when a user sends chat messages too quickly."""
+    pass
+
+
+class UnavailableError(GameError):
+    """Raised when a command arrives for a game that has been shut down."""
+    pass
+
+
+class SnapshotError(GameError):
+    """Raised when a game snapshot can't be restored."""
+    pass
+
+
+class PlacementError(GameError):
+    """
+    Raised when a player's proposed fleet placement is rejected. The `rejections`
+    attribute holds a PlacementRejection (see placement.py) for every problem that
+    was found, so that a client can be told exactly what to fix.
+    """
+    def __init__(self, rejections):
+        super().__init__("; ".join(str(rejection) for rejection in rejections))
+        self.rejections = rejections
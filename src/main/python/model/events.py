@@ -14,9 +14,25 @@ class BaseEvent:
 
     Your implementation could use Python dataclasses to define event
     types instead of defining them this way. The result is the same.
+
+    Events are created for every move in every game, so each event type
+    declares `__slots__` to avoid a per-instance `__dict__`. The human-readable
+    message is rendered by `_render_message` only when it is first read, and
+    then cached.
     """
-    def __init__(self, message):
-        self.message = message
+    __slots__ = ("_message",)
+
+    def __init__(self):
+        self._message = None
+
+    @property
+    def message(self):
+        if self._message is None:
+            self._message = self._render_message()
+        return self._message
+
+    def _render_message(self):
+        raise NotImplementedError
 
     def __str__(self):
         """
@@ -28,43 +44,86 @@ class BaseEvent:
 
 
 class AttackEvent(BaseEvent):
+    __slots__ = ("attacker_id", "row", "col", "result")
+
     def __init__(self, attacker_id, row, col, result):
-        message = f"{attacker_id} attacked ({row}, {col}) - {result}"
-        super().__init__(message)
+        super().__init__()
         self.attacker_id = attacker_id
         self.row = row
         self.col = col
         self.result = result
 
+    def _render_message(self):
+        return f"{self.attacker_id} attacked ({self.row}, {self.col}) - {self.result}"
+
 
 class ShipSunkEvent(BaseEvent):
+    __slots__ = ("attacker_id", "ship_name")
+
     def __init__(self, attacker_id, ship_name):
-        message = f"{attacker_id} sank {ship_name}"
-        super().__init__(message)
+        super().__init__()
         self.attacker_id = attacker_id
         self.ship_name = ship_name
 
+    def _render_message(self):
+        return f"{self.attacker_id} sank {self.ship_name}"
+
 
 class GameOverEvent(BaseEvent):
+    __slots__ = ("winner_id",)
+
     def __init__(self, winner_id):
-        message = f"{winner_id} wins the game!"
-        super().__init__(message)
+        super().__init__()
         self.winner_id = winner_id
 
+    def _render_message(self):
+        return f"{self.winner_id} wins the game!"
+
 
 class TurnEvent(BaseEvent):
+    __slots__ = ("player_id",)
+
     def __init__(self, player_id):
-        message = f"It is now {player_id}'s turn."
-        super().__init__(message)
+        super().__init__()
         self.player_id = player_id
 
+    def _render_message(self):
+        return f"It is now {self.player_id}'s turn."
+
+
+class SalvoEvent(BaseEvent):
+    """
+    The outcome of a salvo (see GameModel.attack_many). `shots` holds a
+    (row, col, result) triple for each shot in the order fired, and `sunk` the
+    names of any ships sunk by the salvo. Exactly one of `next_turn` and
+    `winner_id` is set.
+    """
+    __slots__ = ("attacker_id", "shots", "sunk", "next_turn", "winner_id")
+
+    def __init__(self, attacker_id, shots, sunk, next_turn=None, winner_id=None):
+        super().__init__()
+        self.attacker_id = attacker_id
+        self.shots = shots
+        self.sunk = sunk
+        self.next_turn = next_turn
+        self.winner_id = winner_id
+
+    def _render_message(self):
+        hits = sum(1 for _, _, result in self.shots if result == 'hit')
+        message = f"{self.attacker_id} fired {len(self.shots)} shots - {hits} hit"
+        if self.sunk:
+            message += f", sank {', '.join(self.sunk)}"
+        if self.winner_id is not None:
+            return f"{message}. {self.winner_id} wins the game!"
+        return f"{message}. It is now {self.next_turn}'s turn."
+
 
 # This declaration simply defines a type hint that represents any defined game
 # event type.
 #
 # TODO: your model will have different event type names, and they should
 #       be used here instead of those used in this trivial model.
-GameEvent = Union[AttackEvent, ShipSunkEvent, GameOverEvent, TurnEvent]
+GameEvent = Union[AttackEvent, ShipSunkEvent, GameOverEvent, TurnEvent, SalvoEvent]
 
 # This declaration defines a type hint for a function that is used as an observer
 # for the game model. An observer is invoked every time a game event is generated.
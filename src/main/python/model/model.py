@@ -7,18 +7,50 @@
 # contain modules defining Suit, Rank, Card, Deck, Hand, etc.
 #
 
-from .errors import GameError
+import logging
+from numbers import Integral
+
+from .array_board import ArrayBoard
+from .errors import PlacementError, RequestError, TurnError, OutOfBoundsError, AlreadyAttackedError, \
+    SalvoError, SeatError, FleetError, SnapshotError
 from .events import *
+from .placement import STANDARD_FLEET, validate_placement
+from .snapshot import SnapshotReader, SnapshotWriter
+
+logger = logging.getLogger(__name__)
+
+# The classic board is a 10x10 grid; GameModel accepts other dimensions.
+BOARD_SIZE = 10
+
+# Boards with more cells than this are backed by NumPy arrays (see
+# array_board.py; NumPy is a requirement of the model). Below it, integer
+# bitmasks are smaller and faster than arrays.
+BITBOARD_MAX_CELLS = 64 * 64
+
 
 class Ship:
     def __init__(self, name, size):
         self.name = name
         self.size = size
+        self.row = None
+        self.col = None
+        self.horizontal = True
         self.positions = []
-        self.hits = set()
+        # footprint of the ship on a bitboard (set by Board.place_ship)
+        self.mask = 0
+        # bit i is set when positions[i] has been hit
+        self.hit_mask = 0
+        # number of cells not yet hit; the ship is sunk when this reaches zero
+        self.remaining = size
 
     def place(self, start_row, start_col, horizontal=True):
+        self.row = start_row
+        self.col = start_col
+        self.horizontal = horizontal
         self.positions = []
+        self.mask = 0
+        self.hit_mask = 0
+        self.remaining = self.size
         for i in range(self.size):
             row = start_row
             col = start_col + i if horizontal else start_col
@@ -26,39 +58,142 @@ class Ship:
                 row = start_row + i
             self.positions.append((row, col))
 
+    def segment(self, row, col):
+        """Returns the index of (row, col) within this ship, or -1 if the ship doesn't cover it."""
+        if self.horizontal:
+            i = col - self.col if row == self.row else -1
+        else:
+            i = row - self.row if col == self.col else -1
+        return i if 0 <= i < self.size else -1
+
+    def hit_segment(self, i):
+        """Records a hit on the i-th cell of this ship."""
+        bit = 1 << i
+        if not self.hit_mask & bit:
+            self.hit_mask |= bit
+            self.remaining -= 1
+
+    @property
+    def hits(self):
+        return {position for i, position in enumerate(self.positions) if self.hit_mask & (1 << i)}
+
     def is_sunk(self):
-        return set(self.positions) == self.hits
+        return self.remaining == 0
 
     def register_hit(self, position):
-        if position in self.positions:
-            self.hits.add(position)
-            return True
-        return False
+        i = self.segment(*position)
+        if i < 0:
+            return False
+        self.hit_segment(i)
+        return True
 
 
 class Board:
-    def __init__(self):
+    """
+    A board whose cells each map to one bit of an integer bitmask (bit index =
+    row * cols + col), so occupancy, ship footprints and the shot history can
+    all be tested and updated with single integer operations.
+    """
+
+    def __init__(self, rows=BOARD_SIZE, cols=BOARD_SIZE):
+        self.rows = rows
+        self.cols = cols
         self.ships = []
-        self.attacks = set()
+        # union of all ship masks, and every cell attacked so far
+        self.occupancy = 0
+        self.shots = 0
+        # maps the bit index of every occupied cell to the ship occupying it
+        # and the index of the cell within that ship
+        self._ship_at: dict[int, tuple[Ship, int]] = {}
+        # number of placed ships that have not yet been sunk
+        self.ships_afloat = 0
+
+    @property
+    def attacks(self):
+        return {(row, col) for row in range(self.rows) for col in range(self.cols)
+                if self.shots >> (row * self.cols + col) & 1}
+
+    def in_bounds(self, row, col):
+        return 0 <= row < self.rows and 0 <= col < self.cols
+
+    def is_attacked(self, row, col):
+        return bool(self.shots >> (row * self.cols + col) & 1)
 
     def place_ship(self, ship, row, col, horizontal=True):
         ship.place(row, col, horizontal)
-        for existing in self.ships:
-            if set(ship.positions) & set(existing.positions):
-                raise GameError("Ships overlap")
+        mask = 0
+        for r, c in ship.positions:
+            if not self.in_bounds(r, c):
+                raise FleetError("Ship out of bounds")
+            mask |= 1 << (r * self.cols + c)
+        if mask & self.occupancy:
+            raise FleetError("Ships overlap")
+        ship.mask = mask
         self.ships.append(ship)
+        self.occupancy |= mask
+        for i, (r, c) in enumerate(ship.positions):
+            self._ship_at[r * self.cols + c] = (ship, i)
+        if ship.remaining:
+            self.ships_afloat += 1
 
-    def receive_attack(self, row, col):
-        if (row, col) in self.attacks:
-            raise GameError("Position already attacked")
-        self.attacks.add((row, col))
+    def place_fleet(self, ship_data):
+        for data in ship_data:
+            ship = Ship(data['name'], data['size'])
+            self.place_ship(ship, data['row'], data['col'], data.get('horizontal', True))
+
+    def shots_to_bytes(self):
+        """Returns the shot history as a bitmap, one bit per cell, least-significant bit first."""
+        return self.shots.to_bytes((self.rows * self.cols + 7) // 8, "little")
+
+    def hits_to_bytes(self):
+        """Returns the shots that hit a ship, as a bitmap in the same form as `shots_to_bytes`."""
+        return (self.shots & self.occupancy).to_bytes((self.rows * self.cols + 7) // 8, "little")
+
+    def load_shots(self, data):
+        """Replaces the shot history with a bitmap from `shots_to_bytes`, and updates ship damage to match."""
+        self.shots = int.from_bytes(data, "little")
+        self.ships_afloat = 0
         for ship in self.ships:
-            if ship.register_hit((row, col)):
-                return 'hit', ship
-        return 'miss', None
+            for i, (r, c) in enumerate(ship.positions):
+                if self.shots >> (r * self.cols + c) & 1:
+                    ship.hit_segment(i)
+            if ship.remaining:
+                self.ships_afloat += 1
+
+    def receive_attack(self, row, col):
+        if not self.in_bounds(row, col):
+            raise OutOfBoundsError("Position out of bounds")
+        index = row * self.cols + col
+        bit = 1 << index
+        if self.shots & bit:
+            raise AlreadyAttackedError("Position already attacked")
+        self.shots |= bit
+        entry = self._ship_at.get(index)
+        if entry is None:
+            return 'miss', None
+        ship, i = entry
+        ship.hit_segment(i)
+        if not ship.remaining:
+            self.ships_afloat -= 1
+        return 'hit', ship
 
     def all_ships_sunk(self):
-        return all(ship.is_sunk() for ship in self.ships)
+        return self.ships_afloat == 0
+
+
+def new_board(rows, cols):
+    """Creates the most suitable board implementation for the given dimensions."""
+    if rows * cols > BITBOARD_MAX_CELLS:
+        return ArrayBoard(rows, cols, Ship)
+    return Board(rows, cols)
+
+
+def _check_position(row, col):
+    # Boards index bitmasks and arrays with row and col, so anything but an
+    # integer would fail there with a TypeError rather than a GameError
+    if not isinstance(row, Integral) or not isinstance(col, Integral):
+        raise RequestError("Position must be a pair of integers")
+
 
 class GameModel:
     """
@@ -67,12 +202,22 @@ class GameModel:
     controller.py in the `server` package for an example of how it is used.
     """
 
-    def __init__(self, observer: GameObserver):
+    def __init__(self, observer: GameObserver, fleet=STANDARD_FLEET, rows=BOARD_SIZE, cols=BOARD_SIZE,
+                 salvo_size=None):
+        """
+        :param salvo_size: the most positions a salvo (see `attack_many`) may
+            contain; None allows one for each of the attacker's ships still afloat
+        """
         self.observer = observer
+        self.fleet = fleet
+        self.rows = rows
+        self.cols = cols
+        self.salvo_size = salvo_size
         self.players = {}
         self.ready_players = set()
         self.current_turn = None
-        self.connections = []  # Add this line to track connections
+        # The player who sank the opponent's whole fleet, once the game is over
+        self.winner_id = None
 
     # Every one of the following methods on this trivial model simply publishes
     # an event. In a real game model, invoking methods here would update the state
@@ -80,25 +225,28 @@ class GameModel:
     # event delivery plumbing.
 
     def place_ships(self, player_id, ship_data):
-        print(f"[DEBUG] Player {player_id} placing ships...")
+        logger.debug("player %s placing ships", player_id)
         if player_id in self.players:
-            raise GameError("Ships already placed")
-        board = Board()
-        for data in ship_data:
-            ship = Ship(data['name'], data['size'])
-            board.place_ship(ship, data['row'], data['col'], data.get('horizontal', True))
+            raise SeatError("Ships already placed")
+        # Reject the whole placement up front, before any board state is created
+        rejections = validate_placement(ship_data, self.rows, self.cols, self.fleet)
+        if rejections:
+            raise PlacementError(rejections)
+        board = new_board(self.rows, self.cols)
+        board.place_fleet(ship_data)
         self.players[player_id] = board
         self.ready_players.add(player_id)
         if len(self.ready_players) == 2:
             self.current_turn = list(self.players.keys())[0]
             self.observer.notify(TurnEvent(self.current_turn))
 
-        print(f"[DEBUG] Ships placed for {player_id}: {[ship.name for ship in board.ships]}")
+        logger.debug("ships placed for %s: %d ships", player_id, len(board.ships))
 
     def attack(self, attacker_id, row, col):
-        print(f"[DEBUG] {attacker_id} attacks ({row},{col})")
+        logger.debug("%s attacks (%s,%s)", attacker_id, row, col)
         if attacker_id != self.current_turn:
-            raise GameError("Not your turn")
+            raise TurnError("Not your turn")
+        _check_position(row, col)
         opponent_id = [pid for pid in self.players if pid != attacker_id][0]
         opponent_board = self.players[opponent_id]
         result, ship = opponent_board.receive_attack(row, col)
@@ -108,9 +256,170 @@ class GameModel:
             self.observer.notify(ShipSunkEvent(attacker_id, ship.name))
 
         if opponent_board.all_ships_sunk():
+            self.winner_id = attacker_id
             self.observer.notify(GameOverEvent(attacker_id))
         else:
             self.current_turn = opponent_id
             self.observer.notify(TurnEvent(self.current_turn))
 
-        print(f"[DEBUG] Attack result: {result}, Ship hit: {ship.name if ship else 'None'}") 
+        logger.debug("attack result: %s, ship hit: %s", result, ship.name if ship else None)
+
+    def attack_many(self, attacker_id, cells):
+        """
+        Fires a salvo of shots at the opponent's board as a single move. Every cell
+        is checked before any shot is applied, so the salvo is applied either in full
+        or not at all. The outcome of the whole salvo is published as one SalvoEvent.
+        A salvo may contain at most `salvo_size` positions or, if that is None,
+        one for each of the attacker's ships still afloat.
+        :param attacker_id: the player firing the salvo
+        :param cells: sequence of (row, col) pairs to attack
+        """
+        if attacker_id != self.current_turn:
+            raise TurnError("Not your turn")
+        if not cells:
+            raise SalvoError("Salvo must contain at least one position")
+        limit = self.salvo_size or self.players[attacker_id].ships_afloat
+        if len(cells) > limit:
+            raise SalvoError(f"Salvo may contain at most {limit} positions")
+        opponent_id = [pid for pid in self.players if pid != attacker_id][0]
+        opponent_board = self.players[opponent_id]
+
+        targets = set()
+        for row, col in cells:
+            _check_position(row, col)
+            if not opponent_board.in_bounds(row, col):
+                raise OutOfBoundsError("Position out of bounds")
+            if opponent_board.is_attacked(row, col) or (row, col) in targets:
+                raise AlreadyAttackedError("Position already attacked")
+            targets.add((row, col))
+
+        shots = []
+        sunk = []
+        for row, col in cells:
+            result, ship = opponent_board.receive_attack(row, col)
+            shots.append((row, col, result))
+            if result == 'hit' and ship.is_sunk():
+                sunk.append(ship.name)
+
+        if opponent_board.all_ships_sunk():
+            self.winner_id = attacker_id
+            self.observer.notify(SalvoEvent(attacker_id, shots, sunk, winner_id=attacker_id))
+        else:
+            self.current_turn = opponent_id
+            self.observer.notify(SalvoEvent(attacker_id, shots, sunk, next_turn=opponent_id))
+
+    def view(self, viewer_id=None) -> dict:
+        """
+        Describes the game as one player may see it, or as a spectator sees it
+        when `viewer_id` is None. For every player's board, it gives the cells
+        attacked and the cells hit (as bitmaps in the form of `shots_to_bytes`)
+        and the names of the ships sunk. Only the viewer's own board includes
+        where its ships are.
+        :param viewer_id: the player viewing the game, or None for a spectator
+        :return: dictionary with `rows`, `cols`, `turn`, `winner_id` and `boards`,
+            which maps each player ID to that player's board
+        """
+        boards = {}
+        for player_id, board in self.players.items():
+            boards[player_id] = {
+                "shots": board.shots_to_bytes(),
+                "hits": board.hits_to_bytes(),
+                "sunk": [ship.name for ship in board.ships if ship.is_sunk()],
+            }
+            if player_id == viewer_id:
+                boards[player_id]["ships"] = [{
+                    "name": ship.name,
+                    "size": ship.size,
+                    "row": ship.row,
+                    "col": ship.col,
+                    "horizontal": bool(ship.horizontal),
+                } for ship in board.ships]
+        return {
+            "rows": self.rows,
+            "cols": self.cols,
+            "turn": self.current_turn,
+            "winner_id": self.winner_id,
+            "boards": boards,
+        }
+
+    def snapshot(self) -> bytes:
+        """
+        Serializes the state of the game (dimensions, fleet, every player's ships
+        and shots received, and whose turn it is) in the compact binary format
+        described in snapshot.py. The observer is not included.
+        :return: the snapshot
+        """
+        out = SnapshotWriter()
+        out.varint(self.rows)
+        out.varint(self.cols)
+        out.varint(len(self.fleet))
+        fleet_index = {}
+        for i, (name, size) in enumerate(self.fleet):
+            fleet_index.setdefault((name, size), i)
+            out.string(name)
+            out.varint(size)
+
+        player_ids = list(self.players)
+        out.varint(len(player_ids))
+        for player_id in player_ids:
+            board = self.players[player_id]
+            out.string(player_id)
+            out.varint(player_id in self.ready_players)
+            out.varint(len(board.ships))
+            for ship in board.ships:
+                # Ships are stored as an index into the fleet rather than by name
+                out.varint(fleet_index[(ship.name, ship.size)])
+                out.varint(ship.row)
+                out.varint(ship.col)
+                out.varint(bool(ship.horizontal))
+            out.raw(board.shots_to_bytes())
+
+        out.varint(player_ids.index(self.current_turn) + 1 if self.current_turn in self.players else 0)
+        return out.getvalue()
+
+    def restore(self, data: bytes):
+        """
+        Replaces the state of this game with the state captured by `snapshot`. No
+        events are published.
+        :param data: a snapshot produced by `snapshot`
+        :raises GameError: if the snapshot is malformed or of an unsupported version
+        """
+        reader = SnapshotReader(data)
+        try:
+            rows = reader.varint()
+            cols = reader.varint()
+            fleet = tuple((reader.string(), reader.varint()) for _ in range(reader.varint()))
+
+            players = {}
+            ready_players = set()
+            for _ in range(reader.varint()):
+                player_id = reader.string()
+                if reader.varint():
+                    ready_players.add(player_id)
+                ship_data = []
+                for _ in range(reader.varint()):
+                    name, size = fleet[reader.varint()]
+                    ship_data.append({"name": name, "size": size, "row": reader.varint(),
+                                      "col": reader.varint(), "horizontal": bool(reader.varint())})
+                board = new_board(rows, cols)
+                board.place_fleet(ship_data)
+                board.load_shots(reader.raw())
+                players[player_id] = board
+
+            turn = reader.varint()
+            current_turn = list(players)[turn - 1] if turn else None
+        except (IndexError, UnicodeDecodeError, ValueError) as err:
+            raise SnapshotError(f"Malformed game snapshot: {err}") from None
+
+        self.rows = rows
+        self.cols = cols
+        self.fleet = fleet
+        self.players = players
+        self.ready_players = ready_players
+        self.current_turn = current_turn
+        # The winner, if any, is the player whose opponent has no ships afloat
+        self.winner_id = None
+        for player_id in players:
+            opponents = [board for other_id, board in players.items() if other_id != player_id]
+            if opponents and all(board.all_ships_sunk() for board in opponents):
+                self.winner_id = player_id
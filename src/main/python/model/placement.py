@@ -0,0 +1,119 @@
+#
+# placement.py:
+# This module validates a player's proposed fleet placement before any of it
+# is applied to a Board.
+#
+
+from collections import Counter
+
+# The classic fleet, as (name, size) pairs. A placement must use exactly these ships.
+STANDARD_FLEET = (
+    ("Carrier", 5),
+    ("Battleship", 4),
+    ("Cruiser", 3),
+    ("Submarine", 3),
+    ("Destroyer", 2),
+)
+
+def parse_fleet(spec):
+    """
+    Parses a fleet specification such as "Carrier:5,Destroyer:2*3" into (name, size)
+    pairs. An optional `*count` suffix repeats a ship. An empty specification
+    means the standard fleet.
+    :param spec: the fleet specification string
+    :return: tuple of (name, size) pairs
+    """
+    if not spec.strip():
+        return STANDARD_FLEET
+    fleet = []
+    for item in spec.split(","):
+        name, _, size = item.strip().partition(":")
+        size, _, count = size.partition("*")
+        fleet.extend([(name.strip(), int(size))] * int(count or 1))
+    return tuple(fleet)
+
+
+# Reasons a placement can be rejected
+MALFORMED = "malformed"
+OUT_OF_BOUNDS = "out_of_bounds"
+OVERLAP = "overlap"
+UNKNOWN_SHIP = "unknown_ship"
+MISSING_SHIP = "missing_ship"
+
+
+class PlacementRejection:
+    """
+    Describes one problem found in a proposed placement. `index` is the position
+    of the offending entry in the submitted ship list (None for a ship that is
+    missing altogether), and `cell` is the offending (row, col), if any.
+    """
+    def __init__(self, reason, name, index=None, cell=None):
+        self.reason = reason
+        self.name = name
+        self.index = index
+        self.cell = cell
+
+    def __str__(self):
+        detail = f" at {self.cell}" if self.cell is not None else ""
+        return f"{self.reason}: {self.name}{detail}"
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def validate_placement(ship_data, rows, cols, fleet=STANDARD_FLEET):
+    """
+    Validates a list of ship placements (in the form accepted by
+    GameModel.place_ships) in a single pass over the ships' cells, using an
+    occupancy grid to detect overlaps.
+    :param ship_data: list of dicts with `name`, `size`, `row`, `col` and optional `horizontal`
+    :param rows: number of rows on the board
+    :param cols: number of columns on the board
+    :param fleet: the (name, size) pairs that must be placed
+    :return: list of PlacementRejection objects; empty if the placement is valid
+    """
+    rejections = []
+    grid = bytearray(rows * cols)
+    unplaced = Counter(fleet)
+    for index, data in enumerate(ship_data):
+        try:
+            name, size, row, col = data["name"], data["size"], data["row"], data["col"]
+            horizontal = data.get("horizontal", True)
+        except (KeyError, TypeError, AttributeError):
+            rejections.append(PlacementRejection(MALFORMED, None, index))
+            continue
+        if not isinstance(name, str):
+            rejections.append(PlacementRejection(MALFORMED, None, index))
+            continue
+        if not (_is_int(size) and _is_int(row) and _is_int(col) and size > 0 and isinstance(horizontal, bool)):
+            rejections.append(PlacementRejection(MALFORMED, name, index))
+            continue
+
+        key = (name, size)
+        if unplaced[key]:
+            unplaced[key] -= 1
+        else:
+            rejections.append(PlacementRejection(UNKNOWN_SHIP, name, index))
+
+        # Cells are marked only once the whole ship is known to be valid, so that
+        # a rejected ship doesn't cause spurious overlaps for the ships after it.
+        row_step, col_step = (0, 1) if horizontal else (1, 0)
+        cells = []
+        for i in range(size):
+            r = row + i * row_step
+            c = col + i * col_step
+            if not (0 <= r < rows and 0 <= c < cols):
+                rejections.append(PlacementRejection(OUT_OF_BOUNDS, name, index, (r, c)))
+                break
+            if grid[r * cols + c]:
+                rejections.append(PlacementRejection(OVERLAP, name, index, (r, c)))
+                break
+            cells.append(r * cols + c)
+        else:
+            for cell in cells:
+                grid[cell] = 1
+
+    for (name, _), count in unplaced.items():
+        rejections.extend(PlacementRejection(MISSING_SHIP, name) for _ in range(count))
+    return rejections
@@ -0,0 +1,187 @@
+#
+# placement_tables.py
+# This module precomputes every legal placement of a ship on an empty board,
+# and uses those tables to generate random fleets quickly, one at a time or
+# in bulk.
+#
+
+import random
+from functools import lru_cache
+
+import numpy as np
+
+from .errors import FleetError
+from .model import BITBOARD_MAX_CELLS
+
+# Random placements drawn for one ship before giving up on the fleet built so
+# far, and fleets started over before concluding that the fleet doesn't fit
+SHIP_ATTEMPTS = 100
+FLEET_ATTEMPTS = 100
+
+
+class PlacementTable:
+    """
+    All legal placements of a ship of one length on an empty rows x cols board.
+    Entry i of `starts` is the (row, col, horizontal) of a placement, and entry i
+    of `masks` is its footprint as a bitmask in the same layout Board uses
+    (bit index = row * cols + col). `words` holds the same footprints as rows of
+    64-bit words, for vectorized overlap tests.
+    """
+
+    def __init__(self, rows: int, cols: int, length: int):
+        self.rows = rows
+        self.cols = cols
+        self.length = length
+        self.starts: list[tuple[int, int, bool]] = []
+        self.masks: list[int] = []
+        horizontal_mask = (1 << length) - 1
+        vertical_mask = sum(1 << (i * cols) for i in range(length))
+        for row in range(rows):
+            for col in range(cols - length + 1):
+                self.starts.append((row, col, True))
+                self.masks.append(horizontal_mask << (row * cols + col))
+        if length > 1:
+            for row in range(rows - length + 1):
+                for col in range(cols):
+                    self.starts.append((row, col, False))
+                    self.masks.append(vertical_mask << (row * cols + col))
+
+        word_count = (rows * cols + 63) // 64
+        self.words = np.array([[mask >> (64 * w) & 0xFFFFFFFFFFFFFFFF for w in range(word_count)]
+                               for mask in self.masks], dtype=np.uint64).reshape(len(self.masks), word_count)
+
+    def __len__(self):
+        return len(self.starts)
+
+
+@lru_cache(maxsize=None)
+def placement_table(rows: int, cols: int, length: int) -> PlacementTable:
+    """Returns the (cached) placement table for a ship length on a board of the given size."""
+    if rows * cols > BITBOARD_MAX_CELLS:
+        raise ValueError(f"placement tables support at most {BITBOARD_MAX_CELLS} cells")
+    return PlacementTable(rows, cols, length)
+
+
+def _ship_data(fleet, placements) -> list[dict]:
+    return [{"name": name, "size": size, "row": row, "col": col, "horizontal": horizontal}
+            for (name, size), (row, col, horizontal) in zip(fleet, placements)]
+
+
+def _check_fleet(rows: int, cols: int, fleet):
+    # Rules out fleets that obviously can't fit, which would otherwise make
+    # every attempt fail (or leave a ship without any legal placement)
+    for name, size in fleet:
+        if not 1 <= size <= max(rows, cols):
+            raise FleetError(f"{name} of size {size} doesn't fit on a {rows}x{cols} board")
+    if sum(size for _, size in fleet) > rows * cols:
+        raise FleetError(f"Fleet doesn't fit on a {rows}x{cols} board")
+
+
+def _no_fit(rows: int, cols: int) -> FleetError:
+    return FleetError(f"Couldn't fit the fleet on a {rows}x{cols} board in {FLEET_ATTEMPTS} attempts")
+
+
+def random_fleet(rows: int, cols: int, fleet, rng: random.Random) -> list[dict]:
+    """
+    Places every ship of the fleet at a random legal position, in the form
+    accepted by GameModel.place_ships. If the ships placed so far leave no room
+    for the next one, the whole fleet is started over.
+    :raises GameError: if the fleet can't be placed
+    """
+    _check_fleet(rows, cols, fleet)
+    place = _place_without_tables if rows * cols > BITBOARD_MAX_CELLS else _place_with_tables
+    for _ in range(FLEET_ATTEMPTS):
+        placements = place(rows, cols, fleet, rng)
+        if placements is not None:
+            return _ship_data(fleet, placements)
+    raise _no_fit(rows, cols)
+
+
+def _place_with_tables(rows, cols, fleet, rng):
+    # Returns None if some ship found no room within SHIP_ATTEMPTS draws
+    occupied = 0
+    placements = []
+    for name, size in fleet:
+        table = placement_table(rows, cols, size)
+        for _ in range(SHIP_ATTEMPTS):
+            i = rng.randrange(len(table))
+            if not table.masks[i] & occupied:
+                break
+        else:
+            return None
+        occupied |= table.masks[i]
+        placements.append(table.starts[i])
+    return placements
+
+
+def _place_without_tables(rows, cols, fleet, rng):
+    # For boards too large to tabulate; like _place_with_tables, but checks cells
+    occupied = set()
+    placements = []
+    for name, size in fleet:
+        orientations = [horizontal for horizontal, side in ((True, cols), (False, rows)) if size <= side]
+        for _ in range(SHIP_ATTEMPTS):
+            horizontal = rng.choice(orientations)
+            row = rng.randrange(rows if horizontal else rows - size + 1)
+            col = rng.randrange(cols - size + 1 if horizontal else cols)
+            cells = {(row, col + i) if horizontal else (row + i, col) for i in range(size)}
+            if not cells & occupied:
+                break
+        else:
+            return None
+        occupied |= cells
+        placements.append((row, col, horizontal))
+    return placements
+
+
+def sample_fleets(rows: int, cols: int, fleet, count: int, seed=None) -> np.ndarray:
+    """
+    Generates `count` random legal fleets at once. Ships are placed largest first;
+    for each ship, a random placement is drawn for every fleet, and only the fleets
+    where it overlaps an earlier ship draw again. Fleets that find no room for a
+    ship are started over.
+    :return: array of shape (count, len(fleet)) whose entry [n, k] is the index of
+        ship k's placement in fleet n, in that ship's PlacementTable; see
+        `fleet_ship_data` to convert a row into ship data
+    :raises GameError: if the fleet can't be placed
+    """
+    _check_fleet(rows, cols, fleet)
+    rng = np.random.default_rng(seed)
+    choices = np.empty((count, len(fleet)), dtype=np.int32)
+    pending = np.arange(count)
+    for _ in range(FLEET_ATTEMPTS):
+        if not pending.size:
+            return choices
+        sampled, placed = _sample_fleets_once(rows, cols, fleet, pending.size, rng)
+        choices[pending[placed]] = sampled[placed]
+        pending = pending[~placed]
+    if pending.size:
+        raise _no_fit(rows, cols)
+    return choices
+
+
+def _sample_fleets_once(rows, cols, fleet, count, rng):
+    # Returns the choices and which of the fleets were placed in full
+    choices = np.empty((count, len(fleet)), dtype=np.int32)
+    occupied = np.zeros((count, (rows * cols + 63) // 64), dtype=np.uint64)
+    placed = np.ones(count, dtype=np.bool_)
+    for k in sorted(range(len(fleet)), key=lambda k: -fleet[k][1]):
+        table = placement_table(rows, cols, fleet[k][1])
+        pending = np.flatnonzero(placed)
+        for _ in range(SHIP_ATTEMPTS):
+            if not pending.size:
+                break
+            drawn = rng.integers(len(table), size=pending.size)
+            fits = ~(occupied[pending] & table.words[drawn]).any(axis=1)
+            accepted = pending[fits]
+            choices[accepted, k] = drawn[fits]
+            occupied[accepted] |= table.words[drawn[fits]]
+            pending = pending[~fits]
+        placed[pending] = False
+    return choices, placed
+
+
+def fleet_ship_data(rows: int, cols: int, fleet, choices) -> list[dict]:
+    """Converts one row of `sample_fleets` output into ship data for GameModel.place_ships."""
+    return _ship_data(fleet, (placement_table(rows, cols, size).starts[i]
+                              for (_, size), i in zip(fleet, choices)))
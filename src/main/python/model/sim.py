@@ -0,0 +1,211 @@
+#
+# sim.py
+# A headless self-play simulator that plays complete games between automated
+# strategies directly against GameModel, without a game server or GUI.
+#
+# Run it with `python -m model.sim --help` (with PYTHONPATH=src/main/python).
+#
+
+import argparse
+import os
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+
+from .ai import ProbabilityStrategy
+from .events import AttackEvent, ShipSunkEvent, GameOverEvent
+from .model import GameModel, BOARD_SIZE
+from .placement import parse_fleet
+from .placement_tables import random_fleet
+
+PLAYERS = ("player1", "player2")
+
+
+class RandomStrategy:
+    """Fires at a uniformly random cell that hasn't been attacked yet."""
+
+    def __init__(self, rows: int, cols: int, fleet, rng: random.Random):
+        self._cells = [(row, col) for row in range(rows) for col in range(cols)]
+        rng.shuffle(self._cells)
+
+    def next_shot(self) -> tuple[int, int]:
+        return self._cells.pop()
+
+    def record(self, row: int, col: int, result: str, sunk: str = None):
+        pass
+
+
+class HuntTargetStrategy:
+    """
+    Hunts on a checkerboard pattern (every ship covers at least one cell of each
+    color) until it gets a hit, then targets the hit cell's neighbours until
+    no unresolved hits remain.
+    """
+
+    def __init__(self, rows: int, cols: int, fleet, rng: random.Random):
+        self.rows = rows
+        self.cols = cols
+        self._shot = set()
+        self._hunt = [(row, col) for row in range(rows) for col in range(cols) if (row + col) % 2 == 0]
+        self._spare = [(row, col) for row in range(rows) for col in range(cols) if (row + col) % 2 == 1]
+        rng.shuffle(self._hunt)
+        rng.shuffle(self._spare)
+        self._targets = []
+
+    def next_shot(self) -> tuple[int, int]:
+        for cells in (self._targets, self._hunt, self._spare):
+            while cells:
+                cell = cells.pop()
+                if cell not in self._shot:
+                    return cell
+        raise RuntimeError("no cells left to attack")
+
+    def record(self, row: int, col: int, result: str, sunk: str = None):
+        self._shot.add((row, col))
+        if result == "hit":
+            for r, c in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+                if 0 <= r < self.rows and 0 <= c < self.cols and (r, c) not in self._shot:
+                    self._targets.append((r, c))
+
+
+# Strategies available to the simulator, by name. A strategy is constructed with
+# the board dimensions, the fleet and a random number generator. It must provide
+# `next_shot()`, returning the (row, col) to attack, and `record(row, col, result, sunk)`,
+# which is called with the outcome of each of its shots.
+STRATEGIES: dict[str, Callable] = {
+    "random": RandomStrategy,
+    "hunt": HuntTargetStrategy,
+    "probability": ProbabilityStrategy,
+}
+
+
+class _LastAttack:
+    """A GameModel observer that remembers the outcome of the most recent attack."""
+
+    def __init__(self):
+        self.result = None
+        self.sunk = None
+        self.winner_id = None
+
+    def notify(self, event):
+        if isinstance(event, AttackEvent):
+            self.result = event.result
+            self.sunk = None
+        elif isinstance(event, ShipSunkEvent):
+            self.sunk = event.ship_name
+        elif isinstance(event, GameOverEvent):
+            self.winner_id = event.winner_id
+
+
+def play_game(strategies: tuple[str, str], rows: int, cols: int, fleet, seed: int) -> dict:
+    """
+    Plays one complete game between two named strategies.
+    :return: dict with the winning strategy's seat, shot count and phase timings (seconds)
+    """
+    rng = random.Random(seed)
+    observer = _LastAttack()
+    model = GameModel(observer, fleet=fleet, rows=rows, cols=cols)
+    players = {player_id: STRATEGIES[name](rows, cols, fleet, rng) for player_id, name in zip(PLAYERS, strategies)}
+
+    start = time.perf_counter()
+    for player_id in PLAYERS:
+        model.place_ships(player_id, random_fleet(rows, cols, fleet, rng))
+    placed = time.perf_counter()
+
+    shots = 0
+    decide_time = attack_time = record_time = 0.0
+    while observer.winner_id is None:
+        player = players[model.current_turn]
+        before = time.perf_counter()
+        row, col = player.next_shot()
+        decided = time.perf_counter()
+        model.attack(model.current_turn, row, col)
+        attacked = time.perf_counter()
+        # Recording the outcome is the strategy's work (the probability
+        # strategy updates its heatmap here), so it isn't counted as the model's
+        player.record(row, col, observer.result, observer.sunk)
+        recorded = time.perf_counter()
+        decide_time += decided - before
+        attack_time += attacked - decided
+        record_time += recorded - attacked
+        shots += 1
+
+    return {
+        "winner": PLAYERS.index(observer.winner_id),
+        "shots": shots,
+        "place_time": placed - start,
+        "decide_time": decide_time,
+        "attack_time": attack_time,
+        "record_time": record_time,
+    }
+
+
+def play_games(strategies: tuple[str, str], rows: int, cols: int, fleet, seeds: list[int]) -> list[dict]:
+    """Plays one game per seed; this is the unit of work handed to each worker process."""
+    return [play_game(strategies, rows, cols, fleet, seed) for seed in seeds]
+
+
+def run(games: int, workers: int, strategies: tuple[str, str], rows: int, cols: int, fleet, seed: int) -> dict:
+    """
+    Plays `games` games spread across `workers` processes and summarizes the results.
+    :return: dict of summary statistics
+    """
+    seeds = [seed + i for i in range(games)]
+    # A few chunks per worker keeps the workers busy without paying IPC costs per game
+    chunk_size = max(1, games // (workers * 4))
+    chunks = [seeds[i:i + chunk_size] for i in range(0, games, chunk_size)]
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(play_games, strategies, rows, cols, fleet, chunk) for chunk in chunks]
+        for future in futures:
+            results.extend(future.result())
+    elapsed = time.perf_counter() - start
+
+    shots = [result["shots"] for result in results]
+    total_shots = sum(shots)
+    return {
+        "games": len(results),
+        "elapsed": elapsed,
+        "games_per_second": len(results) / elapsed,
+        "shots_per_game": statistics.mean(shots),
+        "wins": [sum(1 for result in results if result["winner"] == seat) for seat in range(len(PLAYERS))],
+        "place_us_per_game": sum(result["place_time"] for result in results) / len(results) * 1e6,
+        "decide_us_per_shot": sum(result["decide_time"] for result in results) / total_shots * 1e6,
+        "attack_us_per_shot": sum(result["attack_time"] for result in results) / total_shots * 1e6,
+        "record_us_per_shot": sum(result["record_time"] for result in results) / total_shots * 1e6,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="play automated Battleship games against the model")
+    parser.add_argument("-n", "--games", type=int, default=1000, help="number of games to play")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("-a", "--strategy-a", choices=STRATEGIES, default="hunt", help="strategy for player 1")
+    parser.add_argument("-b", "--strategy-b", choices=STRATEGIES, default="random", help="strategy for player 2")
+    parser.add_argument("--rows", type=int, default=BOARD_SIZE, help="number of rows on each board")
+    parser.add_argument("--cols", type=int, default=BOARD_SIZE, help="number of columns on each board")
+    parser.add_argument("--fleet", default="", help="fleet as comma-separated name:size[*count] items")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the first game")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    fleet = parse_fleet(args.fleet)
+    workers = args.workers or os.cpu_count()
+    strategies = (args.strategy_a, args.strategy_b)
+    summary = run(args.games, workers, strategies, args.rows, args.cols, fleet, args.seed)
+
+    print(f"{summary['games']} games ({strategies[0]} vs {strategies[1]}) on {args.rows}x{args.cols} "
+          f"with {workers} workers in {summary['elapsed']:.2f}s")
+    print(f"games/second:     {summary['games_per_second']:.1f}")
+    print(f"shots/game:       {summary['shots_per_game']:.1f}")
+    print(f"wins:             {strategies[0]} {summary['wins'][0]}, {strategies[1]} {summary['wins'][1]}")
+    print(f"placement:        {summary['place_us_per_game']:.1f} us/game")
+    print(f"strategy shot:    {summary['decide_us_per_shot']:.2f} us/shot")
+    print(f"strategy record:  {summary['record_us_per_shot']:.2f} us/shot")
+    print(f"model attack:     {summary['attack_us_per_shot']:.2f} us/shot")
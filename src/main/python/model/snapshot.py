@@ -0,0 +1,74 @@
+#
+# snapshot.py
+# This module defines the low-level encoding used by GameModel.snapshot and
+# GameModel.restore (see model.py).
+#
+# A snapshot is a short header (MAGIC followed by a version byte) and then a
+# sequence of fields. Integers are unsigned LEB128 varints, strings are a
+# varint length followed by UTF-8 bytes, and byte strings are a varint length
+# followed by the raw bytes. Shot history is stored as a packed bitmap with one
+# bit per cell, least-significant bit first.
+#
+
+from .errors import SnapshotError
+
+MAGIC = b"BS"
+VERSION = 1
+
+
+class SnapshotWriter:
+    def __init__(self):
+        self._buf = bytearray(MAGIC)
+        self._buf.append(VERSION)
+
+    def varint(self, value):
+        while value > 0x7F:
+            self._buf.append(value & 0x7F | 0x80)
+            value >>= 7
+        self._buf.append(value)
+
+    def raw(self, data):
+        self.varint(len(data))
+        self._buf += data
+
+    def string(self, value):
+        self.raw(value.encode("utf-8"))
+
+    def getvalue(self):
+        return bytes(self._buf)
+
+
+class SnapshotReader:
+    def __init__(self, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise SnapshotError("Not a game snapshot")
+        if data[len(MAGIC):len(MAGIC) + 1] != bytes([VERSION]):
+            raise SnapshotError("Unsupported snapshot version")
+        self._data = memoryview(data)
+        self._pos = len(MAGIC) + 1
+
+    def varint(self):
+        value = 0
+        shift = 0
+        try:
+            while True:
+                byte = self._data[self._pos]
+                self._pos += 1
+                value |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    return value
+                shift += 7
+        except IndexError:
+            raise SnapshotError("Truncated game snapshot") from None
+
+    def raw(self):
+        length = self.varint()
+        end = self._pos + length
+        if end > len(self._data):
+            raise SnapshotError("Truncated game snapshot")
+        data = bytes(self._data[self._pos:end])
+        self._pos = end
+        return data
+
+    def string(self):
+        return self.raw().decode("utf-8")
@@ -0,0 +1,170 @@
+#
+# async_connection.py:
+# This module defines the connection and handshake classes used when the game
+# server runs in asyncio mode (see GameListener in listener.py).
+#
+
+import asyncio
+import logging
+import threading
+from http import HTTPStatus
+from typing import Any, Callable, Dict
+from urllib.parse import urlparse, parse_qs
+
+import websockets
+from websockets.legacy.server import WebSocketServerProtocol
+
+from gamecomm.server import GameConnection, ConnectionClosedOK, ConnectionClosedError
+
+from .outbound import OutboundQueue, RESYNC_POLICY
+from .wire import JSON_PROTOCOL, decode_request, encode_frame
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncGameConnection(GameConnection):
+    """
+    A GameConnection for a WebSocket served by an asyncio event loop.
+
+    Requests are received with `recv_async`, which suspends the calling task
+    until a message arrives. `send` may be called from any thread (for example
+    by GamePublisher while the model executes a command). It queues the message
+    for a writer task on the event loop (see OutboundQueue), so a slow client
+    never blocks the caller. Messages are sent using the connection's
+    `wire_protocol`; requests may arrive in either protocol.
+    """
+
+    def __init__(self, websocket: WebSocketServerProtocol, claims: Dict = None,
+                 queue_limit: int = 256, queue_policy: str = RESYNC_POLICY):
+        super().__init__(claims)
+        self._websocket = websocket
+        self._peer_address = websocket.remote_address
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._ready = asyncio.Event()
+        self.wire_protocol = JSON_PROTOCOL
+        self.outbound = OutboundQueue(queue_limit, queue_policy, wakeup=self._wakeup, encode=self._encode)
+        self._writer = self._loop.create_task(self._write())
+
+    def _wakeup(self):
+        if threading.get_ident() == self._loop_thread:
+            self._ready.set()
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._ready.set)
+
+    async def _write(self):
+        while True:
+            message_text = self.outbound.get_nowait()
+            if message_text is None:
+                if self.outbound.closed:
+                    return
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            try:
+                await self._websocket.send(message_text)
+            except websockets.ConnectionClosed:
+                return
+
+    def _encode(self, message: Any):
+        return encode_frame(message, self.wire_protocol)
+
+    def send(self, message: Any) -> None:
+        self.send_frame(self._encode(message))
+
+    def send_frame(self, message_text) -> None:
+        """Sends a message that has already been encoded (see `send_frame` in outbound.py)."""
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("send %s: %s", self, message_text)
+        self.outbound.put(message_text)
+
+    def recv(self, timeout: int = None) -> Any:
+        raise TypeError("an AsyncGameConnection must be read using recv_async")
+
+    async def recv_async(self) -> Any:
+        """
+        Waits for the next message from the client.
+        :return: the decoded message
+        :raises ConnectionClosedOK: if the client closed the connection normally
+        :raises ConnectionClosedError: if the connection failed
+        """
+        try:
+            message_text = await self._websocket.recv()
+        except websockets.ConnectionClosedOK:
+            raise ConnectionClosedOK() from None
+        except websockets.ConnectionClosedError as err:
+            raise ConnectionClosedError(err) from None
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("recv %s: %s", self, message_text)
+        return decode_request(message_text)
+
+    def close(self):
+        """Closes the WebSocket; safe to call from any thread."""
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(lambda: self._loop.create_task(self._websocket.close()))
+
+    async def flush(self):
+        """Waits until queued messages have been written, then stops the writer task."""
+        self.outbound.close()
+        await self._writer
+
+    def __str__(self):
+        return f"ws {self._peer_address}"
+
+
+class AuthenticatingProtocol(WebSocketServerProtocol):
+    """
+    Performs the same admission checks as the thread-mode listener during the
+    WebSocket handshake. The game ID is the last segment of the request path and
+    the token comes from a Bearer authorization header or a `token` query
+    parameter. Claims for an admitted client are left in the `claims` attribute.
+
+    When authentication is disabled, claims are built from the request itself:
+    the game ID from the path, and optionally `uid` and comma-separated
+    `players` query parameters. This lets headless clients choose their game
+    and identity.
+    """
+
+    def __init__(self, *args, on_authenticate: Callable[[str, str], Dict] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_authenticate = on_authenticate
+        self.claims = None
+
+    async def process_request(self, path, request_headers):
+        url_parts = urlparse(path)
+        gid = url_parts.path.split("/")[-1]
+        query = parse_qs(url_parts.query)
+
+        if not self.on_authenticate:
+            players = query.get("players")
+            self.claims = {
+                "aud": gid or None,
+                "sub": query.get("uid", [None])[0],
+                "ply": players[0].split(",") if players else None,
+            }
+            return None
+
+        if not gid:
+            logger.error("authentication failed: no gid")
+            return HTTPStatus.BAD_REQUEST, [], b""
+
+        token = None
+        auth = request_headers.get("Authorization")
+        if auth:
+            if not auth.startswith("Bearer "):
+                logger.error("authentication failed: invalid authorization header value")
+                return HTTPStatus.UNAUTHORIZED, [], b""
+            token = auth[len("Bearer "):].strip()
+        if not token and "token" in query:
+            token = query["token"][0]
+        if not token:
+            logger.error("authentication failed: token not present")
+            return HTTPStatus.UNAUTHORIZED, [], b""
+
+        # Signature checks are CPU-bound, so keep them off the event loop
+        claims = await asyncio.get_running_loop().run_in_executor(None, self.on_authenticate, gid, token)
+        if not claims:
+            logger.error("authentication failed: token not valid")
+            return HTTPStatus.UNAUTHORIZED, [], b""
+        self.claims = claims
+        return None
@@ -0,0 +1,93 @@
+#
+# chat.py:
+# This module defines the per-game chat channel.
+#
+
+import time
+from collections import deque
+from threading import Lock
+
+from model import RequestError, RateLimitError
+
+from .publisher import GamePublisher
+
+CHAT_EVENT = "ChatEvent"
+
+
+class TokenBucket:
+    """
+    Allows bursts of up to `burst` actions, refilled at `rate` actions per second.
+    """
+
+    def __init__(self, rate: float, burst: float, now: float = None):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic() if now is None else now
+
+    def take(self, now: float = None) -> bool:
+        """Takes one token if one is available. :return: True if it was"""
+        now = time.monotonic() if now is None else now
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class ChatChannel:
+    """
+    Relays chat messages among the clients of one game. Messages go out through
+    the game's GamePublisher, so they reach exactly the current subscribers by
+    way of their outbound queues. Each user's messages are rate limited with a
+    TokenBucket and capped in length, and the most recent messages are kept so
+    they can be sent to clients that join later.
+
+    Chat doesn't involve the model, so messages are relayed on the sender's
+    connection thread (or task) rather than through the game's mailbox, and
+    never wait behind game commands or delay them.
+    """
+
+    def __init__(self, publisher: GamePublisher, rate: float, burst: float, max_length: int, history: int):
+        self.publisher = publisher
+        self.rate = rate
+        self.burst = burst
+        self.max_length = max_length
+        self._buckets: dict[str, TokenBucket] = {}
+        self._history: deque[dict] = deque(maxlen=history)
+        self._lock = Lock()
+
+    def post(self, sender: str, text: str):
+        """
+        Relays a message from `sender` to every client in the game.
+        :raises GameError: if the message is empty or too long, or the sender
+            has exceeded the rate limit
+        """
+        text = text.strip()
+        if not text:
+            raise RequestError("Chat message cannot be empty.")
+        if len(text) > self.max_length:
+            raise RequestError(f"Chat message is longer than {self.max_length} characters.")
+        with self._lock:
+            bucket = self._buckets.get(sender)
+            if bucket is None:
+                bucket = self._buckets[sender] = TokenBucket(self.rate, self.burst)
+            if not bucket.take():
+                raise RateLimitError("Sending chat messages too quickly.")
+            message = {
+                "event": CHAT_EVENT,
+                "message": f"{sender}: {text}",
+                "sender": sender,
+            }
+            self._history.append(message)
+            # Publishing only queues the message, so it's safe to hold the lock,
+            # which keeps history in the order clients receive messages
+            self.publisher.publish_message(message)
+
+    def send_history(self, connection):
+        """Sends the recent messages to a client that just joined the game."""
+        with self._lock:
+            history = list(self._history)
+        if history:
+            self.publisher.send_messages(connection, history)
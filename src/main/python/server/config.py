@@ -29,6 +29,18 @@ LOCAL_IP = os.environ.get("LOCAL_IP", "127.0.0.1")
 # Local port on which the server's WebSocket endpoint will listen.
 WS_LISTENER_PORT = os.environ.get("WS_LISTENER_PORT", "10020")
 
+# Local port on which the server's metrics are served over HTTP, in the
+# Prometheus text format, at /metrics. With several shards, the front process
+# serves the health of each shard there, and shard N serves its own metrics on
+# the port N + 1 above it. Empty (the default) disables metrics; 10021 is the
+# conventional choice.
+METRICS_PORT = os.environ.get("METRICS_PORT", "")
+
+# Local IP on which the server's metrics are served. Unlike the game endpoint,
+# it defaults to the loopback address, so metrics aren't exposed to clients
+# unless asked for.
+METRICS_IP = os.environ.get("METRICS_IP", "127.0.0.1")
+
 # A boolean flag that indicates whether bearer token authentication
 # of WebSocket connections is to be enabled.
 ENABLE_AUTH = os.environ.get("ENABLE_AUTH", "False") == "True"
@@ -41,3 +53,64 @@ TOKEN_ISSUER_URI = os.environ.get("TOKEN_ISSUER_URI", "urn:ece4564:token-issuer"
 # by the REST API service to sign bearer tokens used for game server
 # admittance.
 PUBLIC_KEY_FILE = os.environ.get("PUBLIC_KEY_FILE", "public_key.pem")
+
+# Validated tokens are cached until they expire, so that reconnecting clients
+# don't each cost a signature check; tokens found invalid are rejected without
+# another check for TOKEN_NEGATIVE_TTL_SECONDS. At most TOKEN_CACHE_SIZE
+# outcomes are kept.
+TOKEN_CACHE_SIZE = os.environ.get("TOKEN_CACHE_SIZE", "10000")
+TOKEN_NEGATIVE_TTL_SECONDS = os.environ.get("TOKEN_NEGATIVE_TTL_SECONDS", "5")
+
+# How client connections are served: "thread" gives each client its own polling
+# thread, "async" serves every client from a single asyncio event loop.
+SERVER_MODE = os.environ.get("SERVER_MODE", "thread")
+
+# Number of threads that apply commands to models. Every game's commands go
+# through a queue of its own (see mailbox.py); these threads drain the queues
+# of all games, one game at a time each.
+MAILBOX_THREADS = os.environ.get("MAILBOX_THREADS", "8")
+
+# Number of worker processes to spread games across. With more than one, a
+# front process accepts connections and hands each to the worker that owns its
+# game ID, and every worker serves in "async" mode. 0 means one per CPU.
+SHARDS = os.environ.get("SHARDS", "1")
+
+# When games are evicted from memory: this many seconds after the game is won,
+# after this many seconds without any connected clients, and, least recently
+# used first, whenever more than MAX_GAMES games are resident.
+GAME_OVER_GRACE_SECONDS = os.environ.get("GAME_OVER_GRACE_SECONDS", "60")
+IDLE_GAME_TTL_SECONDS = os.environ.get("IDLE_GAME_TTL_SECONDS", "600")
+MAX_GAMES = os.environ.get("MAX_GAMES", "10000")
+
+# Chat limits: each user may send CHAT_RATE messages per second on average, in
+# bursts of up to CHAT_BURST, each at most CHAT_MAX_LENGTH characters long. The
+# last CHAT_HISTORY messages are sent to clients when they join.
+CHAT_RATE = os.environ.get("CHAT_RATE", "1")
+CHAT_BURST = os.environ.get("CHAT_BURST", "5")
+CHAT_MAX_LENGTH = os.environ.get("CHAT_MAX_LENGTH", "500")
+CHAT_HISTORY = os.environ.get("CHAT_HISTORY", "50")
+
+# Number of recent events each game keeps, so that a client that reconnects
+# can resume from the last event it saw; one that has missed more is sent a
+# snapshot of the game instead.
+REPLAY_BUFFER_SIZE = os.environ.get("REPLAY_BUFFER_SIZE", "1024")
+
+# Maximum number of messages waiting to be sent to a client, and what to do with
+# its pending events when a new one won't fit: "resync" discards them and tells
+# the client to refresh, "coalesce" drops a superseded frame (one holding only
+# an older turn change) if there is one and otherwise resyncs, and "disconnect"
+# closes the client's connection.
+OUTBOUND_QUEUE_LIMIT = os.environ.get("OUTBOUND_QUEUE_LIMIT", "256")
+OUTBOUND_QUEUE_POLICY = os.environ.get("OUTBOUND_QUEUE_POLICY", "resync")
+
+# Number of rows and columns on each player's board.
+BOARD_ROWS = os.environ.get("BOARD_ROWS", "10")
+BOARD_COLS = os.environ.get("BOARD_COLS", "10")
+
+# Ships each player must place, as comma-separated `name:size` items, where
+# `name:size*count` repeats a ship. Empty means the classic five-ship fleet.
+FLEET = os.environ.get("FLEET", "")
+
+# Most positions an `attack_batch` salvo may contain. Empty allows one for each
+# of the attacker's ships still afloat.
+SALVO_SIZE = os.environ.get("SALVO_SIZE", "")
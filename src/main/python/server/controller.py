@@ -1,8 +1,17 @@
+import asyncio
 import logging
+import time
+from concurrent.futures import Future
 from threading import Event
 from typing import Callable
 from gamecomm.server import GameConnection, ConnectionClosedOK, ConnectionClosedError
-from model import GameModel, GameError
+from model import GameModel, GameError, PlacementError, RequestError, SeatError, AttackEvent, SalvoEvent
+from model.ai import BotPlayer
+
+from .chat import ChatChannel
+from .metrics import COMMAND_SECONDS, GAME_ERRORS
+from .publisher import GamePublisher
+from .wire import PROTOCOLS
 
 logger = logging.getLogger(__name__)
 
@@ -12,83 +21,239 @@ OK_STATUS = "ok"
 ERROR_STATUS = "error"
 ERROR_KEY = ERROR_STATUS
 MESSAGE_KEY = "message"
+REJECTIONS_KEY = "rejections"
+PROTOCOL_KEY = "protocol"
+SEQ_KEY = "seq"
+SINCE_KEY = "since"
+STATE_KEY = "state"
+CHANGES_KEY = "changes"
 
 PLACE_SHIPS_COMMAND = "place_ships"
 ATTACK_COMMAND = "attack"
+ATTACK_BATCH_COMMAND = "attack_batch"
+ADD_BOT_COMMAND = "add_bot"
+CHAT_COMMAND = "chat"
+SET_PROTOCOL_COMMAND = "set_protocol"
+RESUME_COMMAND = "resume"
+GET_STATE_COMMAND = "get_state"
+
+# Commands that spectators may send, besides chat and set_protocol
+SPECTATOR_COMMANDS = (RESUME_COMMAND, GET_STATE_COMMAND)
+
+# Commands whose latency is recorded under their own name; any other request
+# is recorded as OTHER_COMMAND, so clients can't create arbitrary metrics
+TIMED_COMMANDS = frozenset((
+    PLACE_SHIPS_COMMAND, ATTACK_COMMAND, ATTACK_BATCH_COMMAND, ADD_BOT_COMMAND, CHAT_COMMAND,
+    SET_PROTOCOL_COMMAND, RESUME_COMMAND, GET_STATE_COMMAND,
+))
+OTHER_COMMAND = "other"
+
+# Player ID used for a bot when the game has no vacant named seat
+BOT_PLAYER_ID = "bot"
 
 
 class GameController:
     RECV_TIMEOUT_SECONDS = 0.250
 
     def __init__(self, connection: GameConnection, model: GameModel,
-                 on_close: Callable[[GameConnection], None]):
+                 on_close: Callable[[GameConnection], None], submit: Callable[..., Future],
+                 chat: ChatChannel, publisher: GamePublisher, spectator: bool = False,
+                 reserve_bot_seat: Callable[[str], None] = None, release_bot_seat: Callable[[str], None] = None):
+        """
+        :param submit: queues a callable on the game's command mailbox (see
+            GameServer.submit); every request is executed against the model this way
+        :param chat: the game's chat channel
+        :param publisher: the game's publisher, which replays missed events
+        :param spectator: whether the client may only watch and chat
+        :param reserve_bot_seat: gives a player's seat to a bot, so that the player
+            can no longer play; raises SeatError if the player is connected
+            (see GameServer.reserve_bot_seat)
+        :param release_bot_seat: undoes `reserve_bot_seat` if the bot can't join
+        """
         self.connection = connection
         self.model = model
         self.on_close = on_close
+        self.submit = submit
+        self.chat = chat
+        self.publisher = publisher
+        self.spectator = spectator
+        self.reserve_bot_seat = reserve_bot_seat
+        self.release_bot_seat = release_bot_seat
         self._shutdown = Event()
 
-        # Add connection to model-wide connection list (for chat broadcasting)
-        if not hasattr(self.model, "connections"):
-            self.model.connections = []
-        self.model.connections.append(self.connection)
+    def handle_request(self, request) -> dict:
+        """
+        Executes one client request against the model. This runs in the game's
+        mailbox, never concurrently with another command for the same game.
+        :param request: the request message received from the client
+        :return: the response message to send to the client
+        """
+        logger.debug("received request: %s", request)
+        try:
+            if COMMAND_KEY in request:
+                command = request[COMMAND_KEY]
+                if not isinstance(command, str):
+                    raise RequestError("Command must be a string.")
+                command = command.lower()
+                ok = False
+
+                if command == PLACE_SHIPS_COMMAND:
+                    ships = request.get("ships")
+                    if not isinstance(ships, list):
+                        raise RequestError("Missing or invalid 'ships' list in request.")
+                    self.model.place_ships(self.connection.uid, ships)
+                    ok = True
+
+                elif command == ATTACK_COMMAND:
+                    row = request.get("row")
+                    col = request.get("col")
+                    if not isinstance(row, int) or not isinstance(col, int):
+                        raise RequestError("Missing or invalid 'row' or 'col' for attack.")
+                    self.model.attack(self.connection.uid, row, col)
+                    ok = True
+
+                elif command == ATTACK_BATCH_COMMAND:
+                    cells = request.get("cells")
+                    if not isinstance(cells, list) or not all(
+                            isinstance(cell, list) and len(cell) == 2
+                            and all(isinstance(value, int) for value in cell) for cell in cells):
+                        raise RequestError("Missing or invalid 'cells' list for attack_batch.")
+                    self.model.attack_many(self.connection.uid, cells)
+                    ok = True
+
+                elif command == ADD_BOT_COMMAND:
+                    self.add_bot()
+                    ok = True
+
+                elif command == RESUME_COMMAND:
+                    since = request.get(SEQ_KEY)
+                    if not isinstance(since, int) or since < 0:
+                        raise RequestError("Missing or invalid 'seq' for resume.")
+                    self.resume(since)
+                    ok = True
+
+                elif command == GET_STATE_COMMAND:
+                    since = request.get(SINCE_KEY)
+                    if since is not None and (not isinstance(since, int) or since < 0):
+                        raise RequestError("Invalid 'since' for get_state.")
+                    return self.get_state(since)
+
+                if ok:
+                    return {STATUS_KEY: OK_STATUS}
+                return {
+                    STATUS_KEY: ERROR_STATUS,
+                    ERROR_KEY: {MESSAGE_KEY: f"invalid command '{command}'"}
+                }
+            return {
+                STATUS_KEY: ERROR_STATUS,
+                ERROR_KEY: {MESSAGE_KEY: "must specify command"}
+            }
+
+        except GameError as err:
+            return self.error_response(err)
+
+    @staticmethod
+    def error_response(err: GameError) -> dict:
+        GAME_ERRORS.inc(err.__class__.__name__)
+        error = {MESSAGE_KEY: f"{err.__class__.__name__}: {err}"}
+        if isinstance(err, PlacementError):
+            error[REJECTIONS_KEY] = [{
+                "reason": rejection.reason,
+                "name": rejection.name,
+                "index": rejection.index,
+                "cell": rejection.cell,
+            } for rejection in err.rejections]
+        return {
+            STATUS_KEY: ERROR_STATUS,
+            ERROR_KEY: error
+        }
+
+    @staticmethod
+    def internal_error_response(request, err: Exception) -> dict:
+        # A command that fails with anything but a GameError has hit a bug; that
+        # costs the client the request, but not its session
+        logger.error(f"error executing request {request}", exc_info=err)
+        return {
+            STATUS_KEY: ERROR_STATUS,
+            ERROR_KEY: {MESSAGE_KEY: "internal server error"}
+        }
+
+    def handle_chat(self, request) -> dict:
+        """
+        Relays a chat message. This runs on the client's own thread or task.
+        :param request: the chat request received from the client
+        :return: the response message to send to the client
+        """
+        message = request.get(MESSAGE_KEY, "")
+        try:
+            if not isinstance(message, str):
+                raise RequestError("Chat message must be text.")
+            self.chat.post(self.connection.uid, message)
+        except GameError as err:
+            return self.error_response(err)
+        return {STATUS_KEY: OK_STATUS}
+
+    def handle_set_protocol(self, request) -> dict:
+        """
+        Switches the messages sent to this client to the wire protocol it names
+        (see wire.py), starting with the response to this request. Requests are
+        accepted in either protocol regardless.
+        :param request: the set_protocol request received from the client
+        :return: the response message to send to the client
+        """
+        protocol = request.get(PROTOCOL_KEY)
+        if protocol not in PROTOCOLS or not hasattr(self.connection, "wire_protocol"):
+            return {
+                STATUS_KEY: ERROR_STATUS,
+                ERROR_KEY: {MESSAGE_KEY: f"unsupported protocol '{protocol}'"}
+            }
+        self.connection.wire_protocol = protocol
+        return {STATUS_KEY: OK_STATUS, PROTOCOL_KEY: protocol}
+
+    def _submit(self, request) -> Future:
+        future = Future()
+        # Chat and protocol changes don't involve the model, so they don't wait
+        # in the mailbox behind game commands (or hold them up)
+        command = str(request.get(COMMAND_KEY, "")).lower() if isinstance(request, dict) else None
+        if command == CHAT_COMMAND:
+            future.set_result(self.handle_chat(request))
+            return future
+        if command == SET_PROTOCOL_COMMAND:
+            future.set_result(self.handle_set_protocol(request))
+            return future
+        # Nor do a spectator's game commands, which are refused
+        if self.spectator and command not in SPECTATOR_COMMANDS:
+            future.set_result(self.error_response(SeatError("Spectators can only watch and chat.")))
+            return future
+        # The game may have been shut down since the request arrived
+        try:
+            return self.submit(self.handle_request, request)
+        except GameError as err:
+            future.set_result(self.error_response(err))
+            return future
+
+    @staticmethod
+    def _record_latency(request, started: float):
+        command = str(request.get(COMMAND_KEY, "")).lower() if isinstance(request, dict) else None
+        COMMAND_SECONDS.observe(time.perf_counter() - started, command if command in TIMED_COMMANDS else OTHER_COMMAND)
 
     def run(self):
+        """
+        Serves the client on the calling thread (thread mode), polling the
+        connection so that a stop request is noticed promptly.
+        """
         logger.info(f"connected to {self.connection} for user {self.connection.uid} in game {self.connection.gid}")
         try:
             while not self._shutdown.is_set():
                 try:
                     request = self.connection.recv(self.RECV_TIMEOUT_SECONDS)
-                    logger.info(f"received request: {request}")
-                    if COMMAND_KEY in request:
-                        command = request[COMMAND_KEY].lower()
-                        ok = False
-
-                        if command == PLACE_SHIPS_COMMAND:
-                            ships = request.get("ships")
-                            if not isinstance(ships, list):
-                                raise GameError("Missing or invalid 'ships' list in request.")
-                            self.model.place_ships(self.connection.uid, ships)
-                            ok = True
-
-                        elif command == ATTACK_COMMAND:
-                            row = request.get("row")
-                            col = request.get("col")
-                            if row is None or col is None:
-                                raise GameError("Missing 'row' or 'col' for attack.")
-                            self.model.attack(self.connection.uid, row, col)
-                            ok = True
-
-                        elif command == "chat":
-                            message = request.get("message", "").strip()
-                            if not message:
-                                raise GameError("Chat message cannot be empty.")
-                            sender = self.connection.uid
-                            chat_event = {
-                                "event": "ChatEvent",
-                                "message": f"{sender}: {message}"
-                            }
-                            for conn in getattr(self.model, "connections", []):
-                                conn.publish(chat_event)
-                            ok = True
-
-                        if ok:
-                            self.connection.send({STATUS_KEY: OK_STATUS})
-                        else:
-                            self.connection.send({
-                                STATUS_KEY: ERROR_STATUS,
-                                ERROR_KEY: {MESSAGE_KEY: f"invalid command '{command}'"}
-                            })
-                    else:
-                        self.connection.send({
-                            STATUS_KEY: ERROR_STATUS,
-                            ERROR_KEY: {MESSAGE_KEY: "must specify command"}
-                        })
-
-                except GameError as err:
-                    self.connection.send({
-                        STATUS_KEY: ERROR_STATUS,
-                        ERROR_KEY: {MESSAGE_KEY: f"{err.__class__.__name__}: {err}"}
-                    })
+                    started = time.perf_counter()
+                    try:
+                        response = self._submit(request).result()
+                    except Exception as err:
+                        response = self.internal_error_response(request, err)
+                    self._record_latency(request, started)
+                    self.connection.send(response)
                 except TimeoutError:
                     pass
 
@@ -96,10 +261,106 @@ class GameController:
             pass
         except ConnectionClosedError as err:
             logger.error(f"error communicating with client: {err}")
+        finally:
+            self.on_close(self.connection)
+            logger.info(f"disconnected from {self.connection} for user {self.connection.uid} "
+                        f"in game {self.connection.gid}")
+
+    async def run_async(self):
+        """
+        Serves the client as a task on the event loop (asyncio mode). The task
+        sleeps until a request arrives; stopping closes the connection instead.
+        """
+        logger.info(f"connected to {self.connection} for user {self.connection.uid} in game {self.connection.gid}")
+        try:
+            while not self._shutdown.is_set():
+                request = await self.connection.recv_async()
+                started = time.perf_counter()
+                try:
+                    response = await asyncio.wrap_future(self._submit(request))
+                except Exception as err:
+                    response = self.internal_error_response(request, err)
+                self._record_latency(request, started)
+                self.connection.send(response)
+
+        except ConnectionClosedOK:
+            pass
+        except ConnectionClosedError as err:
+            logger.error(f"error communicating with client: {err}")
+        finally:
+            self.on_close(self.connection)
+            logger.info(f"disconnected from {self.connection} for user {self.connection.uid} "
+                        f"in game {self.connection.gid}")
+
+    def add_bot(self):
+        """
+        Seats a computer opponent in the game, taking the seat of a listed player
+        who hasn't placed ships (e.g. one who dropped), or a new seat if there is none.
+        The bot plays under the ID of the player it replaces, so that player can't
+        take the seat while connected, and only watches if they connect later.
+        """
+        if any(player_id != self.connection.uid for player_id in self.model.players):
+            raise SeatError("Opponent has already placed ships")
+        vacant = [player_id for player_id in (self.connection.players or []) if player_id != self.connection.uid]
+        bot_id = vacant[0] if vacant else BOT_PLAYER_ID
+        if self.reserve_bot_seat:
+            self.reserve_bot_seat(bot_id)
+        logger.info(f"adding bot {bot_id} to game {self.connection.gid}")
+        try:
+            BotPlayer(self.model, bot_id).join()
+        except Exception:
+            if self.release_bot_seat:
+                self.release_bot_seat(bot_id)
+            raise
+
+    def resume(self, since: int):
+        """
+        Catches the client up after it reconnects: sends the events published
+        after the event numbered `since` (the last one the client saw), or a
+        snapshot of the game as the client may see it if some of those events
+        are no longer kept. Both are sent before the response to the command.
+        """
+        if not self.publisher.replay(self.connection, since):
+            viewer_id = None if self.spectator else self.connection.uid
+            self.publisher.send_snapshot(self.connection, self.model.view(viewer_id))
 
-        self.on_close(self.connection)
-        logger.info(f"disconnected from {self.connection} for user {self.connection.uid} in game {self.connection.gid}")
+    def get_state(self, since: int = None) -> dict:
+        """
+        Describes the boards as the client may see them, as of the latest event
+        (whose number is in the response's `seq`). Without `since`, or if the
+        events since then are no longer kept, the response has the whole `state`
+        (see GameModel.view). Otherwise it has just the `changes`: for each
+        player's board, the cells attacked since the event numbered `since`, as
+        [row, col, result] triples, along with `turn` and `winner_id`.
+        """
+        response = {STATUS_KEY: OK_STATUS, SEQ_KEY: self.publisher.seq}
+        events = self.publisher.events_since(since) if since is not None else None
+        if events is None:
+            viewer_id = None if self.spectator else self.connection.uid
+            response[STATE_KEY] = self.publisher.state_to_json(self.model.view(viewer_id))
+            return response
+        changes = {player_id: [] for player_id in self.model.players}
+        for _, event in events:
+            if isinstance(event, AttackEvent):
+                shots = [(event.row, event.col, event.result)]
+            elif isinstance(event, SalvoEvent):
+                shots = event.shots
+            else:
+                continue
+            # Shots land on the board of the attacker's opponent
+            for player_id, cells in changes.items():
+                if player_id != event.attacker_id:
+                    cells.extend([row, col, result] for row, col, result in shots)
+        response[SINCE_KEY] = since
+        response[CHANGES_KEY] = changes
+        response["turn"] = self.model.current_turn
+        response["winner_id"] = self.model.winner_id
+        return response
 
     def stop(self):
         logger.info("signalling stop")
         self._shutdown.set()
+        # In asyncio mode, the controller is waiting on the connection rather than polling
+        close = getattr(self.connection, "close", None)
+        if close:
+            close()
@@ -3,17 +3,40 @@
 # This module defines the GameListener class.
 #
 
+import asyncio
+import functools
 import logging
+import threading
+import time
+from collections import Counter, OrderedDict
 from threading import Lock
 
 from gameauth import TokenValidator, InvalidTokenError
 from gamecomm.server import WsGameListener, GameConnection
+from websockets.legacy.server import serve
 
+import server.config as config
+
+from .async_connection import AsyncGameConnection, AuthenticatingProtocol
+from .metrics import REGISTRY, format_metric, start_metrics_server
+from .outbound import QueuedConnection
 from .server import GameServer
+from .token_cache import TokenCache
 
 
 logger = logging.getLogger(__name__)
 
+# Ways of serving client connections (see GameListener.run)
+THREAD_MODE = "thread"
+ASYNC_MODE = "async"
+
+# Reasons for evicting a game (see GameListener.evict_games)
+FINISHED_EVICTION = "finished"
+IDLE_EVICTION = "idle"
+CAPACITY_EVICTION = "capacity"
+
+EVICTION_INTERVAL_SECONDS = 5.0
+
 
 class GameListener:
     """
@@ -23,27 +46,150 @@ class GameListener:
     "round", "field", etc. If authentication is enabled, the player's client is
     expected to also present an authentication token which will prove the
     identity of the player and his/her authorization to join the specified game.
+
+    Games don't stay resident forever. A finished game is evicted once
+    GAME_OVER_GRACE_SECONDS have passed, a game without connections once it
+    has been idle for IDLE_GAME_TTL_SECONDS, and when more than MAX_GAMES are
+    resident the least recently used games are evicted.
     """
 
-    def __init__(self, local_ip, local_port, token_validator: TokenValidator):
+    def __init__(self, local_ip, local_port, token_validator: TokenValidator, mode: str = THREAD_MODE):
+        if mode not in (THREAD_MODE, ASYNC_MODE):
+            raise ValueError(f"unknown server mode '{mode}'")
         self.local_ip = local_ip
         self.local_port = local_port
         self.token_validator = token_validator
+        self.token_cache = TokenCache(token_validator, int(config.TOKEN_CACHE_SIZE),
+                                      float(config.TOKEN_NEGATIVE_TTL_SECONDS)) if token_validator else None
+        self.mode = mode
         # The following dictionary is used to associate game instance identifiers
-        # with a corresponding instance of the GameServer class.
-        self._servers: dict[str, GameServer] = {}
+        # with a corresponding instance of the GameServer class. It is kept in
+        # least to most recently used order.
+        self._servers: OrderedDict[str, GameServer] = OrderedDict()
         self._lock = Lock()
+        self.grace_seconds = float(config.GAME_OVER_GRACE_SECONDS)
+        self.idle_ttl_seconds = float(config.IDLE_GAME_TTL_SECONDS)
+        self.max_games = int(config.MAX_GAMES)
+        self.evictions = Counter()
+        self._evictor: threading.Thread = None
+        self._metrics_server = None
 
     def _find_or_create_server(self, gid: str, players: list[str]):
         with self._lock:
-            if gid not in self._servers:
-                self._servers[gid] = GameServer(gid, players)
+            server = self._servers.get(gid)
+            if server is None:
+                # Make room first: the new game has no connections until its
+                # first controller registers, so it would look idle
+                self._evict_over_capacity(self.max_games - 1)
+                server = self._servers[gid] = GameServer(gid, players)
                 logger.info(f"created new server for gid {gid} with players {players}")
-            return self._servers[gid]
+            else:
+                self._servers.move_to_end(gid)
+                server.last_active = time.monotonic()
+            return server
+
+    def _evict(self, gid: str, reason: str):
+        # Must be called while holding the lock
+        server = self._servers.pop(gid)
+        logger.info(f"evicting {reason} game {gid} with {server.connection_count} connections")
+        self.evictions[reason] += 1
+        server.close()
+
+    def _evict_over_capacity(self, limit: int = None):
+        # Must be called while holding the lock. Games with nobody connected go first.
+        limit = self.max_games if limit is None else limit
+        while self._servers and len(self._servers) > limit:
+            idle = next((gid for gid, server in self._servers.items() if not server.connection_count), None)
+            self._evict(idle if idle is not None else next(iter(self._servers)), CAPACITY_EVICTION)
+
+    def evict_games(self, now: float = None):
+        """
+        Evicts every game that is finished and past its grace period, or has had no
+        connections for longer than the idle TTL, and enforces the resident game cap.
+        :param now: the current time.monotonic() value
+        :return: None
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            for gid, server in list(self._servers.items()):
+                if server.finished_at is not None and now - server.finished_at >= self.grace_seconds:
+                    self._evict(gid, FINISHED_EVICTION)
+                elif not server.connection_count and now - server.last_active >= self.idle_ttl_seconds:
+                    self._evict(gid, IDLE_EVICTION)
+            self._evict_over_capacity()
+
+    def start_eviction(self):
+        """Starts a daemon thread that calls `evict_games` periodically."""
+        def evict_forever():
+            while True:
+                time.sleep(EVICTION_INTERVAL_SECONDS)
+                self.evict_games()
+
+        self._evictor = threading.Thread(target=evict_forever, name="evictor", daemon=True)
+        self._evictor.start()
+
+    def stats(self) -> dict:
+        """
+        Reports resident games, their estimated memory use, connections and
+        spectators, evictions by reason, and (with authentication enabled) token
+        cache statistics.
+        """
+        with self._lock:
+            servers = list(self._servers.values())
+        stats = {
+            "resident_games": len(servers),
+            "resident_bytes": sum(server.memory_size() for server in servers),
+            "connections": sum(server.connection_count for server in servers),
+            "spectators": sum(server.publisher.spectator_count for server in servers),
+            "evictions": {reason: self.evictions[reason]
+                          for reason in (FINISHED_EVICTION, IDLE_EVICTION, CAPACITY_EVICTION)},
+        }
+        if self.token_cache:
+            stats["token_cache"] = self.token_cache.stats()
+        return stats
+
+    def collect_metrics(self) -> str:
+        """
+        Reports, in the Prometheus text format, the values that `stats` reports
+        (other than memory use, which is costly to estimate) and the depths of
+        the outbound queues. This is called when the metrics are scraped.
+        """
+        with self._lock:
+            servers = list(self._servers.values())
+        depths = [depth for server in servers for depth in server.publisher.queue_depths().values()]
+        parts = [
+            format_metric("battleship_games", "gauge", "Resident games.", [({}, len(servers))]),
+            format_metric("battleship_connections", "gauge", "Connected clients.",
+                          [({}, sum(server.connection_count for server in servers))]),
+            format_metric("battleship_spectators", "gauge", "Connected spectators.",
+                          [({}, sum(server.publisher.spectator_count for server in servers))]),
+            format_metric("battleship_evictions_total", "counter", "Games evicted, by reason.",
+                          [({"reason": reason}, self.evictions[reason])
+                           for reason in (FINISHED_EVICTION, IDLE_EVICTION, CAPACITY_EVICTION)]),
+            format_metric("battleship_outbound_queued_messages", "gauge",
+                          "Messages waiting to be sent, over all clients.", [({}, sum(depths))]),
+            format_metric("battleship_outbound_queue_max_depth", "gauge",
+                          "Messages waiting to be sent to the most backed-up client.", [({}, max(depths, default=0))]),
+        ]
+        if self.token_cache:
+            stats = self.token_cache.stats()
+            parts.append(format_metric("battleship_token_cache_lookups_total", "counter",
+                                       "Token validations, by outcome of the cache lookup.",
+                                       [({"result": result}, stats[result])
+                                        for result in ("hits", "negative_hits", "misses")]))
+        return "".join(parts)
+
+    def start_metrics(self, port: int):
+        """
+        Serves this process's metrics, including those from `collect_metrics`,
+        over HTTP on the given port of METRICS_IP (see metrics.py).
+        """
+        REGISTRY.add_collector(self.collect_metrics)
+        self._metrics_server = start_metrics_server(config.METRICS_IP, port)
 
     def handle_authentication(self, gid: str, token: str):
         try:
-            return self.token_validator.validate(gid, token)
+            return self.token_cache.validate(gid, token)
         except InvalidTokenError:
             return None
 
@@ -58,6 +204,10 @@ class GameListener:
         :return: None
         """
 
+        # Messages to the client are queued and written by a separate thread, so
+        # that publishing an event never waits for this client's socket.
+        connection = QueuedConnection(connection, int(config.OUTBOUND_QUEUE_LIMIT), config.OUTBOUND_QUEUE_POLICY)
+
         # Use the client's specified game ID to get the corresponding GameServer
         # instance. The specified game instance is created if necessary.
         server = self._find_or_create_server(connection.gid, connection.players)
@@ -66,6 +216,22 @@ class GameListener:
         # GameServer instance. Our calling thread doesn't return from this call
         # unless/until the client disconnects or the server is shut down.
         server.handle_connection(connection)
+        connection.close()
+
+    async def handle_connection_async(self, websocket: AuthenticatingProtocol):
+        """
+        This method is invoked by the WebSocket server in asyncio mode, as a task on
+        the event loop, once a client's handshake has been accepted. Rather than
+        dedicating a thread to the client, the task sleeps whenever the client has
+        nothing for us to do.
+        :param websocket: the connected client's WebSocket, carrying the client's claims
+        :return: None
+        """
+        connection = AsyncGameConnection(websocket, websocket.claims,
+                                         queue_limit=int(config.OUTBOUND_QUEUE_LIMIT),
+                                         queue_policy=config.OUTBOUND_QUEUE_POLICY)
+        server = self._find_or_create_server(connection.gid, connection.players)
+        await server.handle_connection_async(connection)
 
     def handle_stop(self):
         """
@@ -85,12 +251,36 @@ class GameListener:
         details, it creates a WsGameListener instance (from the VT ECE 4564 Game Library)
         and runs it. After the WsGameListener is running, we'll get callbacks on the
         handle_connection, handle_authentication, and handle_stop methods as needed.
+        In asyncio mode, a WebSocket server from the `websockets` library runs on an
+        event loop instead, and calls back on handle_connection_async.
         :return:
         """
-        logger.info(f"listening on {self.local_ip}:{self.local_port}")
+        logger.info(f"listening on {self.local_ip}:{self.local_port} in {self.mode} mode")
         logger.info(f"authentication is {'enabled' if self.token_validator else 'disabled'}")
+        self.start_eviction()
+        if config.METRICS_PORT:
+            self.start_metrics(int(config.METRICS_PORT))
+        if self.mode == ASYNC_MODE:
+            # Leaving the serve() context on interrupt closes every client's
+            # WebSocket, which ends each controller's task.
+            try:
+                asyncio.run(self._serve_async())
+            except KeyboardInterrupt:
+                pass
+            return
+
         listener = WsGameListener(self.local_ip, self.local_port,
                                   on_connection=self.handle_connection,
                                   on_authenticate=self.handle_authentication if self.token_validator else None,
                                   on_stop=self.handle_stop)
         listener.run()
+
+    async def _serve_async(self):
+        # Every client is served by a task on this one event loop; the handshake
+        # (including token validation) is done by AuthenticatingProtocol.
+        create_protocol = functools.partial(
+            AuthenticatingProtocol,
+            on_authenticate=self.handle_authentication if self.token_validator else None)
+        async with serve(self.handle_connection_async, self.local_ip, self.local_port,
+                         create_protocol=create_protocol):
+            await asyncio.Future()
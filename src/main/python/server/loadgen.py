@@ -0,0 +1,242 @@
+#
+# loadgen.py
+# A load generator that plays complete games against a running game server
+# over WebSockets, using headless bots that speak the same JSON protocol as
+# the GUI client.
+#
+# Each game gets a unique game ID and two bots, which connect (with the
+# `?uid=&players=` claims accepted when authentication is disabled), place a
+# random fleet, and attack cells in random order whenever it's their turn,
+# chatting now and then, until the game is over. Every bot of a run shares one
+# asyncio event loop, so thousands of connections fit in one process; raise
+# the open file limit (`ulimit -n`) to match.
+#
+# Run it with `python -m server.loadgen --help` (with PYTHONPATH=src/main/python),
+# against a server started with ENABLE_AUTH=False and SERVER_MODE=async (or
+# with SHARDS set). Only those modes accept the `?uid=&players=` claims; in
+# thread mode every bot would join the same game as the same user, so the run
+# stops as soon as a fleet placement is refused.
+#
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import defaultdict
+
+import websockets
+
+import server.config as config
+from model import parse_fleet
+from model.placement_tables import random_fleet
+
+from .chat import CHAT_EVENT
+from .controller import COMMAND_KEY, STATUS_KEY, OK_STATUS, MESSAGE_KEY, \
+    PLACE_SHIPS_COMMAND, ATTACK_COMMAND, CHAT_COMMAND
+from .publisher import BATCH_EVENT, EVENTS_KEY
+
+# Percentiles of command-to-event latency that are reported
+PERCENTILES = (0.5, 0.99, 0.999)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Finds the nearest-rank percentile of already sorted values."""
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, max(0, round(fraction * len(values)) - 1))]
+
+
+class LoadStats:
+    """What the bots of one run have measured."""
+
+    def __init__(self):
+        self.connections = 0
+        self.connect_seconds = 0.0
+        self.last_connected = 0.0
+        self.commands = 0
+        self.errors = 0
+        self.games = 0
+        self.failed_games = 0
+        # command -> seconds from sending it to receiving the event it caused
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+
+
+class LoadError(Exception):
+    """Raised when the server can't be loaded as intended, so the run is stopped."""
+    pass
+
+
+class Bot:
+    """
+    A headless player. `play` places a random fleet and then, whenever a
+    TurnEvent names this bot, attacks the next cell in a shuffled list of the
+    opponent's cells. Every `chat_every` attacks it also sends a chat message.
+    Attacks are timed until their AttackEvent arrives, chat messages until their
+    ChatEvent arrives, and ship placement until its response arrives.
+    """
+
+    def __init__(self, websocket, uid: str, ships: list[dict], cells: list[tuple[int, int]],
+                 chat_every: int, stats: LoadStats):
+        self.websocket = websocket
+        self.uid = uid
+        self.ships = ships
+        self.cells = cells
+        self.chat_every = chat_every
+        self.stats = stats
+        self._attacks = 0
+        self._chats = itertools.count()
+        # (command, key) -> time the command was sent
+        self._pending: dict[tuple[str, object], float] = {}
+
+    async def _send(self, command: dict, key):
+        self._pending[(command[COMMAND_KEY], key)] = time.perf_counter()
+        self.stats.commands += 1
+        await self.websocket.send(json.dumps(command))
+
+    def _arrived(self, command: str, key):
+        sent = self._pending.pop((command, key), None)
+        if sent is not None:
+            self.stats.latencies[command].append(time.perf_counter() - sent)
+
+    async def _attack(self):
+        row, col = self.cells.pop()
+        self._attacks += 1
+        if self.chat_every and self._attacks % self.chat_every == 0:
+            text = f"shot {next(self._chats)}"
+            await self._send({COMMAND_KEY: CHAT_COMMAND, MESSAGE_KEY: text}, f"{self.uid}: {text}")
+        await self._send({COMMAND_KEY: ATTACK_COMMAND, "row": row, "col": col}, (row, col))
+
+    async def play(self):
+        """Plays until the game is over."""
+        await self._send({COMMAND_KEY: PLACE_SHIPS_COMMAND, "ships": self.ships}, None)
+        async for frame in self.websocket:
+            message = json.loads(frame)
+            if STATUS_KEY in message:
+                if message[STATUS_KEY] != OK_STATUS:
+                    self.stats.errors += 1
+                    if (PLACE_SHIPS_COMMAND, None) in self._pending:
+                        raise LoadError(f"{self.uid} couldn't place its fleet ({message}); is the server "
+                                        f"running with ENABLE_AUTH=False in async or sharded mode?")
+                self._arrived(PLACE_SHIPS_COMMAND, None)
+                continue
+            events = message[EVENTS_KEY] if message.get("event") == BATCH_EVENT else [message]
+            for event in events:
+                kind = event.get("event")
+                if kind == "AttackEvent" and event.get("attacker_id") == self.uid:
+                    self._arrived(ATTACK_COMMAND, (event["row"], event["col"]))
+                elif kind == CHAT_EVENT:
+                    self._arrived(CHAT_COMMAND, event.get(MESSAGE_KEY))
+                elif kind == "GameOverEvent":
+                    return
+                elif kind == "TurnEvent" and event.get("player_id") == self.uid:
+                    await self._attack()
+
+
+async def play_game(url: str, gid: str, rows: int, cols: int, fleet, chat_every: int,
+                    rng: random.Random, connecting: asyncio.Semaphore, stats: LoadStats):
+    """Connects two bots to a new game and plays it to the end."""
+    uids = (f"{gid}-a", f"{gid}-b")
+    players = ",".join(uids)
+    websockets_ = []
+    try:
+        # Both bots connect before either places ships, so that both see the first TurnEvent
+        for uid in uids:
+            async with connecting:
+                before = time.perf_counter()
+                websockets_.append(await websockets.connect(f"{url}/{gid}?uid={uid}&players={players}",
+                                                            ping_interval=None, max_size=None))
+                stats.connections += 1
+                stats.connect_seconds += time.perf_counter() - before
+                stats.last_connected = time.perf_counter()
+        bots = []
+        for websocket, uid in zip(websockets_, uids):
+            cells = [(row, col) for row in range(rows) for col in range(cols)]
+            rng.shuffle(cells)
+            bots.append(Bot(websocket, uid, random_fleet(rows, cols, fleet, rng), cells, chat_every, stats))
+        await asyncio.gather(*(bot.play() for bot in bots))
+        stats.games += 1
+    finally:
+        for websocket in websockets_:
+            await websocket.close()
+
+
+async def run(url: str, games: int, concurrency: int, connect_concurrency: int, rows: int, cols: int,
+              fleet, chat_every: int, timeout: float, seed: int) -> dict:
+    """
+    Plays `games` games against the server at `url`, `concurrency` at a time.
+    :return: dict of summary statistics
+    """
+    stats = LoadStats()
+    rng = random.Random(seed)
+    connecting = asyncio.Semaphore(connect_concurrency)
+    playing = asyncio.Semaphore(concurrency)
+    prefix = f"load-{seed}-{int(time.time())}"
+
+    async def play(index: int):
+        async with playing:
+            try:
+                await asyncio.wait_for(play_game(url, f"{prefix}-{index}", rows, cols, fleet, chat_every,
+                                                 rng, connecting, stats), timeout)
+            except (asyncio.TimeoutError, OSError, websockets.WebSocketException):
+                stats.failed_games += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(play(index) for index in range(games)))
+    elapsed = time.perf_counter() - start
+
+    summary = {
+        "games": stats.games,
+        "failed_games": stats.failed_games,
+        "elapsed": elapsed,
+        "connections": stats.connections,
+        "connections_per_second": stats.connections / max(stats.last_connected - start, 1e-9),
+        "connect_ms": stats.connect_seconds / max(stats.connections, 1) * 1e3,
+        "commands": stats.commands,
+        "commands_per_second": stats.commands / elapsed,
+        "errors": stats.errors,
+        "latency_ms": {},
+    }
+    every = sorted(itertools.chain.from_iterable(stats.latencies.values()))
+    for command, latencies in itertools.chain(sorted(stats.latencies.items()), [("all", every)]):
+        latencies = sorted(latencies)
+        summary["latency_ms"][command] = [percentile(latencies, fraction) * 1e3 for fraction in PERCENTILES]
+    return summary
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="play bot games against a running game server "
+                                                 "(ENABLE_AUTH=False, SERVER_MODE=async or SHARDS set)")
+    parser.add_argument("--url", default=f"ws://{config.LOCAL_IP}:{config.WS_LISTENER_PORT}",
+                        help="game server URL, without a game ID")
+    parser.add_argument("-n", "--games", type=int, default=1000, help="number of games to play")
+    parser.add_argument("-c", "--concurrency", type=int, default=1000,
+                        help="games in progress at once (two connections each)")
+    parser.add_argument("--connect-concurrency", type=int, default=100, help="handshakes in progress at once")
+    parser.add_argument("--rows", type=int, default=int(config.BOARD_ROWS), help="number of rows on each board")
+    parser.add_argument("--cols", type=int, default=int(config.BOARD_COLS), help="number of columns on each board")
+    parser.add_argument("--fleet", default=config.FLEET, help="fleet as comma-separated name:size[*count] items")
+    parser.add_argument("--chat-every", type=int, default=20, help="attacks between chat messages (0 for none)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds after which a game counts as failed")
+    parser.add_argument("--seed", type=int, default=0, help="seed for fleets and shots")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    try:
+        summary = asyncio.run(run(args.url, args.games, args.concurrency, args.connect_concurrency, args.rows,
+                                  args.cols, parse_fleet(args.fleet), args.chat_every, args.timeout, args.seed))
+    except LoadError as err:
+        raise SystemExit(f"load generation stopped: {err}")
+
+    print(f"{summary['games']} games ({summary['failed_games']} failed) against {args.url} "
+          f"in {summary['elapsed']:.2f}s")
+    print(f"connections:      {summary['connections']} at {summary['connections_per_second']:.1f}/s "
+          f"({summary['connect_ms']:.2f} ms each)")
+    print(f"commands:         {summary['commands']} at {summary['commands_per_second']:.1f}/s "
+          f"({summary['errors']} errors)")
+    print(f"latency (ms):     {'p50':>10} {'p99':>10} {'p99.9':>10}")
+    for command, values in summary["latency_ms"].items():
+        print(f"  {command:<16}" + "".join(f"{value:>11.2f}" for value in values))
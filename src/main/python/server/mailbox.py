@@ -0,0 +1,94 @@
+#
+# mailbox.py:
+# This module defines the Mailbox class, through which each game's commands
+# reach its model, and the executor that every game's mailbox shares.
+#
+
+import logging
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from threading import Lock
+
+import server.config as config
+
+logger = logging.getLogger(__name__)
+
+# Most commands a mailbox runs before yielding its executor thread to other games
+DRAIN_BATCH_SIZE = 64
+
+_executor: ThreadPoolExecutor = None
+_executor_lock = Lock()
+
+
+def shared_executor() -> ThreadPoolExecutor:
+    """Returns the executor shared by every game's mailbox, with MAILBOX_THREADS threads."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=int(config.MAILBOX_THREADS), thread_name_prefix="mailbox")
+        return _executor
+
+
+class Mailbox:
+    """
+    A serial queue of commands for one game. Commands run one at a time, in the
+    order they were submitted, on a thread of a shared executor, so a game
+    costs a queue rather than a thread of its own. Whenever the queue has
+    commands waiting, exactly one task is scheduled on the executor to drain
+    it; the task runs up to DRAIN_BATCH_SIZE commands and then schedules itself
+    again behind other games' tasks, so a busy game can't starve the others.
+    Each command's effects are visible to the next, whichever thread runs it.
+    """
+
+    def __init__(self, executor: Executor = None):
+        self._executor = executor or shared_executor()
+        self._queue: deque[tuple[Future, callable, tuple]] = deque()
+        self._lock = Lock()
+        self._scheduled = False
+        self._closed = False
+
+    def submit(self, command, *args) -> Future:
+        """
+        Queues a command behind those already submitted.
+        :return: a Future for the command's result
+        :raises RuntimeError: if the mailbox has been shut down
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("cannot submit to a mailbox after shutdown")
+            self._queue.append((future, command, args))
+            if self._scheduled:
+                return future
+            self._scheduled = True
+        self._schedule()
+        return future
+
+    def _schedule(self):
+        try:
+            self._executor.submit(self._drain)
+        except RuntimeError:
+            # The shared executor is gone (the interpreter is exiting)
+            logger.warning("mailbox executor has shut down; dropping queued commands")
+
+    def _drain(self):
+        for _ in range(DRAIN_BATCH_SIZE):
+            with self._lock:
+                if not self._queue:
+                    self._scheduled = False
+                    return
+                future, command, args = self._queue.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = command(*args)
+            except BaseException as err:
+                future.set_exception(err)
+            else:
+                future.set_result(result)
+        self._schedule()
+
+    def shutdown(self):
+        """Refuses further commands. Commands already submitted still run."""
+        with self._lock:
+            self._closed = True
@@ -0,0 +1,239 @@
+#
+# metrics.py:
+# This module defines the game server's metrics and the HTTP endpoint that
+# serves them in the Prometheus text format.
+#
+# Counters and histograms are recorded on the hot paths (every command and
+# every published frame), so recording takes no lock: each thread updates its
+# own copy of a metric's values, and the copies are only added up when the
+# metrics are scraped. Values that already exist elsewhere, such as the number
+# of games, are read by collectors at scrape time instead.
+#
+
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+METRICS_PATH = "/metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds, in seconds, of the buckets for latencies
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# A metric sample: labels (name to value) and the value
+Sample = tuple[dict, float]
+
+
+class _PerThread:
+    """
+    Gives each thread its own dictionary, and lets a scrape read them all. The
+    dictionary is the `values` attribute of `local`; recording code reads it
+    directly, and calls `create` only the first time on each thread.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self._all: list[dict] = []
+        self._lock = threading.Lock()
+
+    def create(self) -> dict:
+        values = self.local.values = {}
+        with self._lock:
+            self._all.append(values)
+        return values
+
+    def all(self) -> list[dict]:
+        with self._lock:
+            return list(self._all)
+
+
+class Counter:
+    """A count that only goes up, optionally broken down by the value of one label."""
+
+    def __init__(self, name: str, help: str, label: str = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values = _PerThread()
+        self._local = self._values.local
+
+    def inc(self, label_value: str = None, amount: float = 1):
+        try:
+            values = self._local.values
+        except AttributeError:
+            values = self._values.create()
+        values[label_value] = values.get(label_value, 0) + amount
+
+    def collect(self) -> str:
+        totals = {}
+        for values in self._values.all():
+            for label_value, value in list(values.items()):
+                totals[label_value] = totals.get(label_value, 0) + value
+        samples = [({self.label: label_value} if self.label else {}, value)
+                   for label_value, value in sorted(totals.items(), key=lambda item: str(item[0]))]
+        return format_metric(self.name, "counter", self.help, samples)
+
+
+class Histogram:
+    """
+    Counts observations (such as latencies) in buckets, optionally broken down
+    by the value of one label.
+    """
+
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS, label: str = None):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.label = label
+        self._series = _PerThread()
+        self._local = self._series.local
+
+    def observe(self, value: float, label_value: str = None):
+        try:
+            counts = self._local.values[label_value]
+        except (AttributeError, KeyError):
+            counts = self._new_series(label_value)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def _new_series(self, label_value) -> list:
+        try:
+            series = self._local.values
+        except AttributeError:
+            series = self._series.create()
+        # a count for each bucket and for +Inf, then the sum of the values
+        counts = series[label_value] = [0] * (len(self.buckets) + 2)
+        return counts
+
+    def collect(self) -> str:
+        totals = {}
+        for series in self._series.all():
+            for label_value, counts in list(series.items()):
+                total = totals.setdefault(label_value, [0] * (len(self.buckets) + 2))
+                for i, count in enumerate(list(counts)):
+                    total[i] += count
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value, counts in sorted(totals.items(), key=lambda item: str(item[0])):
+            labels = {self.label: label_value} if self.label else {}
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(_sample(f"{self.name}_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            lines.append(_sample(f"{self.name}_sum", labels, counts[-1]))
+            lines.append(_sample(f"{self.name}_count", labels, cumulative))
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _sample(name: str, labels: dict, value: float) -> str:
+    if labels:
+        pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+        return f"{name}{{{pairs}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_metric(name: str, kind: str, help: str, samples: Iterable[Sample]) -> str:
+    """Formats a metric and its samples in the Prometheus text format."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    lines.extend(_sample(name, labels, value) for labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+class Registry:
+    """
+    The metrics served by a MetricsServer: recorded metrics, plus collectors
+    that format other values when the metrics are scraped.
+    """
+
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: list[Callable[[], str]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, label: str = None) -> Counter:
+        counter = Counter(name, help, label)
+        self._metrics.append(counter)
+        return counter
+
+    def histogram(self, name: str, help: str, buckets=LATENCY_BUCKETS, label: str = None) -> Histogram:
+        histogram = Histogram(name, help, buckets, label)
+        self._metrics.append(histogram)
+        return histogram
+
+    def add_collector(self, collect: Callable[[], str]):
+        """:param collect: returns metrics formatted with `format_metric`"""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def exposition(self) -> str:
+        with self._lock:
+            collectors = list(self._collectors)
+        parts = [metric.collect() for metric in self._metrics]
+        for collect in collectors:
+            try:
+                parts.append(collect())
+            except Exception as err:
+                logger.error(f"error collecting metrics: {err}")
+        return "".join(parts)
+
+
+# The metrics recorded by this process
+REGISTRY = Registry()
+
+COMMAND_SECONDS = REGISTRY.histogram(
+    "battleship_command_seconds", "Time from receiving a command to having its response.", label="command")
+PUBLISH_SECONDS = REGISTRY.histogram(
+    "battleship_publish_seconds", "Time to hand a published frame to every subscriber.", label="audience")
+GAME_ERRORS = REGISTRY.counter(
+    "battleship_game_errors_total", "Commands refused, by subclass of GameError.", label="error")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: Registry = None
+
+    def do_GET(self):
+        if self.path.split("?")[0] != METRICS_PATH:
+            self.send_error(404)
+            return
+        body = self.registry.exposition().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def start_metrics_server(local_ip: str, port: int, registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """
+    Serves the registry's metrics at METRICS_PATH on a daemon thread.
+    :return: the HTTP server, which can be stopped with `shutdown`, or None if
+        the port can't be used (the game server runs without metrics then)
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    try:
+        server = ThreadingHTTPServer((local_ip, port), handler)
+    except OSError as err:
+        logger.error(f"can't serve metrics on {local_ip}:{port}: {err}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"serving metrics on http://{local_ip}:{server.server_address[1]}{METRICS_PATH}")
+    return server
@@ -0,0 +1,262 @@
+#
+# outbound.py:
+# This module defines the bounded per-client send queues used to deliver
+# responses and events, so that a slow client can't hold up the thread that
+# publishes an event (see GamePublisher).
+#
+
+import json
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable
+
+import websockets
+from gamecomm.server import GameConnection, ConnectionClosedOK, ConnectionClosedError
+from gamecomm.server.game_connection import WsGameConnection
+
+from .wire import JSON_PROTOCOL, decode_request, encode_frame
+
+logger = logging.getLogger(__name__)
+
+# What to do with a client's queued events when its queue is full:
+# discard them all and tell the client to refresh its state,
+RESYNC_POLICY = "resync"
+# replace an older event that a newer one supersedes (falling back to a resync),
+COALESCE_POLICY = "coalesce"
+# or give up on the client and close its connection.
+DISCONNECT_POLICY = "disconnect"
+
+POLICIES = (RESYNC_POLICY, COALESCE_POLICY, DISCONNECT_POLICY)
+
+RESYNC_EVENT = "ResyncEvent"
+
+
+def resync_message(dropped: int) -> dict:
+    return {
+        "event": RESYNC_EVENT,
+        "message": f"{dropped} game events were not delivered; refresh the game state.",
+        "dropped": dropped,
+    }
+
+
+def _encode_json(message: dict) -> str:
+    return encode_frame(message, JSON_PROTOCOL)
+
+
+class OutboundQueue:
+    """
+    A bounded, thread-safe FIFO of encoded frames waiting to be written to one
+    client. Responses (`put`) are never discarded. Events (`put_event`) are
+    subject to the overflow policy once `limit` frames are queued.
+
+    The queue is drained either by a thread blocked in `get`, or by a caller
+    that is told about new frames through the `wakeup` callback and then takes
+    them with `get_nowait`.
+    """
+
+    def __init__(self, limit: int, policy: str = RESYNC_POLICY, wakeup: Callable[[], None] = None,
+                 encode: Callable[[dict], Any] = _encode_json):
+        """
+        :param encode: encodes a message the queue makes up itself (a resync) in
+            the client's wire protocol
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"unknown overflow policy '{policy}'")
+        self.limit = limit
+        self.policy = policy
+        self._wakeup = wakeup
+        self._encode = encode
+        # entries are (frame, coalescing key or None, droppable)
+        self._entries: deque[tuple[str | bytes, Any, bool]] = deque()
+        self._ready = threading.Condition()
+        self.closed = False
+        self.high_water = 0
+        self.dropped = 0
+
+    @property
+    def depth(self) -> int:
+        """The number of frames waiting to be written."""
+        return len(self._entries)
+
+    def put(self, frame):
+        """Queues a frame that must be delivered, such as a response."""
+        with self._ready:
+            self._append((frame, None, False))
+
+    def put_event(self, frame, key=None) -> bool:
+        """
+        Queues an event frame, applying the overflow policy if the queue is full.
+        :param key: events with equal, non-None keys supersede one another, so only
+            the most recent need be delivered
+        :return: False if the client should be disconnected
+        """
+        with self._ready:
+            if len(self._entries) >= self.limit:
+                if self.policy == DISCONNECT_POLICY:
+                    return False
+                if not (self.policy == COALESCE_POLICY and self._coalesce(key)):
+                    self._resync()
+            self._append((frame, key, True))
+        return True
+
+    def _append(self, entry):
+        if self.closed:
+            return
+        self._entries.append(entry)
+        self.high_water = max(self.high_water, len(self._entries))
+        self._ready.notify()
+        if self._wakeup:
+            self._wakeup()
+
+    def _coalesce(self, key) -> bool:
+        # Prefer dropping an event that the new one supersedes, else the oldest
+        # event that some other queued event supersedes.
+        keyed = [i for i, (_, k, droppable) in enumerate(self._entries) if droppable and k is not None]
+        victims = [i for i in keyed if self._entries[i][1] == key] if key is not None else []
+        if not victims:
+            seen = set()
+            for i in reversed(keyed):
+                k = self._entries[i][1]
+                if k in seen:
+                    victims.append(i)
+                seen.add(k)
+            victims.reverse()
+        if not victims:
+            return False
+        del self._entries[victims[0]]
+        self.dropped += 1
+        return True
+
+    def _resync(self):
+        kept = deque(entry for entry in self._entries if not entry[2])
+        dropped = len(self._entries) - len(kept)
+        if not dropped:
+            return
+        self.dropped += dropped
+        self._entries = kept
+        self._entries.append((self._encode(resync_message(dropped)), None, False))
+        logger.warning(f"outbound queue overflow; dropped {dropped} events")
+
+    def get(self, timeout: float = None):
+        """
+        Waits for the next frame.
+        :return: the frame, or None if the timeout expired or the queue was closed
+        """
+        with self._ready:
+            if not self._entries and not self.closed:
+                self._ready.wait(timeout)
+            return self._entries.popleft()[0] if self._entries else None
+
+    def get_nowait(self):
+        """:return: the next frame, or None if the queue is empty"""
+        with self._ready:
+            return self._entries.popleft()[0] if self._entries else None
+
+    def close(self):
+        """Stops accepting frames and wakes any waiting reader; queued frames can still be taken."""
+        with self._ready:
+            self.closed = True
+            self._ready.notify_all()
+        if self._wakeup:
+            self._wakeup()
+
+
+@contextmanager
+def _library_websocket(connection: WsGameConnection):
+    """
+    Gives access to the WebSocket under one of the game library's connections.
+    WsGameConnection only sends objects it encodes as JSON and only receives
+    JSON text, so pre-encoded and binary frames have to bypass it. This is the
+    one place that relies on its private `_connection` attribute (the sync
+    websockets connection it wraps); errors are mapped to the library's own
+    exceptions, as WsGameConnection does.
+    """
+    try:
+        yield connection._connection
+    except websockets.ConnectionClosedError:
+        raise ConnectionClosedError()
+    except websockets.ConnectionClosedOK:
+        raise ConnectionClosedOK()
+
+
+def send_frame(connection: GameConnection, frame):
+    """
+    Sends a message that has already been encoded (as JSON text, or as bytes in
+    the binary protocol), so that the connection doesn't encode it again.
+    """
+    send = getattr(connection, "send_frame", None)
+    if send:
+        send(frame)
+    elif isinstance(connection, WsGameConnection):
+        with _library_websocket(connection) as websocket:
+            websocket.send(frame)
+    else:
+        connection.send(json.loads(frame))
+
+
+def recv_message(connection: GameConnection, timeout: float = None):
+    """
+    Receives a request, which may arrive in a text (JSON) or binary frame.
+    """
+    if not isinstance(connection, WsGameConnection):
+        return connection.recv(timeout)
+    with _library_websocket(connection) as websocket:
+        return decode_request(websocket.recv(timeout))
+
+
+class QueuedConnection(GameConnection):
+    """
+    Wraps a connection served by its own thread (thread mode) so that sends go
+    through an OutboundQueue, written to the client by a separate writer thread.
+    Receiving is passed through to the wrapped connection. Messages are sent
+    using the connection's `wire_protocol`.
+    """
+
+    def __init__(self, connection: GameConnection, limit: int, policy: str = RESYNC_POLICY):
+        super().__init__(connection.claims)
+        self._connection = connection
+        self.wire_protocol = JSON_PROTOCOL
+        self.outbound = OutboundQueue(limit, policy, encode=self._encode)
+        self._disconnected = False
+        self._writer = threading.Thread(target=self._write, name=f"writer-{connection}", daemon=True)
+        self._writer.start()
+
+    def _write(self):
+        while True:
+            frame = self.outbound.get()
+            if frame is None:
+                if self.outbound.closed:
+                    return
+                continue
+            try:
+                send_frame(self._connection, frame)
+            except ConnectionError:
+                # ConnectionClosed is a ConnectionError; the reader will notice too
+                return
+
+    def _encode(self, message: Any):
+        return encode_frame(message, self.wire_protocol)
+
+    def send(self, message: Any) -> None:
+        self.outbound.put(self._encode(message))
+
+    def send_frame(self, frame) -> None:
+        self.outbound.put(frame)
+
+    def recv(self, timeout: int = None) -> Any:
+        if self._disconnected:
+            raise ConnectionClosedOK()
+        return recv_message(self._connection, timeout)
+
+    def close(self):
+        """
+        Stops the writer once it has written what is already queued; the next
+        receive reports the connection as closed.
+        """
+        self._disconnected = True
+        self.outbound.close()
+
+    def __str__(self):
+        return str(self._connection)
@@ -3,66 +3,370 @@
 # This module defines the GamePublisher class.
 #
 
+import base64
 import logging
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
 from threading import Lock
+from typing import Callable
 
 from gamecomm.server import GameConnection
 
-from model import GameEvent, GameOverEvent, TurnEvent, AttackEvent, ShipSunkEvent
+from model import GameEvent, GameOverEvent, TurnEvent, AttackEvent, ShipSunkEvent, SalvoEvent
+
+from .metrics import PUBLISH_SECONDS
+from .outbound import send_frame
+from .wire import encode_frame, wire_protocol
+
+# A frame carrying several events, in the order they were published
+BATCH_EVENT = "EventBatch"
+EVENTS_KEY = "events"
+
+# Every event carries its sequence number in the game under SEQ_KEY
+SEQ_KEY = "seq"
+# Carries the state of the game (see GameModel.view) for a client that has
+# missed events which are no longer kept for replay
+SNAPSHOT_EVENT = "SnapshotEvent"
+STATE_KEY = "state"
+
+# Views of the game's events (see GamePublisher._encode)
+PLAYER_AUDIENCE = "player"
+SPECTATOR_AUDIENCE = "spectator"
+
+# Events that reveal nothing about a board that its owner's opponent doesn't
+# also see, and so may be shown to spectators. Any other event is withheld
+# from them, so a new kind of event is private until it is listed here.
+PUBLIC_EVENTS = (AttackEvent, SalvoEvent, ShipSunkEvent, TurnEvent, GameOverEvent)
+
+# Spectators are sent each frame this many at a time, giving up the processor
+# between batches so a large audience doesn't hold up the game's own thread.
+FANOUT_BATCH_SIZE = 256
 
 
 logger = logging.getLogger(__name__)
 
 
+def _pack_bitmap(data: bytes) -> str:
+    return base64.b64encode(zlib.compress(data)).decode("ascii")
+
+
+class SubscriberSet:
+    """
+    A thread-safe set of subscribers, kept in the order they were added. Adding
+    and removing are O(1). Publishers iterate over `snapshot`, an immutable copy
+    that is only rebuilt after the set changes, rather than copying the set
+    every time they publish.
+    """
+
+    def __init__(self):
+        self._members: dict[GameConnection, None] = {}
+        self._snapshot: tuple[GameConnection, ...] = ()
+        self._lock = Lock()
+
+    def add(self, connection: GameConnection):
+        with self._lock:
+            self._members[connection] = None
+            self._snapshot = None
+
+    def discard(self, connection: GameConnection) -> bool:
+        """:return: True if the connection was a member"""
+        with self._lock:
+            if self._members.pop(connection, self) is self:
+                return False
+            self._snapshot = None
+            return True
+
+    def snapshot(self) -> tuple[GameConnection, ...]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = tuple(self._members)
+                snapshot = self._snapshot
+        return snapshot
+
+    def __len__(self):
+        return len(self._members)
+
+    def __contains__(self, connection):
+        return connection in self._members
+
+
 class GamePublisher:
     """
     A publisher of in-game events to connected clients.
-    An instance of GamePublisher maintains a list of client connection objects
+    An instance of GamePublisher maintains sets of client connection objects
     as subscribers, which are added or removed as part of client connect/disconnect
     handling in GameServer. The `publish_event` method of this class is designed
     to be an observer of GameModel events. When the model invokes the event callback
-    on an instance of this class, the event data is translated to JSON format and
+    on an instance of this class, the event data is translated to JSON format (or
+    the compact binary format, for clients that have chosen it; see wire.py) and
     distributed to subscribers as appropriate.
 
-    Any filtering or other transformation of event data before it is sent to any
+    Every event is numbered in the order it is published, and the most recent
+    are kept so that a client that reconnects can be sent just the events it
+    missed (see `replay`).
+
+    Subscribers are either players or spectators. Players are sent each frame
+    directly by the publishing thread. Spectators see only PUBLIC_EVENTS, and
+    are sent their frames by a separate fan-out thread, in batches, so the time
+    it takes to publish to the players doesn't depend on how many spectators
+    are watching. Each frame is encoded once per audience and wire protocol,
+    and that same frame is sent to every subscriber that shares them.
+
+    Any other filtering or transformation of event data before it is sent to any
     particular client should be implemented in this class. For example, in a card
     game, an event indicating that a card was dealt to a player will include the
     detail of the specific card only when sending the event to the client representing
     the player receiving the card. Other players would be notified that the player
     received a card, without including the specific card detail.
-
-    For the purpose of this sort of filtering, you might want to modify this class
-    so that it keeps track of a player number for each subscriber. The model could
-    include the player number in the event detail, and code in this class could use
-    that information when considering what to deliver to any particular subscriber.
     """
 
-    def __init__(self):
-        self._subscribers: list[GameConnection] = []
-        self._lock = Lock()
+    def __init__(self, replay_size: int = 1024):
+        """
+        :param replay_size: number of recent events kept for replay (see `replay`)
+        """
+        self._players = SubscriberSet()
+        self._spectators = SubscriberSet()
+        self._batch: list[GameEvent] = None
+        # Created when the first spectator arrives
+        self._fanout: ThreadPoolExecutor = None
+        self._fanout_lock = Lock()
+        # The sequence number of the latest event, and the most recent events
+        # with their sequence numbers. Like publishing, these are only used in
+        # the game's mailbox.
+        self.seq = 0
+        self._replay: deque[tuple[int, GameEvent]] = deque(maxlen=replay_size)
 
-    def add_subscriber(self, connection: GameConnection):
-        logger.info(f"adding subscriber {connection}")
-        with self._lock:
-            self._subscribers.append(connection)
+    def add_subscriber(self, connection: GameConnection, spectator: bool = False):
+        logger.info(f"adding {'spectator' if spectator else 'subscriber'} {connection}")
+        if spectator:
+            with self._fanout_lock:
+                if self._fanout is None:
+                    self._fanout = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fanout")
+            self._spectators.add(connection)
+        else:
+            self._players.add(connection)
 
     def remove_subscriber(self, connection: GameConnection):
         logger.info(f"removing subscriber {connection}")
-        with self._lock:
-            self._subscribers.remove(connection)
+        if not self._players.discard(connection):
+            self._spectators.discard(connection)
+
+    @property
+    def spectator_count(self) -> int:
+        return len(self._spectators)
+
+    def close(self):
+        """Stops the fan-out thread, if there is one."""
+        with self._fanout_lock:
+            if self._fanout is not None:
+                self._fanout.shutdown(wait=False)
 
     def publish_event(self, event: GameEvent):
-        logger.info(f"publishing event: {event}")
-        with self._lock:
-            subscribers = list(self._subscribers)
-        for subscriber in subscribers:
-            subscriber.send(self._event_to_json(subscriber, event))
+        """
+        Delivers an event to every subscriber, or adds it to the current batch
+        (see `batch`).
+        """
+        logger.debug("publishing event: %s", event)
+        if self._batch is not None:
+            self._batch.append(event)
+        else:
+            self._publish([event])
+
+    @contextmanager
+    def batch(self):
+        """
+        Collects the events published inside a `with` block (typically, everything
+        one command causes) and delivers them together as a single frame when the
+        block exits. Batches are meant to be opened in the game's mailbox, which
+        is the only place that publishes events; a nested batch joins the
+        enclosing one.
+        """
+        if self._batch is not None:
+            yield
+            return
+        self._batch = []
+        try:
+            yield
+        finally:
+            events, self._batch = self._batch, None
+            if events:
+                self._publish(events)
+
+    def _publish(self, events: list[GameEvent]):
+        numbered = []
+        for event in events:
+            self.seq += 1
+            numbered.append((self.seq, event))
+        self._replay.extend(numbered)
+        started = time.perf_counter()
+        self._fan_out(self._players.snapshot(), self._encode(PLAYER_AUDIENCE, numbered),
+                      self._coalescing_key(events))
+        PUBLISH_SECONDS.observe(time.perf_counter() - started, PLAYER_AUDIENCE)
+        if len(self._spectators):
+            key = self._coalescing_key([event for event in events if isinstance(event, PUBLIC_EVENTS)])
+            self._submit_fan_out(lambda: self._encode(SPECTATOR_AUDIENCE, numbered), key)
+
+    def events_since(self, since: int) -> list[tuple[int, GameEvent]]:
+        """
+        Finds the events published after the event numbered `since`. Like the
+        other methods that use the replay buffer, this must be called in the
+        game's mailbox.
+        :return: the events with their sequence numbers, or None if some of them
+            are no longer kept (or `since` is from the future)
+        """
+        if since == self.seq:
+            return []
+        if since > self.seq or not self._replay or self._replay[0][0] > since + 1:
+            return None
+        return list(islice(self._replay, since + 1 - self._replay[0][0], None))
+
+    def replay(self, subscriber: GameConnection, since: int) -> bool:
+        """
+        Sends a subscriber, as one frame, the events published after the event
+        numbered `since` (see `events_since`).
+        :return: False if some of those events are no longer kept, in which case
+            nothing is sent
+        """
+        missed = self.events_since(since)
+        if missed is None:
+            return False
+        if not missed:
+            return True
+        message = self._encode(self._audience(subscriber), missed)
+        if message is not None:
+            send_frame(subscriber, encode_frame(message, wire_protocol(subscriber)))
+        return True
 
-    def _event_to_json(self, subscriber, event: GameEvent):
-        base = {
-            "event": event.__class__.__name__,
-            "message": event.message,
+    def send_snapshot(self, subscriber: GameConnection, state: dict):
+        """
+        Sends a subscriber the state of the game as of the latest event.
+        :param state: the state as the subscriber may see it (see GameModel.view)
+        """
+        message = {
+            "event": SNAPSHOT_EVENT,
+            SEQ_KEY: self.seq,
+            STATE_KEY: self.state_to_json(state),
         }
+        send_frame(subscriber, encode_frame(message, wire_protocol(subscriber)))
+
+    def publish_message(self, message: dict):
+        """
+        Delivers a message that isn't a model event (such as a chat message) to
+        every subscriber; it is encoded once for each wire protocol in use.
+        """
+        started = time.perf_counter()
+        self._fan_out(self._players.snapshot(), message)
+        PUBLISH_SECONDS.observe(time.perf_counter() - started, PLAYER_AUDIENCE)
+        if len(self._spectators):
+            self._submit_fan_out(lambda: message)
+
+    def send_messages(self, subscriber: GameConnection, messages: list[dict]):
+        """Delivers messages to one subscriber, as a batch if there are several."""
+        message = messages[0] if len(messages) == 1 else {"event": BATCH_EVENT, EVENTS_KEY: messages}
+        self._deliver(subscriber, encode_frame(message, wire_protocol(subscriber)))
+
+    def _fan_out(self, subscribers, message: dict, key=None, frames: dict = None):
+        # frames caches the encoding of message for each protocol
+        frames = {} if frames is None else frames
+        for subscriber in subscribers:
+            protocol = wire_protocol(subscriber)
+            frame = frames.get(protocol)
+            if frame is None:
+                frame = frames[protocol] = encode_frame(message, protocol)
+            self._deliver(subscriber, frame, key)
+
+    def _submit_fan_out(self, build_message: Callable[[], dict], key=None):
+        # Spectators' messages are built, encoded and sent on the fan-out
+        # thread, in the order they were published
+        try:
+            self._fanout.submit(self._fan_out_to_spectators, build_message, key)
+        except RuntimeError:
+            # The game has been shut down
+            pass
+
+    def _fan_out_to_spectators(self, build_message: Callable[[], dict], key):
+        started = time.perf_counter()
+        message = build_message()
+        if message is None:
+            return
+        spectators = self._spectators.snapshot()
+        frames = {}
+        for start in range(0, len(spectators), FANOUT_BATCH_SIZE):
+            if start:
+                time.sleep(0)
+            self._fan_out(spectators[start:start + FANOUT_BATCH_SIZE], message, key, frames)
+        PUBLISH_SECONDS.observe(time.perf_counter() - started, SPECTATOR_AUDIENCE)
+
+    @staticmethod
+    def _deliver(subscriber: GameConnection, frame, key=None):
+        # Subscribers with an outbound queue are written to by their own writer,
+        # so a slow client only ever delays itself.
+        outbound = getattr(subscriber, "outbound", None)
+        if outbound is None:
+            send_frame(subscriber, frame)
+        elif not outbound.put_event(frame, key):
+            logger.warning(f"disconnecting {subscriber}: {outbound.depth} messages waiting to be sent")
+            subscriber.close()
+
+    def queue_depths(self) -> dict[str, int]:
+        """Reports the number of messages waiting to be sent to each queued subscriber."""
+        subscribers = self._players.snapshot() + self._spectators.snapshot()
+        return {str(subscriber): subscriber.outbound.depth
+                for subscriber in subscribers if getattr(subscriber, "outbound", None)}
+
+    @staticmethod
+    def _coalescing_key(events: list[GameEvent]):
+        # A client that has fallen behind only needs the latest turn change, so
+        # a frame whose events are all turn changes is superseded by the next
+        # such frame. A frame that carries anything else (as the batch of an
+        # attack does) is never superseded.
+        keys = {TurnEvent if isinstance(event, TurnEvent) else None for event in events}
+        return keys.pop() if len(keys) == 1 else None
+
+    def _audience(self, subscriber: GameConnection):
+        return SPECTATOR_AUDIENCE if subscriber in self._spectators else PLAYER_AUDIENCE
+
+    def _encode(self, audience, events: list[tuple[int, GameEvent]]) -> dict:
+        """
+        Builds the message that conveys events to an audience.
+        :param events: the events, each with its sequence number
+        :return: the message, or None if the audience may see none of the events
+        """
+        if audience == SPECTATOR_AUDIENCE:
+            events = [(seq, event) for seq, event in events if isinstance(event, PUBLIC_EVENTS)]
+            if not events:
+                return None
+        messages = []
+        for seq, event in events:
+            message = self._event_to_json(audience, event)
+            message[SEQ_KEY] = seq
+            messages.append(message)
+        if len(messages) == 1:
+            return messages[0]
+        return {"event": BATCH_EVENT, EVENTS_KEY: messages}
+
+    @staticmethod
+    def state_to_json(state: dict) -> dict:
+        """
+        Translates a view of the game (see GameModel.view) for sending to a
+        client. The bitmaps are compressed with zlib, which shrinks the mostly
+        empty bitmaps of a large board to a few dozen bytes, and sent as base64.
+        """
+        boards = {}
+        for player_id, board in state["boards"].items():
+            boards[player_id] = dict(board, shots=_pack_bitmap(board["shots"]), hits=_pack_bitmap(board["hits"]))
+        return dict(state, boards=boards)
+
+    def _event_to_json(self, audience, event: GameEvent):
+        # The event's `message` text is left out: clients work from the fields,
+        # and formatting it would cost every event published
+        base = {"event": event.__class__.__name__}
 
         # Include additional fields depending on event type
         if isinstance(event, GameOverEvent):
@@ -81,6 +385,14 @@ class GamePublisher:
             })
         elif isinstance(event, TurnEvent):
             base["player_id"] = event.player_id
+        elif isinstance(event, SalvoEvent):
+            base.update({
+                "attacker_id": event.attacker_id,
+                "shots": [list(shot) for shot in event.shots],
+                "sunk": list(event.sunk),
+                "next_turn": event.next_turn,
+                "winner_id": event.winner_id,
+            })
 
         return base
     
@@ -89,3 +401,4 @@ class GamePublisher:
         Conforms to the GameObserver interface by forwarding events to publish_event().
         """
         self.publish_event(event)
+
@@ -4,13 +4,22 @@
 #
 
 import logging
+import sys
+import time
+from concurrent.futures import Future
 from threading import Lock
 
+import numpy as np
+
 from gamecomm.server import GameConnection
 
-from model import GameModel
+from model import GameModel, SeatError, UnavailableError, parse_fleet
+
+import server.config as config
 
+from .chat import ChatChannel
 from .controller import GameController
+from .mailbox import Mailbox
 from .publisher import GamePublisher
 
 logger = logging.getLogger(__name__)
@@ -33,6 +42,19 @@ class GameServer:
     observer for the GameModel instance, receiving callbacks from the model as game
     events are generated, and distributing those events to connected clients as
     appropriate.
+
+    The model itself has no locks. Controllers don't call it directly; they submit
+    each command to the server's mailbox (see mailbox.py), which applies commands
+    one at a time in the order they were submitted, on a thread of an executor
+    shared by every game. Every model action, and therefore every observer
+    callback, happens in the mailbox, never concurrently with another for the
+    same game, and an idle game holds no thread at all. The events caused by a
+    command are published to clients as a single batch once the command completes.
+
+    Clients whose users aren't among the game's players join as spectators (see
+    `is_spectator`); they receive the public events of the game and may chat.
+    So does a player whose seat has been given to a bot (see `reserve_bot_seat`),
+    since the bot plays under that player's ID.
     """
 
     def __init__(self, gid: str, players: list[str]):
@@ -44,16 +66,29 @@ class GameServer:
         self.gid = gid
         self.players = players
         self._lock = Lock()
+        # Times (from time.monotonic) used to decide when this game can be evicted
+        self.last_active = time.monotonic()
+        self.finished_at = None
+        self.closed = False
+        # Create the mailbox through which every command reaches the model.
+        self.mailbox = Mailbox()
         # Create the publisher that will deliver events to all clients connected to
         # this game server instance.
-        self.publisher = GamePublisher()
+        self.publisher = GamePublisher(replay_size=int(config.REPLAY_BUFFER_SIZE))
+        # Chat messages go out through the same publisher, to the same subscribers.
+        self.chat = ChatChannel(self.publisher, rate=float(config.CHAT_RATE), burst=float(config.CHAT_BURST),
+                                max_length=int(config.CHAT_MAX_LENGTH), history=int(config.CHAT_HISTORY))
         # Create the model instance for the game to be played by clients connected to
         # this GameServer instance. The publisher will observe event notifications from
         # the game model and deliver them to clients as appropriate.
-        self.model = GameModel(observer=self.publisher)
+        self.model = GameModel(observer=self.publisher, fleet=parse_fleet(config.FLEET),
+                               rows=int(config.BOARD_ROWS), cols=int(config.BOARD_COLS),
+                               salvo_size=int(config.SALVO_SIZE) if config.SALVO_SIZE else None)
         # Create a dictionary to map GameConnection objects to the corresponding
         # GameController instances.
         self._controllers: dict[GameConnection, GameController] = {}
+        # IDs of the players whose seats bots have taken
+        self.bot_seats: set[str] = set()
 
     def handle_close(self, connection: GameConnection):
         """
@@ -63,6 +98,7 @@ class GameServer:
         :return: None
         """
         with self._lock:
+            self.last_active = time.monotonic()
             # Remove the mapping from connection to controller
             self._controllers.pop(connection)
             # Remove the connection (as a subscriber) from the publisher
@@ -77,18 +113,100 @@ class GameServer:
         :param connection: a new client connection for this GameServer
         :return: None
         """
+        controller = self._add_controller(connection)
+        # Run the client request handling loop. Our calling thread doesn't return from
+        # this call unless/until the client disconnects or the server is shut down.
+        controller.run()
+
+    async def handle_connection_async(self, connection):
+        """
+        The asyncio mode counterpart of `handle_connection`, invoked by GameListener
+        on its event loop. The returned coroutine completes when the client disconnects
+        or the server is shut down.
+        :param connection: a new client connection (an AsyncGameConnection) for this GameServer
+        :return: None
+        """
+        controller = self._add_controller(connection)
+        try:
+            await controller.run_async()
+        finally:
+            # Let any responses and events still queued for the client go out
+            await connection.flush()
+
+    @staticmethod
+    def is_spectator(connection: GameConnection) -> bool:
+        """
+        A client whose user isn't among the game's listed players can only watch
+        (and chat). When the players aren't known, every client may play.
+        """
+        return bool(connection.players) and connection.uid not in connection.players
+
+    def reserve_bot_seat(self, player_id: str):
+        """
+        Gives a player's seat to a bot, which then plays under that player's ID.
+        From then on, a client connecting as that player only watches.
+        :raises SeatError: if the player is connected
+        """
+        with self._lock:
+            if any(connection.uid == player_id for connection in self._controllers):
+                raise SeatError(f"{player_id} is connected and can't be replaced by a bot")
+            self.bot_seats.add(player_id)
+
+    def release_bot_seat(self, player_id: str):
+        """Gives a seat reserved by `reserve_bot_seat` back to its player."""
+        with self._lock:
+            self.bot_seats.discard(player_id)
+
+    def _add_controller(self, connection) -> GameController:
         # Create a controller for the new client, passing along the connection and model,
-        # and registering our callback to handle client disconnects.
-        controller = GameController(connection, self.model, on_close=self.handle_close)
-        # Put the new controller into our mapping of connection to controller and
-        # add the connection to our publisher as a subscriber.
+        # and registering our callback to handle client disconnects. The seat check
+        # and registration happen under the lock, so a bot can't take the seat of a
+        # player who is connecting at the same time.
         with self._lock:
+            replaced = connection.uid in self.bot_seats
+            if replaced:
+                logger.info(f"{connection.uid}'s seat in game {self.gid} is taken by a bot; joining as a spectator")
+            spectator = replaced or self.is_spectator(connection)
+            controller = GameController(connection, self.model, on_close=self.handle_close,
+                                        submit=self.submit, chat=self.chat, publisher=self.publisher,
+                                        spectator=spectator, reserve_bot_seat=self.reserve_bot_seat,
+                                        release_bot_seat=self.release_bot_seat)
+            # Put the new controller into our mapping of connection to controller and
+            # add the connection to our publisher as a subscriber.
+            self.last_active = time.monotonic()
             self._controllers[connection] = controller
-            self.publisher.add_subscriber(connection)
+            self.publisher.add_subscriber(connection, spectator=spectator)
+        self.chat.send_history(connection)
+        return controller
 
-        # Run the client request handling loop. Our calling thread doesn't return from
-        # this call unless/until the client disconnects or the server is shut down.
-        controller.run()
+    @property
+    def connection_count(self) -> int:
+        return len(self._controllers)
+
+    def submit(self, command, *args) -> Future:
+        """
+        Queues a command for execution in the game's mailbox.
+        :param command: a callable that acts on the model
+        :return: a Future for the command's result
+        :raises GameError: if the game has been shut down
+        """
+        try:
+            return self.mailbox.submit(self._execute, command, *args)
+        except RuntimeError:
+            raise UnavailableError("Game is no longer available") from None
+
+    def _execute(self, command, *args):
+        self.last_active = time.monotonic()
+        try:
+            with self.publisher.batch():
+                return command(*args)
+        finally:
+            if self.model.winner_id is not None and self.finished_at is None:
+                self.finished_at = time.monotonic()
+
+    def memory_size(self) -> int:
+        """Estimates the bytes of memory held by this game's model."""
+        return _deep_sizeof(self.model, set())
 
     def stop(self):
         """
@@ -99,3 +217,37 @@ class GameServer:
         with self._lock:
             for controller in self._controllers.values():
                 controller.stop()
+
+    def close(self):
+        """
+        Stops the server, its mailbox and its fan-out thread, for good. Commands submitted
+        afterwards fail with a GameError.
+        :return: None
+        """
+        self.closed = True
+        self.stop()
+        self.mailbox.shutdown()
+        self.publisher.close()
+
+
+def _deep_sizeof(obj, seen: set) -> int:
+    # Follows containers and object attributes, counting each object once. The
+    # observer is skipped; it isn't part of the game's state.
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj) + (0 if obj.base is None else obj.nbytes)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(key, seen) + _deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__") or hasattr(obj, "__slots__"):
+        attributes = dict(getattr(obj, "__dict__", {}))
+        for name in getattr(type(obj), "__slots__", ()):
+            if hasattr(obj, name):
+                attributes[name] = getattr(obj, name)
+        attributes.pop("observer", None)
+        size += sum(_deep_sizeof(value, seen) for value in attributes.values())
+    return size
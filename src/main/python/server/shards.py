@@ -0,0 +1,312 @@
+#
+# shards.py:
+# This module defines the sharded mode of the game server, in which games are
+# spread across several worker processes so that the server can use more than
+# one core.
+#
+# The parent process is a front acceptor: it accepts each TCP connection, peeks
+# at the WebSocket handshake's request line to learn the game ID, and passes the
+# socket itself (not a copy of its bytes) to the worker that owns that game ID.
+# The worker then performs the handshake and serves the client exactly as an
+# async-mode GameListener would, so the front never touches game traffic.
+#
+
+import asyncio
+import bisect
+import functools
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from urllib.parse import urlparse
+
+from gameauth import TokenValidator
+from websockets.legacy.server import WebSocketServer
+
+import server.config as config
+
+from .async_connection import AuthenticatingProtocol
+from .listener import GameListener, ASYNC_MODE
+from .metrics import Registry, format_metric, start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+# Request path at which the front acceptor reports the health of each shard
+HEALTH_PATH = "/health"
+
+# Longest request line the front acceptor will wait for
+MAX_REQUEST_LINE = 8192
+HANDSHAKE_TIMEOUT_SECONDS = 5.0
+
+# How often workers report their statistics, and the front checks on workers
+REPORT_INTERVAL_SECONDS = 1.0
+
+# Statistics each worker reports in its slots of the shared array
+_GAMES, _CONNECTIONS, _HEARTBEAT = range(3)
+_STATS_PER_SHARD = 3
+
+
+class ShardRing:
+    """
+    A consistent hash ring that maps game IDs to shard numbers. Each shard is
+    placed at many points on the ring, so games are spread evenly, and a game
+    always maps to the same shard for a given shard count.
+    """
+
+    POINTS_PER_SHARD = 64
+
+    def __init__(self, shards: int):
+        points = sorted((self._hash(f"shard-{shard}-{point}"), shard)
+                        for shard in range(shards) for point in range(self.POINTS_PER_SHARD))
+        self._hashes = [h for h, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # Python's hash() of a string differs between processes, so use a digest
+        return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def shard_for(self, gid: str) -> int:
+        i = bisect.bisect(self._hashes, self._hash(gid)) % len(self._hashes)
+        return self._shards[i]
+
+
+def _request_path(line: bytes) -> str:
+    """Extracts the path from an HTTP request line; the game ID is its last segment."""
+    _, target, _ = line.decode("ascii").split(" ", 2)
+    return urlparse(target).path
+
+
+class ShardedListener:
+    """
+    Runs `shards` worker processes, each with its own GameListener in asyncio
+    mode, and routes every client connection to the worker chosen by the
+    consistent hash of its game ID. Both players of a game therefore always
+    land in the same process.
+    """
+
+    def __init__(self, local_ip, local_port, shards: int):
+        self.local_ip = local_ip
+        self.local_port = local_port
+        self.shards = shards
+        self.ring = ShardRing(shards)
+        self._stats = multiprocessing.Array("d", shards * _STATS_PER_SHARD, lock=False)
+        self._workers: list[multiprocessing.Process] = [None] * shards
+        self._channels: list[socket.socket] = [None] * shards
+        self._routed = [0] * shards
+        self._restarts = [0] * shards
+
+    def _start_worker(self, shard: int):
+        parent_end, child_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        worker = multiprocessing.Process(target=run_worker, args=(shard, child_end, self._stats),
+                                         name=f"shard-{shard}", daemon=True)
+        worker.start()
+        child_end.close()
+        if self._channels[shard]:
+            self._channels[shard].close()
+        self._channels[shard] = parent_end
+        self._workers[shard] = worker
+        logger.info(f"started shard {shard} (pid {worker.pid})")
+
+    def health(self) -> dict:
+        """Reports the state of each shard, as served at HEALTH_PATH."""
+        now = time.time()
+        shards = []
+        for shard, worker in enumerate(self._workers):
+            base = shard * _STATS_PER_SHARD
+            heartbeat = self._stats[base + _HEARTBEAT]
+            shards.append({
+                "shard": shard,
+                "pid": worker.pid,
+                "alive": worker.is_alive(),
+                "games": int(self._stats[base + _GAMES]),
+                "connections": int(self._stats[base + _CONNECTIONS]),
+                "routed": self._routed[shard],
+                "restarts": self._restarts[shard],
+                "heartbeat_age": round(now - heartbeat, 3) if heartbeat else None,
+            })
+        return {"shards": shards}
+
+    def collect_metrics(self) -> str:
+        """Reports the health of each shard in the Prometheus text format."""
+        shards = self.health()["shards"]
+
+        def samples(key):
+            return [({"shard": str(shard["shard"])}, float(shard[key] or 0)) for shard in shards]
+
+        return "".join([
+            format_metric("battleship_shard_up", "gauge", "Whether the shard's worker is alive.", samples("alive")),
+            format_metric("battleship_shard_games", "gauge", "Resident games in the shard.", samples("games")),
+            format_metric("battleship_shard_connections", "gauge", "Clients connected to the shard.",
+                          samples("connections")),
+            format_metric("battleship_shard_routed_total", "counter", "Connections routed to the shard.",
+                          samples("routed")),
+            format_metric("battleship_shard_restarts_total", "counter", "Restarts of the shard's worker.",
+                          samples("restarts")),
+            format_metric("battleship_shard_heartbeat_age_seconds", "gauge",
+                          "Time since the shard's worker last reported.", samples("heartbeat_age")),
+        ])
+
+    async def _peek_request_line(self, client: socket.socket) -> bytes:
+        # Peeking leaves the bytes in the socket for the worker's handshake
+        loop = asyncio.get_running_loop()
+        while True:
+            readable = loop.create_future()
+            loop.add_reader(client, readable.set_result, None)
+            try:
+                await readable
+            finally:
+                loop.remove_reader(client)
+            data = client.recv(MAX_REQUEST_LINE, socket.MSG_PEEK)
+            if not data:
+                raise ConnectionError("closed before sending a request")
+            end = data.find(b"\r\n")
+            if end >= 0:
+                return data[:end]
+            if len(data) >= MAX_REQUEST_LINE:
+                raise ValueError("request line too long")
+            # Only part of the line has arrived; give the client a moment
+            await asyncio.sleep(0.01)
+
+    async def _route(self, client: socket.socket):
+        try:
+            line = await asyncio.wait_for(self._peek_request_line(client), HANDSHAKE_TIMEOUT_SECONDS)
+            path = _request_path(line)
+        except (asyncio.TimeoutError, ConnectionError, ValueError, UnicodeDecodeError) as err:
+            logger.warning(f"dropping connection: {err or err.__class__.__name__}")
+            client.close()
+            return
+
+        if path == HEALTH_PATH:
+            await self._send_health(client)
+            return
+
+        gid = path.split("/")[-1]
+        shard = self.ring.shard_for(gid)
+        try:
+            socket.send_fds(self._channels[shard], [b"c"], [client.fileno()])
+            self._routed[shard] += 1
+        except OSError as err:
+            logger.error(f"could not hand connection for gid {gid} to shard {shard}: {err}")
+        # The worker has its own descriptor for the socket now
+        client.close()
+
+    async def _send_health(self, client: socket.socket):
+        body = json.dumps(self.health()).encode("utf-8")
+        response = (b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode("ascii") +
+                    b"\r\nConnection: close\r\n\r\n" + body)
+        try:
+            await asyncio.get_running_loop().sock_sendall(client, response)
+        except OSError:
+            pass
+        client.close()
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(REPORT_INTERVAL_SECONDS)
+            for shard, worker in enumerate(self._workers):
+                if not worker.is_alive():
+                    logger.error(f"shard {shard} (pid {worker.pid}) exited with {worker.exitcode}; restarting")
+                    self._restarts[shard] += 1
+                    self._start_worker(shard)
+
+    async def _serve(self):
+        loop = asyncio.get_running_loop()
+        listener = socket.create_server((self.local_ip, self.local_port), reuse_port=False, backlog=1024)
+        listener.setblocking(False)
+        monitor = loop.create_task(self._monitor())
+        try:
+            while True:
+                client, _ = await loop.sock_accept(listener)
+                loop.create_task(self._route(client))
+        finally:
+            monitor.cancel()
+            listener.close()
+
+    def run(self):
+        """
+        Starts the workers and runs the front acceptor on the calling thread until
+        interrupted.
+        """
+        logger.info(f"listening on {self.local_ip}:{self.local_port} with {self.shards} shards")
+        for shard in range(self.shards):
+            self._start_worker(shard)
+        if config.METRICS_PORT:
+            registry = Registry()
+            registry.add_collector(self.collect_metrics)
+            start_metrics_server(config.METRICS_IP, int(config.METRICS_PORT), registry)
+        try:
+            asyncio.run(self._serve())
+        except KeyboardInterrupt:
+            pass
+        for worker in self._workers:
+            worker.terminate()
+        for worker in self._workers:
+            worker.join()
+
+
+def run_worker(shard: int, channel: socket.socket, stats):
+    """
+    The main function of a shard's worker process: serves the connections that
+    the front acceptor hands over on `channel`.
+    """
+    # An interrupt at the terminal reaches every process in the group; leave it
+    # to the front acceptor, which terminates the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    token_validator = TokenValidator(config.TOKEN_ISSUER_URI, config.PUBLIC_KEY_FILE) if config.ENABLE_AUTH else None
+    listener = GameListener(config.LOCAL_IP, None, token_validator, mode=ASYNC_MODE)
+    listener.start_eviction()
+    if config.METRICS_PORT:
+        listener.start_metrics(int(config.METRICS_PORT) + 1 + shard)
+    asyncio.run(_serve_worker(listener, shard, channel, stats))
+
+
+async def _serve_worker(listener: GameListener, shard: int, channel: socket.socket, stats):
+    loop = asyncio.get_running_loop()
+
+    # Assemble a WebSocket server the way websockets' serve() does, so that
+    # handed-over sockets can be attached to it. Its loopback listener isn't
+    # advertised; the server needs one to report that it is serving.
+    ws_server = WebSocketServer()
+    factory = functools.partial(
+        AuthenticatingProtocol, listener.handle_connection_async, ws_server,
+        on_authenticate=listener.handle_authentication if listener.token_validator else None,
+        host=listener.local_ip, port=None, secure=False)
+    ws_server.wrap(await loop.create_server(factory, "127.0.0.1", 0))
+
+    closed = loop.create_future()
+
+    def receive_connections():
+        try:
+            data, fds, _, _ = socket.recv_fds(channel, 16, 64)
+        except BlockingIOError:
+            return
+        if not data:
+            # The front acceptor has gone away
+            loop.remove_reader(channel)
+            if not closed.done():
+                closed.set_result(None)
+            return
+        for fd in fds:
+            client = socket.socket(fileno=fd)
+            client.setblocking(False)
+            loop.create_task(loop.connect_accepted_socket(factory, client))
+
+    channel.setblocking(False)
+    loop.add_reader(channel, receive_connections)
+    logger.info(f"shard {shard} (pid {os.getpid()}) ready")
+
+    base = shard * _STATS_PER_SHARD
+    while not closed.done():
+        stats[base + _GAMES] = len(listener._servers)
+        stats[base + _CONNECTIONS] = len(ws_server.websockets)
+        stats[base + _HEARTBEAT] = time.time()
+        await asyncio.wait([closed], timeout=REPORT_INTERVAL_SECONDS)
+
+    ws_server.close()
+    await ws_server.wait_closed()
@@ -0,0 +1,98 @@
+#
+# token_cache.py:
+# This module defines the cache of token validation results used by
+# GameListener.
+#
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict
+
+from gameauth import TokenValidator, InvalidTokenError
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCache:
+    """
+    Remembers the outcome of validating a token for a game, so that a client
+    that reconnects (say, every client at once after a network blip) doesn't
+    cost another signature check each time.
+
+    Entries are keyed by a digest of the token, never the token itself, and
+    the game ID. The claims of a valid token are reused until the token's `exp`
+    claim; an invalid token is rejected without another check for
+    `negative_ttl` seconds. At most `max_entries` are kept, least recently used
+    first out. Validation itself happens outside the cache's lock, so a slow
+    check doesn't hold up other lookups.
+    """
+
+    def __init__(self, validator: TokenValidator, max_entries: int, negative_ttl: float):
+        self.validator = validator
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        # entries are (claims, or None if the token is invalid; time it expires)
+        self._entries: OrderedDict[tuple[bytes, str], tuple[Dict, float]] = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(gid: str, token: str) -> tuple[bytes, str]:
+        return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest(), gid
+
+    def validate(self, gid: str, token: str, now: float = None) -> Dict:
+        """
+        Validates a token as TokenValidator.validate does, using a cached outcome
+        when there is one.
+        :returns: dictionary of token claims
+        :raises InvalidTokenError: if the token is deemed invalid
+        """
+        now = time.time() if now is None else now
+        key = self._key(gid, token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                claims, expires = entry
+                if now < expires:
+                    self._entries.move_to_end(key)
+                    if claims is None:
+                        self.negative_hits += 1
+                        raise InvalidTokenError("token previously found invalid")
+                    self.hits += 1
+                    return dict(claims)
+                del self._entries[key]
+            self.misses += 1
+
+        try:
+            claims = self.validator.validate(gid, token)
+        except InvalidTokenError:
+            self._store(key, None, now + self.negative_ttl)
+            raise
+        expires = claims.get("exp")
+        if isinstance(expires, (int, float)):
+            self._store(key, claims, expires)
+        return dict(claims)
+
+    def _store(self, key, claims: Dict, expires: float):
+        with self._lock:
+            self._entries[key] = (claims, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Reports cache size, hits, negative hits, misses and the hit rate."""
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            }
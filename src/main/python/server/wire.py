@@ -0,0 +1,143 @@
+#
+# wire.py:
+# This module defines the compact binary encoding of messages that a client
+# may choose (with the `set_protocol` command) instead of JSON. gui/wire.py
+# in the client is the counterpart of this module.
+#
+# A binary message travels in a binary WebSocket frame; JSON messages always
+# travel in text frames, so either side can tell them apart by frame type. The
+# first byte of a binary message is a tag that identifies its layout. The
+# messages exchanged for every shot have fixed struct layouts (little-endian);
+# anything else is carried as JSON after a JSON_TAG. Each event starts with its
+# sequence number, an unsigned 32-bit integer. Player IDs and ship names are a
+# one-byte length followed by UTF-8 bytes, and rows and columns are unsigned
+# 16-bit integers. Like JSON events, binary events don't carry the events'
+# `message` text.
+#
+
+import json
+import logging
+import struct
+
+logger = logging.getLogger(__name__)
+
+JSON_PROTOCOL = "json"
+BINARY_PROTOCOL = "binary"
+PROTOCOLS = (JSON_PROTOCOL, BINARY_PROTOCOL)
+
+# Commands (client to server)
+ATTACK_TAG = 0x01
+ATTACK_BATCH_TAG = 0x02
+
+# Responses and events (server to client)
+OK_TAG = 0x80
+ATTACK_EVENT_TAG = 0x90
+TURN_EVENT_TAG = 0x91
+SHIP_SUNK_EVENT_TAG = 0x92
+GAME_OVER_EVENT_TAG = 0x93
+BATCH_TAG = 0x94
+
+# Any message, as UTF-8 JSON
+JSON_TAG = 0xFF
+
+RESULTS = ("miss", "hit")
+
+_CELL = struct.Struct("<HH")
+_COUNT = struct.Struct("<H")
+_SEQ = struct.Struct("<I")
+_ATTACK_EVENT = struct.Struct("<HHB")
+
+MAX_ID_BYTES = 255
+
+
+def _pack_string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    if len(data) > MAX_ID_BYTES:
+        raise ValueError("string too long")
+    return bytes((len(data),)) + data
+
+
+def _pack_message(message: dict) -> bytes:
+    event = message.get("event")
+    if event == "AttackEvent" and message["result"] in RESULTS:
+        return (bytes((ATTACK_EVENT_TAG,)) + _SEQ.pack(message["seq"]) + _pack_string(message["attacker_id"])
+                + _ATTACK_EVENT.pack(message["row"], message["col"], RESULTS.index(message["result"])))
+    if event == "TurnEvent":
+        return bytes((TURN_EVENT_TAG,)) + _SEQ.pack(message["seq"]) + _pack_string(message["player_id"])
+    if event == "ShipSunkEvent":
+        return (bytes((SHIP_SUNK_EVENT_TAG,)) + _SEQ.pack(message["seq"]) + _pack_string(message["attacker_id"])
+                + _pack_string(message["ship_name"]))
+    if event == "GameOverEvent":
+        return bytes((GAME_OVER_EVENT_TAG,)) + _SEQ.pack(message["seq"]) + _pack_string(message["winner_id"])
+    if event == "EventBatch":
+        parts = [bytes((BATCH_TAG,)), _COUNT.pack(len(message["events"]))]
+        for item in message["events"]:
+            data = encode_message(item)
+            parts.append(_COUNT.pack(len(data)))
+            parts.append(data)
+        return b"".join(parts)
+    if event is None and message.get("status") == "ok" and len(message) == 1:
+        return bytes((OK_TAG,))
+    raise ValueError("no fixed layout")
+
+
+def encode_message(message: dict) -> bytes:
+    """Encodes a response or event in the binary protocol."""
+    try:
+        return _pack_message(message)
+    except (AttributeError, KeyError, TypeError, ValueError, struct.error):
+        # Anything without a fixed layout (or with values that don't fit it)
+        return bytes((JSON_TAG,)) + json.dumps(message).encode("utf-8")
+
+
+def encode_frame(message: dict, protocol: str):
+    """
+    Encodes a message for a client using the given protocol.
+    :return: text (str) for JSON, bytes for binary
+    """
+    if protocol == BINARY_PROTOCOL:
+        return encode_message(message)
+    return json.dumps(message)
+
+
+def decode_command(data: bytes) -> dict:
+    """
+    Decodes a command sent in the binary protocol.
+    :return: the command in the same form as a JSON command; an empty dict if
+        the data isn't a well-formed binary command
+    """
+    try:
+        tag = data[0]
+        if tag == ATTACK_TAG:
+            row, col = _CELL.unpack_from(data, 1)
+            return {"command": "attack", "row": row, "col": col}
+        if tag == ATTACK_BATCH_TAG:
+            count, = _COUNT.unpack_from(data, 1)
+            cells = [list(_CELL.unpack_from(data, 1 + _COUNT.size + i * _CELL.size)) for i in range(count)]
+            return {"command": "attack_batch", "cells": cells}
+        if tag == JSON_TAG:
+            return json.loads(data[1:].decode("utf-8"))
+    except (IndexError, struct.error, UnicodeDecodeError, json.JSONDecodeError):
+        pass
+    logger.warning(f"ignoring malformed binary command ({len(data)} bytes)")
+    return {}
+
+
+def decode_request(data) -> dict:
+    """
+    Decodes a request from a text (JSON) or binary frame.
+    :return: the request; an empty dict if the frame isn't a well-formed request
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return decode_command(bytes(data))
+    try:
+        request = json.loads(data)
+    except ValueError:
+        logger.warning(f"ignoring malformed JSON request of {len(data)} characters")
+        return {}
+    return request if isinstance(request, dict) else {}
+
+
+def wire_protocol(connection) -> str:
+    """The protocol a client has chosen for the messages sent to it."""
+    return getattr(connection, "wire_protocol", JSON_PROTOCOL)
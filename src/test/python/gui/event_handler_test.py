@@ -0,0 +1,28 @@
+from gui.event_handler import GameEventHandler
+from gui.protocol import BATCH_EVENT, EVENTS_KEY
+
+
+def test_batch_is_unpacked_in_order():
+    handler = GameEventHandler()
+    handler.handle_event({"event": "TurnEvent", "player_id": "player1"})
+    handler.handle_event({"event": BATCH_EVENT, EVENTS_KEY: [
+        {"event": "AttackEvent", "result": "hit"},
+        {"event": "ShipSunkEvent", "ship_name": "Destroyer"},
+        {"event": "TurnEvent", "player_id": "player2"},
+    ]})
+
+    events = handler.pending_events()
+
+    assert [event["event"] for event in events] == ["TurnEvent", "AttackEvent", "ShipSunkEvent", "TurnEvent"]
+    assert handler.pending_events() == []
+
+
+def test_latest_sequence_number_is_remembered():
+    handler = GameEventHandler()
+    handler.handle_event({"event": BATCH_EVENT, EVENTS_KEY: [
+        {"event": "AttackEvent", "result": "hit", "seq": 4},
+        {"event": "TurnEvent", "player_id": "player2", "seq": 5},
+    ]})
+    handler.handle_event({"event": "ChatEvent", "message": "player1: hi"})
+
+    assert handler.last_seq == 5
@@ -1,9 +1,13 @@
+import random
 from typing import Union
 
 import pytest
 
 
-from model import GameModel, GameEvent, HelloEvent
+from model import GameModel, GameEvent, GameError, AttackEvent, ShipSunkEvent, GameOverEvent, TurnEvent, SalvoEvent
+from model import PlacementError, STANDARD_FLEET, parse_fleet, validate_placement
+from model.model import Board, Ship, new_board
+from model.placement import OUT_OF_BOUNDS, OVERLAP, UNKNOWN_SHIP, MISSING_SHIP, MALFORMED
 
 
 class MockObserver:
@@ -24,6 +28,10 @@ class MockObserver:
         """
         self.events.append(event)
 
+    def notify(self, event: GameEvent):
+        """The model invokes observers via `notify`, so this simply delegates."""
+        self.handle_event(event)
+
     def clear(self):
         """Clears the list of previously received events."""
         self.events.clear()
@@ -57,22 +65,430 @@ def event_observer() -> MockObserver:
     return MockObserver()
 
 
+# A two-ship fleet keeps the tests short while still exercising multiple ships.
+TEST_FLEET = (("Destroyer", 2), ("Submarine", 3))
+
+FLEET = [
+    {"name": "Destroyer", "size": 2, "row": 0, "col": 0, "horizontal": True},
+    {"name": "Submarine", "size": 3, "row": 2, "col": 5, "horizontal": False},
+]
+
+
 @pytest.fixture
 def game_model(event_observer: MockObserver):
-    return GameModel(event_observer.handle_event)
+    return GameModel(event_observer, fleet=TEST_FLEET)
+
+
+def start_game(game_model: GameModel):
+    game_model.place_ships("alice", FLEET)
+    game_model.place_ships("bob", FLEET)
 
 
-def test_hello_command(game_model: GameModel, event_observer: MockObserver):
+def test_place_ships_starts_game(game_model: GameModel, event_observer: MockObserver):
     #
-    # This function tests the model's Hello command.
-    # Like most tests of a model, it makes some assertions about the initial
+    # Like most tests of a model, this makes some assertions about the initial
     # state of the model, then it invokes a method on the model. Subsequently,
     # it makes some assertions about the resulting state of the model, and
     # confirms that any expected events were emitted.
     #
-    assert game_model.counter == 0
-    game_model.hello()
-    # The hello command should increment the counter
-    assert game_model.counter == 1
-    # And the hello command should emit a hello event
-    assert event_observer.find_first(HelloEvent) is not None
\ No newline at end of file
+    assert game_model.current_turn is None
+    start_game(game_model)
+    assert game_model.current_turn == "alice"
+    assert event_observer.find_first(TurnEvent).player_id == "alice"
+
+
+def test_attack_hit_sink_and_game_over(game_model: GameModel, event_observer: MockObserver):
+    start_game(game_model)
+    event_observer.clear()
+
+    game_model.attack("alice", 0, 0)
+    attack = event_observer.find_first(AttackEvent)
+    assert (attack.row, attack.col, attack.result) == (0, 0, "hit")
+    assert event_observer.find_first(TurnEvent).player_id == "bob"
+
+    game_model.attack("bob", 9, 9)
+    assert event_observer.find_all(AttackEvent)[-1].result == "miss"
+
+    game_model.attack("alice", 0, 1)
+    assert event_observer.find_first(ShipSunkEvent).ship_name == "Destroyer"
+    assert event_observer.find_first(GameOverEvent) is None
+    assert game_model.winner_id is None
+
+    for row in (2, 3, 4):
+        game_model.attack("bob", 9, row)
+        game_model.attack("alice", row, 5)
+    assert event_observer.find_first(GameOverEvent).winner_id == "alice"
+    assert game_model.winner_id == "alice"
+
+    restored = GameModel(MockObserver())
+    restored.restore(game_model.snapshot())
+    assert restored.winner_id == "alice"
+
+
+def test_attack_errors(game_model: GameModel):
+    start_game(game_model)
+    with pytest.raises(GameError):
+        game_model.attack("bob", 0, 0)
+    game_model.attack("alice", 5, 5)
+    game_model.attack("bob", 5, 5)
+    with pytest.raises(GameError):
+        game_model.attack("alice", 5, 5)
+
+
+@pytest.mark.parametrize("row, col", [("1", 2), (1, 2.0), (None, 0), ([1], 2)])
+def test_attack_on_non_integer_position_is_a_game_error(game_model: GameModel, row, col):
+    start_game(game_model)
+    with pytest.raises(GameError):
+        game_model.attack("alice", row, col)
+    with pytest.raises(GameError):
+        game_model.attack_many("alice", [(0, 0), (row, col)])
+    assert game_model.current_turn == "alice"
+
+
+def test_board_bitmasks():
+    board = Board()
+    board.place_ship(Ship("Destroyer", 2), 1, 1, horizontal=False)
+    with pytest.raises(GameError):
+        board.place_ship(Ship("Cruiser", 3), 2, 0)
+    with pytest.raises(GameError):
+        board.place_ship(Ship("Cruiser", 3), 0, 8)
+
+    result, ship = board.receive_attack(1, 1)
+    assert result == "hit" and not ship.is_sunk()
+    assert board.receive_attack(2, 2) == ("miss", None)
+    assert board.ships_afloat == 1
+    assert board.receive_attack(2, 1)[1].is_sunk()
+    assert board.ships_afloat == 0
+    assert board.all_ships_sunk()
+    assert board.attacks == {(1, 1), (2, 2), (2, 1)}
+    assert ship.hits == {(1, 1), (2, 1)}
+
+
+def test_validate_placement_accepts_standard_fleet():
+    ships = [{"name": name, "size": size, "row": i, "col": 0} for i, (name, size) in enumerate(STANDARD_FLEET)]
+    assert validate_placement(ships, 10, 10) == []
+
+
+def test_validate_placement_reports_every_problem():
+    ships = [
+        {"name": "Destroyer", "size": 2, "row": 0, "col": 9},
+        {"name": "Submarine", "size": 3, "row": 0, "col": 0, "horizontal": False},
+        {"name": "Submarine", "size": 3, "row": 1, "col": 0},
+        {"name": "Tugboat", "size": 1, "row": 5, "col": 5},
+        {"name": "Cruiser", "row": 6, "col": 6},
+    ]
+    rejections = validate_placement(ships, 10, 10, TEST_FLEET)
+    assert [(r.reason, r.index, r.cell) for r in rejections] == [
+        (OUT_OF_BOUNDS, 0, (0, 10)),
+        (UNKNOWN_SHIP, 2, None),
+        (OVERLAP, 2, (1, 0)),
+        (UNKNOWN_SHIP, 3, None),
+        (MALFORMED, 4, None),
+    ]
+
+
+def test_validate_placement_rejects_ill_typed_name_and_orientation():
+    ships = [
+        {"name": ["Destroyer"], "size": 2, "row": 0, "col": 0},
+        {"name": "Destroyer", "size": 2, "row": 0, "col": 0, "horizontal": "yes"},
+        {"name": "Destroyer", "size": 2, "row": 0, "col": 0, "horizontal": False},
+    ]
+    rejections = validate_placement(ships, 10, 10, (("Destroyer", 2),))
+    assert [(r.reason, r.name, r.index) for r in rejections] == [
+        (MALFORMED, None, 0),
+        (MALFORMED, "Destroyer", 1),
+    ]
+
+
+def test_place_ships_rejects_invalid_placement(game_model: GameModel):
+    with pytest.raises(PlacementError) as info:
+        game_model.place_ships("alice", FLEET[:1])
+    assert [r.reason for r in info.value.rejections] == [MISSING_SHIP]
+    assert "alice" not in game_model.players
+
+
+def test_events_are_slotted_and_render_message_lazily():
+    event = AttackEvent("alice", 3, 4, "hit")
+    assert not hasattr(event, "__dict__")
+    assert event._message is None
+    assert event.message == "alice attacked (3, 4) - hit"
+    assert event.message is event.message
+    assert str(TurnEvent("bob")) == "TurnEvent(message=\"It is now bob's turn.\")"
+
+
+def test_parse_fleet():
+    assert parse_fleet("") == STANDARD_FLEET
+    assert parse_fleet("Carrier:5, Destroyer:2*2") == (("Carrier", 5), ("Destroyer", 2), ("Destroyer", 2))
+
+
+def test_large_board_game(event_observer: MockObserver):
+    fleet = parse_fleet("Destroyer:2*100")
+    ships = [{"name": "Destroyer", "size": 2, "row": i * 5, "col": 998, "horizontal": i % 2 == 0}
+             for i in range(100)]
+    game_model = GameModel(event_observer, fleet=fleet, rows=1000, cols=1000)
+    game_model.place_ships("alice", ships)
+    game_model.place_ships("bob", ships)
+
+    game_model.attack("alice", 495, 998)
+    game_model.attack("bob", 999, 999)
+    game_model.attack("alice", 496, 998)
+    assert event_observer.find_first(ShipSunkEvent).ship_name == "Destroyer"
+    assert game_model.players["bob"].ships_afloat == 99
+
+
+@pytest.mark.parametrize("rows,cols", [(10, 10), (200, 300)])
+def test_board_implementations_agree(rows, cols):
+    board = new_board(rows, cols)
+    assert board.rows == rows and board.cols == cols
+    board.place_fleet([
+        {"name": "Destroyer", "size": 2, "row": rows - 1, "col": cols - 2},
+        {"name": "Submarine", "size": 3, "row": 0, "col": 0, "horizontal": False},
+    ])
+    with pytest.raises(GameError):
+        board.place_ship(Ship("Cruiser", 3), 1, 0)
+    with pytest.raises(GameError):
+        board.place_ship(Ship("Cruiser", 3), rows - 1, cols - 1)
+    with pytest.raises(GameError):
+        board.receive_attack(rows, 0)
+
+    assert board.receive_attack(1, 1) == ("miss", None)
+    result, ship = board.receive_attack(rows - 1, cols - 1)
+    assert result == "hit" and ship.name == "Destroyer" and not ship.is_sunk()
+    assert board.receive_attack(rows - 1, cols - 2)[1].is_sunk()
+    for row in range(3):
+        board.receive_attack(row, 0)
+    assert board.all_ships_sunk()
+    assert board.attacks == {(1, 1), (rows - 1, cols - 1), (rows - 1, cols - 2), (0, 0), (1, 0), (2, 0)}
+    hits = int.from_bytes(board.hits_to_bytes(), "little")
+    assert {divmod(i, cols) for i in range(rows * cols) if hits >> i & 1} == \
+        {(rows - 1, cols - 1), (rows - 1, cols - 2), (0, 0), (1, 0), (2, 0)}
+
+
+def test_array_board_used_for_large_boards():
+    from model.array_board import ArrayBoard
+    assert isinstance(new_board(1000, 1000), ArrayBoard)
+    assert isinstance(new_board(10, 10), Board)
+
+
+def test_attack_many_emits_one_event(game_model: GameModel, event_observer: MockObserver):
+    game_model.salvo_size = 3
+    start_game(game_model)
+    event_observer.clear()
+
+    game_model.attack_many("alice", [(0, 0), (0, 1), (9, 9)])
+    assert len(event_observer.events) == 1
+    salvo = event_observer.events[0]
+    assert isinstance(salvo, SalvoEvent)
+    assert salvo.shots == [(0, 0, "hit"), (0, 1, "hit"), (9, 9, "miss")]
+    assert salvo.sunk == ["Destroyer"]
+    assert salvo.next_turn == "bob" and salvo.winner_id is None
+    assert game_model.current_turn == "bob"
+
+    game_model.attack("bob", 0, 0)
+    game_model.attack_many("alice", [(2, 5), (3, 5), (4, 5)])
+    assert event_observer.events[-1].winner_id == "alice"
+    assert "alice wins the game!" in event_observer.events[-1].message
+
+
+def test_attack_many_is_atomic(game_model: GameModel, event_observer: MockObserver):
+    start_game(game_model)
+    game_model.attack("alice", 5, 5)
+    game_model.attack("bob", 5, 5)
+    event_observer.clear()
+    for cells in ([(0, 0), (5, 5)], [(0, 0), (0, 0)], [(0, 0), (10, 0)], []):
+        with pytest.raises(GameError):
+            game_model.attack_many("alice", cells)
+    assert event_observer.events == []
+    assert not game_model.players["bob"].is_attacked(0, 0)
+    assert game_model.current_turn == "alice"
+
+
+def test_salvo_is_capped(game_model: GameModel, event_observer: MockObserver):
+    start_game(game_model)
+    # Without a configured size, a salvo gets one shot per ship afloat
+    with pytest.raises(GameError):
+        game_model.attack_many("alice", [(9, 9), (9, 8), (9, 7)])
+    game_model.salvo_size = 1
+    with pytest.raises(GameError):
+        game_model.attack_many("alice", [(9, 9), (9, 8)])
+    assert not game_model.players["bob"].is_attacked(9, 9)
+
+    game_model.attack_many("alice", [(9, 9)])
+    assert event_observer.events[-1].shots == [(9, 9, "miss")]
+
+
+def test_view_hides_opponent_ships(game_model: GameModel):
+    start_game(game_model)
+    game_model.attack("alice", 0, 0)
+    game_model.attack("bob", 9, 9)
+
+    view = game_model.view("alice")
+    assert view["turn"] == "alice" and view["winner_id"] is None
+    assert view["boards"]["alice"]["ships"][0]["name"] == "Destroyer"
+    assert "ships" not in view["boards"]["bob"]
+    assert int.from_bytes(view["boards"]["bob"]["hits"], "little") == 1
+    assert int.from_bytes(view["boards"]["alice"]["shots"], "little") == 1 << 99
+    assert int.from_bytes(view["boards"]["alice"]["hits"], "little") == 0
+    assert all("ships" not in board for board in game_model.view()["boards"].values())
+
+
+def test_snapshot_and_restore(game_model: GameModel, event_observer: MockObserver):
+    start_game(game_model)
+    game_model.attack("alice", 0, 0)
+    game_model.attack("bob", 9, 9)
+    data = game_model.snapshot()
+    assert len(data) < 100
+
+    restored_observer = MockObserver()
+    restored = GameModel(restored_observer)
+    restored.restore(data)
+    assert restored.snapshot() == data
+    assert restored.fleet == TEST_FLEET
+    assert restored.current_turn == "alice"
+    assert restored.players["bob"].attacks == {(0, 0)}
+    assert restored.players["bob"].ships_afloat == 2
+
+    restored.attack("alice", 0, 1)
+    assert restored_observer.find_first(ShipSunkEvent).ship_name == "Destroyer"
+    with pytest.raises(GameError):
+        restored.attack("bob", 9, 9)
+
+
+def test_snapshot_large_board(event_observer: MockObserver):
+    fleet = parse_fleet("Destroyer:2*3")
+    ships = [{"name": "Destroyer", "size": 2, "row": i, "col": 400} for i in range(3)]
+    game_model = GameModel(event_observer, fleet=fleet, rows=500, cols=500)
+    game_model.place_ships("alice", ships)
+    game_model.place_ships("bob", ships)
+    game_model.attack("alice", 2, 400)
+
+    restored = GameModel(MockObserver())
+    restored.restore(game_model.snapshot())
+    assert restored.snapshot() == game_model.snapshot()
+    assert restored.players["bob"].attacks == {(2, 400)}
+    assert restored.players["bob"].ships[2].hits == {(2, 400)}
+
+
+def test_restore_rejects_bad_snapshot(game_model: GameModel):
+    with pytest.raises(GameError):
+        game_model.restore(b"nonsense")
+    with pytest.raises(GameError):
+        game_model.restore(game_model.snapshot()[:-1] + b"\x80")
+
+
+def test_restore_raises_only_game_error_for_damaged_snapshots(game_model: GameModel):
+    start_game(game_model)
+    game_model.attack("alice", 0, 0)
+    data = game_model.snapshot()
+    rng = random.Random(7)
+    damaged = [data[:end] for end in range(len(data))]
+    for _ in range(500):
+        blob = bytearray(data)
+        for _ in range(rng.randint(1, 3)):
+            blob[rng.randrange(3, len(blob))] = rng.randrange(256)
+        damaged.append(bytes(blob))
+
+    for blob in damaged:
+        try:
+            GameModel(MockObserver()).restore(blob)
+        except GameError:
+            pass
+
+
+@pytest.mark.parametrize("strategies", [("hunt", "random"), ("random", "hunt")])
+def test_simulated_game_runs_to_completion(strategies):
+    from model.sim import play_game
+    result = play_game(strategies, 10, 10, STANDARD_FLEET, seed=1)
+    assert result["winner"] in (0, 1)
+    assert 2 * 17 - 1 <= result["shots"] <= 2 * 100
+
+
+def test_probability_heatmap_updates_match_full_recompute():
+    import random
+    from model.ai import ProbabilityStrategy
+    strategy = ProbabilityStrategy(10, 10, STANDARD_FLEET, random.Random(3))
+    strategy.record(4, 4, "miss")
+    strategy.record(0, 0, "hit")
+    strategy.record(0, 1, "hit", sunk="Destroyer")
+    strategy.record(9, 7, "miss")
+
+    expected = sum(strategy._afloat[length] * strategy._coverage(length) for length in strategy._valid)
+    assert (strategy._density == expected).all()
+    assert strategy._density[4, 4] == 0 and strategy._density[0, 1] == 0
+    assert strategy._afloat[2] == 0 and not strategy._hits
+
+    strategy.record(5, 5, "hit")
+    assert strategy.next_shot() in {(4, 5), (6, 5), (5, 4), (5, 6)}
+
+
+def test_heatmap_stays_exact_when_one_of_two_equal_ships_sinks():
+    from model.ai import ProbabilityStrategy
+    strategy = ProbabilityStrategy(10, 10, STANDARD_FLEET, random.Random(3))
+    strategy.record(7, 3, "miss")
+    for col in range(3):
+        strategy.record(9, col, "hit", sunk="Cruiser" if col == 2 else None)
+
+    assert strategy._afloat[3] == 1
+    expected = sum(strategy._afloat[length] * strategy._coverage(length) for length in strategy._valid)
+    assert (strategy._density == expected).all()
+
+
+def test_bot_that_cannot_join_leaves_observer_alone(game_model: GameModel, event_observer: MockObserver):
+    from model.ai import BotPlayer
+    game_model.place_ships("bob", FLEET)
+
+    with pytest.raises(GameError):
+        BotPlayer(game_model, "bob", random.Random(1)).join()
+    assert game_model.observer is event_observer
+
+
+def test_bots_play_each_other(event_observer: MockObserver):
+    import random
+    from model.ai import BotPlayer
+    game_model = GameModel(event_observer)
+    BotPlayer(game_model, "alice", random.Random(1)).join()
+    BotPlayer(game_model, "bob", random.Random(2)).join()
+    assert event_observer.find_first(GameOverEvent).winner_id in ("alice", "bob")
+    assert len(event_observer.find_all(ShipSunkEvent)) >= 5
+
+
+def test_placement_tables_and_fleet_sampler():
+    import random
+    from model.placement_tables import placement_table, sample_fleets, fleet_ship_data, random_fleet
+    table = placement_table(10, 10, 5)
+    assert len(table) == 2 * 10 * 6
+    assert table.starts[0] == (0, 0, True) and table.masks[0] == 0b11111
+    assert placement_table(10, 10, 5) is table
+
+    choices = sample_fleets(10, 10, STANDARD_FLEET, 500, seed=7)
+    assert choices.shape == (500, len(STANDARD_FLEET))
+    for fleet_choices in choices:
+        assert validate_placement(fleet_ship_data(10, 10, STANDARD_FLEET, fleet_choices), 10, 10) == []
+    assert validate_placement(random_fleet(10, 10, STANDARD_FLEET, random.Random(1)), 10, 10) == []
+
+
+@pytest.mark.parametrize("spec, rows, cols", [("Ship:11", 10, 10), ("Ship:5*21", 10, 10), ("Ship:101", 100, 100)])
+def test_fleet_that_cannot_fit_is_rejected(spec, rows, cols):
+    from model.placement_tables import random_fleet, sample_fleets
+    with pytest.raises(GameError):
+        random_fleet(rows, cols, parse_fleet(spec), random.Random(1))
+    if rows * cols <= 4096:
+        with pytest.raises(GameError):
+            sample_fleets(rows, cols, parse_fleet(spec), 10, seed=1)
+
+
+def test_dense_fleet_is_started_over_rather_than_stuck(monkeypatch, event_observer: MockObserver):
+    from model import placement_tables
+    fleet = parse_fleet("Ship:5*10")
+    game_model = GameModel(event_observer, fleet=fleet)
+    game_model.place_ships("alice", placement_tables.random_fleet(10, 10, fleet, random.Random(1)))
+    for choices in placement_tables.sample_fleets(10, 10, fleet, 20, seed=1):
+        assert not validate_placement(placement_tables.fleet_ship_data(10, 10, fleet, choices), 10, 10, fleet)
+
+    # Out of attempts, placement gives up rather than drawing forever
+    monkeypatch.setattr(placement_tables, "SHIP_ATTEMPTS", 1)
+    monkeypatch.setattr(placement_tables, "FLEET_ATTEMPTS", 1)
+    with pytest.raises(GameError):
+        placement_tables.random_fleet(10, 10, fleet, random.Random(1))
+    with pytest.raises(GameError):
+        placement_tables.sample_fleets(10, 10, fleet, 20, seed=1)
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from model import GameError
+from server.chat import ChatChannel, TokenBucket, CHAT_EVENT
+from server.publisher import GamePublisher, BATCH_EVENT, EVENTS_KEY
+
+
+class MockConnection:
+    def __init__(self):
+        self.frames = []
+
+    def send_frame(self, frame: str):
+        self.frames.append(json.loads(frame))
+
+
+@pytest.fixture
+def publisher() -> GamePublisher:
+    return GamePublisher()
+
+
+def test_token_bucket_allows_burst_then_refills():
+    bucket = TokenBucket(rate=2, burst=3, now=0)
+    assert [bucket.take(now=0) for _ in range(4)] == [True, True, True, False]
+    assert bucket.take(now=0.5)
+    assert not bucket.take(now=0.5)
+
+
+def test_chat_reaches_current_subscribers(publisher: GamePublisher):
+    chat = ChatChannel(publisher, rate=1, burst=5, max_length=20, history=10)
+    alice, bob = MockConnection(), MockConnection()
+    publisher.add_subscriber(alice)
+    publisher.add_subscriber(bob)
+
+    chat.post("alice", "  hello  ")
+    publisher.remove_subscriber(bob)
+    chat.post("alice", "bye")
+
+    assert [frame["message"] for frame in alice.frames] == ["alice: hello", "alice: bye"]
+    assert [frame["message"] for frame in bob.frames] == ["alice: hello"]
+    assert alice.frames[0]["event"] == CHAT_EVENT
+
+
+def test_chat_limits(publisher: GamePublisher):
+    chat = ChatChannel(publisher, rate=0.01, burst=2, max_length=5, history=10)
+    with pytest.raises(GameError):
+        chat.post("alice", "   ")
+    with pytest.raises(GameError):
+        chat.post("alice", "too long")
+    chat.post("alice", "one")
+    chat.post("alice", "two")
+    with pytest.raises(GameError):
+        chat.post("alice", "three")
+    # Each user has their own allowance
+    chat.post("bob", "hi")
+
+
+def test_late_joiner_receives_recent_history(publisher: GamePublisher):
+    chat = ChatChannel(publisher, rate=100, burst=100, max_length=20, history=2)
+    for text in ("one", "two", "three"):
+        chat.post("alice", text)
+
+    late = MockConnection()
+    chat.send_history(late)
+
+    assert late.frames[0]["event"] == BATCH_EVENT
+    assert [event["message"] for event in late.frames[0][EVENTS_KEY]] == ["alice: two", "alice: three"]
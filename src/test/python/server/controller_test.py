@@ -0,0 +1,207 @@
+import asyncio
+import base64
+import json
+import re
+import zlib
+from concurrent.futures import Future
+
+import websockets
+
+from model import GameModel
+from server.async_connection import AsyncGameConnection
+from server.chat import ChatChannel
+from server.controller import GameController
+from server.metrics import GAME_ERRORS
+from server.publisher import GamePublisher
+from server.server import GameServer
+
+FLEET = (("Destroyer", 2),)
+SHIPS = [{"name": "Destroyer", "size": 2, "row": 0, "col": 0}]
+
+
+class MockConnection:
+    def __init__(self, uid: str):
+        self.uid = uid
+        self.gid = "g1"
+        self.players = ["alice", "bob"]
+        self.frames = []
+
+    def send_frame(self, frame):
+        self.frames.append(frame)
+
+
+def run_now(command, *args) -> Future:
+    future = Future()
+    future.set_result(command(*args))
+    return future
+
+
+def make_controller(uid: str, model: GameModel, publisher: GamePublisher, spectator: bool = False):
+    chat = ChatChannel(publisher, rate=1, burst=1, max_length=10, history=1)
+    return GameController(MockConnection(uid), model, on_close=lambda connection: None,
+                          submit=run_now, chat=chat, publisher=publisher, spectator=spectator)
+
+
+def bitmap(data: str) -> int:
+    return int.from_bytes(zlib.decompress(base64.b64decode(data)), "little")
+
+
+def test_get_state_returns_full_view_or_changes_since():
+    publisher = GamePublisher()
+    model = GameModel(publisher, fleet=FLEET)
+    alice = make_controller("alice", model, publisher)
+    model.place_ships("alice", SHIPS)
+    model.place_ships("bob", SHIPS)
+    model.attack("alice", 0, 0)
+
+    state = alice.handle_request({"command": "get_state"})
+    assert state["seq"] == 3
+    boards = state["state"]["boards"]
+    assert bitmap(boards["bob"]["hits"]) == 1 and "ships" not in boards["bob"]
+    assert boards["alice"]["ships"][0]["name"] == "Destroyer"
+
+    model.attack("bob", 9, 9)
+    delta = alice.handle_request({"command": "get_state", "since": 3})
+    assert delta["changes"] == {"alice": [[9, 9, "miss"]], "bob": []}
+    assert delta["seq"] == 5 and delta["turn"] == "alice"
+
+
+def test_spectator_may_only_watch():
+    publisher = GamePublisher()
+    model = GameModel(publisher, fleet=FLEET)
+    watcher = make_controller("carol", model, publisher, spectator=True)
+
+    assert watcher._submit({"command": "attack", "row": 0, "col": 0}).result()["status"] == "error"
+    assert watcher._submit({"command": "get_state"}).result()["status"] == "ok"
+
+
+class FakeWebSocket:
+    """Plays the client's side of a WebSocket: delivers `requests`, then closes."""
+
+    remote_address = ("127.0.0.1", 50000)
+
+    def __init__(self, requests: list):
+        self.requests = list(requests)
+        self.sent = []
+
+    async def recv(self):
+        if not self.requests:
+            raise websockets.ConnectionClosedOK(None, None)
+        return self.requests.pop(0)
+
+    async def send(self, frame):
+        self.sent.append(frame)
+
+    async def close(self):
+        pass
+
+
+def test_run_async_survives_bad_requests_and_cleans_up():
+    server = GameServer("g1", ["alice", "bob"])
+    websocket = FakeWebSocket(["{not json", json.dumps({"command": 5}), json.dumps([1, 2]),
+                               json.dumps({"command": "chat", "message": "hi"})])
+
+    async def serve():
+        connection = AsyncGameConnection(websocket, {"aud": "g1", "sub": "alice", "ply": ["alice", "bob"]})
+        await server.handle_connection_async(connection)
+
+    try:
+        asyncio.run(serve())
+    finally:
+        server.close()
+
+    responses = [json.loads(frame) for frame in websocket.sent if "status" in json.loads(frame)]
+    assert [response["status"] for response in responses] == ["error", "error", "error", "ok"]
+    assert "Command must be a string" in responses[1]["error"]["message"]
+    # After the bad requests, a good one is still served, and the connection is let go at the end
+    assert server.connection_count == 0
+    assert not server.publisher.queue_depths()
+
+
+def test_attack_with_non_integer_cell_is_refused():
+    publisher = GamePublisher()
+    model = GameModel(publisher, fleet=FLEET)
+    alice = make_controller("alice", model, publisher)
+    model.place_ships("alice", SHIPS)
+    model.place_ships("bob", SHIPS)
+
+    for row, col in (("1", 2), (1, 2.0), (None, 2)):
+        response = alice.handle_request({"command": "attack", "row": row, "col": col})
+        assert response["status"] == "error" and "RequestError" in response["error"]["message"]
+    assert model.current_turn == "alice"
+
+
+def test_refusals_are_counted_by_kind():
+    publisher = GamePublisher()
+    model = GameModel(publisher, fleet=FLEET)
+    alice, bob = make_controller("alice", model, publisher), make_controller("bob", model, publisher)
+    model.place_ships("alice", SHIPS)
+    model.place_ships("bob", SHIPS)
+    before = GAME_ERRORS.collect()
+
+    bob.handle_request({"command": "attack", "row": 0, "col": 0})
+    alice.handle_request({"command": "attack", "row": 10, "col": 0})
+    alice.handle_request({"command": "attack", "row": 5, "col": 5})
+    bob.handle_request({"command": "attack", "row": 5, "col": 5})
+    alice.handle_request({"command": "attack", "row": 5, "col": 5})
+
+    def count(kind, text):
+        match = re.search(f'error="{kind}"}} (\\d+)', text)
+        return int(match.group(1)) if match else 0
+
+    after = GAME_ERRORS.collect()
+    for kind in ("TurnError", "OutOfBoundsError", "AlreadyAttackedError"):
+        assert count(kind, after) - count(kind, before) == 1
+
+
+def test_run_async_answers_unexpected_errors_and_keeps_serving(monkeypatch):
+    def broken(self, since=None):
+        raise TypeError("bug")
+
+    monkeypatch.setattr(GameController, "get_state", broken)
+    server = GameServer("g1", ["alice", "bob"])
+    websocket = FakeWebSocket([json.dumps({"command": "get_state"}),
+                               json.dumps({"command": "chat", "message": "hi"})])
+
+    async def serve():
+        connection = AsyncGameConnection(websocket, {"aud": "g1", "sub": "alice", "ply": ["alice", "bob"]})
+        await server.handle_connection_async(connection)
+
+    try:
+        asyncio.run(serve())
+    finally:
+        server.close()
+
+    responses = [json.loads(frame) for frame in websocket.sent if "status" in json.loads(frame)]
+    assert [response["status"] for response in responses] == ["error", "ok"]
+    assert server.connection_count == 0
+
+
+def test_player_replaced_by_bot_can_only_watch():
+    server = GameServer("g1", ["alice", "bob"])
+    try:
+        alice = server._add_controller(MockConnection("alice"))
+        assert alice.handle_request({"command": "add_bot"})["status"] == "ok"
+
+        bob = server._add_controller(MockConnection("bob"))
+
+        assert bob.spectator
+        response = bob._submit({"command": "place_ships", "ships": []}).result(timeout=5)
+        assert response["status"] == "error" and "SeatError" in response["error"]["message"]
+        assert set(server.model.players) == {"bob"}
+    finally:
+        server.close()
+
+
+def test_bot_cannot_take_seat_of_connected_player():
+    server = GameServer("g1", ["alice", "bob"])
+    try:
+        alice = server._add_controller(MockConnection("alice"))
+        server._add_controller(MockConnection("bob"))
+
+        response = alice.handle_request({"command": "add_bot"})
+
+        assert response["status"] == "error" and "SeatError" in response["error"]["message"]
+        assert not server.model.players and not server.bot_seats
+    finally:
+        server.close()
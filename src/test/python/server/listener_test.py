@@ -0,0 +1,86 @@
+import pytest
+
+import server.config as config
+from model import GameError
+from server.listener import GameListener, FINISHED_EVICTION, IDLE_EVICTION, CAPACITY_EVICTION
+from server.metrics import REGISTRY
+
+
+class StoppableController:
+    def stop(self):
+        pass
+
+
+@pytest.fixture
+def listener() -> GameListener:
+    return GameListener("127.0.0.1", 0, None)
+
+
+def test_finished_game_is_evicted_after_grace(listener: GameListener):
+    server = listener._find_or_create_server("g1", ["alice", "bob"])
+    server.finished_at = server.last_active
+
+    listener.evict_games(now=server.finished_at + listener.grace_seconds - 1)
+    assert listener.stats()["resident_games"] == 1
+
+    listener.evict_games(now=server.finished_at + listener.grace_seconds + 1)
+    assert listener.stats()["resident_games"] == 0
+    assert listener.evictions[FINISHED_EVICTION] == 1
+    with pytest.raises(GameError):
+        server.submit(lambda: None)
+
+
+def test_idle_game_is_evicted_after_ttl(listener: GameListener):
+    server = listener._find_or_create_server("g1", None)
+
+    listener.evict_games(now=server.last_active + listener.idle_ttl_seconds + 1)
+
+    assert listener.evictions[IDLE_EVICTION] == 1
+    assert listener._find_or_create_server("g1", None) is not server
+
+
+def test_least_recently_used_game_is_evicted_over_capacity(listener: GameListener):
+    listener.max_games = 2
+    first = listener._find_or_create_server("g1", None)
+    listener._find_or_create_server("g2", None)
+    listener._find_or_create_server("g1", None)
+
+    listener._find_or_create_server("g3", None)
+
+    assert list(listener._servers) == ["g1", "g3"]
+    assert listener._servers["g1"] is first
+    assert listener.evictions[CAPACITY_EVICTION] == 1
+
+
+def test_new_game_is_kept_when_every_resident_game_is_connected(listener: GameListener):
+    listener.max_games = 2
+    for gid in ("g1", "g2"):
+        server = listener._find_or_create_server(gid, None)
+        server._controllers[object()] = StoppableController()
+
+    server = listener._find_or_create_server("g3", None)
+
+    assert list(listener._servers) == ["g2", "g3"]
+    assert not server.closed
+    assert server.submit(lambda: "ok").result(timeout=5) == "ok"
+
+
+def test_stats_report_resident_memory(listener: GameListener):
+    listener._find_or_create_server("g1", None)
+    stats = listener.stats()
+    assert stats["resident_games"] == 1
+    assert stats["resident_bytes"] > 0
+    assert stats["evictions"] == {FINISHED_EVICTION: 0, IDLE_EVICTION: 0, CAPACITY_EVICTION: 0}
+
+
+def test_metrics_are_served_on_metrics_ip_rather_than_local_ip(monkeypatch):
+    monkeypatch.setattr(config, "METRICS_IP", "127.0.0.1")
+    monkeypatch.setattr(REGISTRY, "_collectors", [])
+    listener = GameListener("0.0.0.0", 0, None)
+
+    listener.start_metrics(0)
+    try:
+        assert listener._metrics_server.server_address[0] == "127.0.0.1"
+    finally:
+        listener._metrics_server.shutdown()
+        listener._metrics_server.server_close()
@@ -0,0 +1,38 @@
+import asyncio
+import functools
+
+from websockets.legacy.server import serve
+
+from model import STANDARD_FLEET
+from server.async_connection import AuthenticatingProtocol
+from server.listener import GameListener, ASYNC_MODE
+from server.loadgen import percentile, run
+
+
+def test_percentile_uses_nearest_rank():
+    values = [float(value) for value in range(1, 1001)]
+
+    assert percentile(values, 0.5) == 500.0
+    assert percentile(values, 0.99) == 990.0
+    assert percentile(values, 0.999) == 999.0
+
+
+def test_bots_play_complete_games_against_listener():
+    async def load():
+        listener = GameListener("127.0.0.1", 0, None, mode=ASYNC_MODE)
+        create_protocol = functools.partial(AuthenticatingProtocol, on_authenticate=None)
+        try:
+            async with serve(listener.handle_connection_async, "127.0.0.1", 0,
+                             create_protocol=create_protocol) as ws_server:
+                port = ws_server.sockets[0].getsockname()[1]
+                return await run(f"ws://127.0.0.1:{port}", games=3, concurrency=3, connect_concurrency=2,
+                                 rows=10, cols=10, fleet=STANDARD_FLEET, chat_every=20, timeout=30.0, seed=1)
+        finally:
+            listener.handle_stop()
+
+    summary = asyncio.run(load())
+
+    assert summary["games"] == 3 and summary["failed_games"] == 0
+    assert summary["connections"] == 6
+    assert summary["errors"] == 0
+    assert set(summary["latency_ms"]) == {"attack", "chat", "place_ships", "all"}
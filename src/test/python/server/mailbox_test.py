@@ -0,0 +1,86 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pytest
+
+from server.mailbox import Mailbox, shared_executor
+from server.server import GameServer
+
+
+def test_commands_from_two_players_are_serialized_in_order():
+    executor = ThreadPoolExecutor(max_workers=4)
+    mailbox = Mailbox(executor)
+    applied = []
+    active = 0
+    overlaps = 0
+
+    def command(player, n):
+        nonlocal active, overlaps
+        active += 1
+        if active > 1:
+            overlaps += 1
+        time.sleep(0.0001)
+        applied.append((player, n))
+        active -= 1
+
+    futures = {"alice": [], "bob": []}
+
+    def submit_all(player):
+        for n in range(200):
+            futures[player].append(mailbox.submit(command, player, n))
+
+    players = [threading.Thread(target=submit_all, args=(player,)) for player in futures]
+    for player in players:
+        player.start()
+    for player in players:
+        player.join()
+    wait(futures["alice"] + futures["bob"], timeout=30)
+    executor.shutdown()
+
+    assert overlaps == 0
+    assert len(applied) == 400
+    for player in futures:
+        assert [n for p, n in applied if p == player] == list(range(200))
+
+
+def test_command_errors_reach_only_their_future():
+    mailbox = Mailbox(ThreadPoolExecutor(max_workers=2))
+
+    def fail():
+        raise ValueError("boom")
+
+    failed = mailbox.submit(fail)
+    succeeded = mailbox.submit(lambda: 42)
+
+    with pytest.raises(ValueError):
+        failed.result(timeout=5)
+    assert succeeded.result(timeout=5) == 42
+
+
+def test_shutdown_refuses_new_commands_but_runs_queued_ones():
+    mailbox = Mailbox(ThreadPoolExecutor(max_workers=1))
+    release = threading.Event()
+    blocked = mailbox.submit(release.wait)
+    queued = mailbox.submit(lambda: "ran")
+
+    mailbox.shutdown()
+    with pytest.raises(RuntimeError):
+        mailbox.submit(lambda: None)
+    release.set()
+
+    assert blocked.result(timeout=5)
+    assert queued.result(timeout=5) == "ran"
+
+
+def test_games_share_a_bounded_pool_of_threads():
+    shared_executor()
+    before = threading.active_count()
+    servers = [GameServer(f"g{n}", ["alice", "bob"]) for n in range(50)]
+    try:
+        wait([server.submit(lambda: None) for server in servers], timeout=30)
+        assert len({id(server.mailbox._executor) for server in servers}) == 1
+        assert threading.active_count() - before <= shared_executor()._max_workers
+    finally:
+        for server in servers:
+            server.close()
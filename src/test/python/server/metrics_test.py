@@ -0,0 +1,50 @@
+import threading
+import urllib.request
+
+from server.listener import GameListener, IDLE_EVICTION
+from server.metrics import Counter, Histogram, Registry, start_metrics_server
+
+
+def test_values_recorded_on_each_thread_are_added_up():
+    counter = Counter("errors_total", "Errors.", label="error")
+    histogram = Histogram("latency_seconds", "Latency.", buckets=(0.001, 0.01), label="command")
+
+    def record():
+        for _ in range(1000):
+            counter.inc("GameError")
+            histogram.observe(0.005, "attack")
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    histogram.observe(0.0005, "attack")
+    histogram.observe(1.0, "attack")
+
+    assert 'errors_total{error="GameError"} 4000' in counter.collect()
+    lines = histogram.collect().splitlines()
+    assert 'latency_seconds_bucket{command="attack",le="0.001"} 1' in lines
+    assert 'latency_seconds_bucket{command="attack",le="0.01"} 4001' in lines
+    assert 'latency_seconds_bucket{command="attack",le="+Inf"} 4002' in lines
+    assert 'latency_seconds_count{command="attack"} 4002' in lines
+
+
+def test_listener_metrics_are_served_over_http():
+    listener = GameListener("127.0.0.1", 0, None)
+    server = listener._find_or_create_server("g1", None)
+    listener.evict_games(now=server.last_active + listener.idle_ttl_seconds + 1)
+    listener._find_or_create_server("g2", None)
+    registry = Registry()
+    registry.add_collector(listener.collect_metrics)
+    http_server = start_metrics_server("127.0.0.1", 0, registry)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{http_server.server_address[1]}/metrics") as response:
+            body = response.read().decode("utf-8")
+    finally:
+        http_server.shutdown()
+        listener.handle_stop()
+
+    assert "battleship_games 1" in body.splitlines()
+    assert f'battleship_evictions_total{{reason="{IDLE_EVICTION}"}} 1' in body.splitlines()
+    assert "# TYPE battleship_outbound_queued_messages gauge" in body
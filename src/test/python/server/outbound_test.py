@@ -0,0 +1,83 @@
+import json
+
+from gui import wire as client_wire
+from server.outbound import OutboundQueue, RESYNC_POLICY, COALESCE_POLICY, DISCONNECT_POLICY, RESYNC_EVENT
+from server.wire import BINARY_PROTOCOL, encode_frame
+
+
+def drain(queue: OutboundQueue) -> list[str]:
+    frames = []
+    while (frame := queue.get_nowait()) is not None:
+        frames.append(frame)
+    return frames
+
+
+def test_resync_drops_events_but_keeps_responses():
+    queue = OutboundQueue(3, RESYNC_POLICY)
+    queue.put_event("e1")
+    queue.put("response")
+    queue.put_event("e2")
+    assert queue.depth == 3
+
+    assert queue.put_event("e3")
+
+    frames = drain(queue)
+    assert frames[0] == "response"
+    resync = json.loads(frames[1])
+    assert resync["event"] == RESYNC_EVENT
+    assert resync["dropped"] == 2
+    assert frames[2] == "e3"
+    assert queue.dropped == 2
+    assert queue.high_water == 3
+
+
+def test_coalesce_replaces_superseded_event():
+    queue = OutboundQueue(3, COALESCE_POLICY)
+    queue.put_event("turn1", key="turn")
+    queue.put_event("attack1")
+    queue.put_event("attack2")
+
+    queue.put_event("turn2", key="turn")
+
+    assert drain(queue) == ["attack1", "attack2", "turn2"]
+    assert queue.dropped == 1
+
+
+def test_coalesce_falls_back_to_resync():
+    queue = OutboundQueue(2, COALESCE_POLICY)
+    queue.put_event("attack1")
+    queue.put_event("attack2")
+
+    queue.put_event("attack3")
+
+    frames = drain(queue)
+    assert json.loads(frames[0])["event"] == RESYNC_EVENT
+    assert frames[1] == "attack3"
+
+
+def test_disconnect_policy_rejects_overflow():
+    queue = OutboundQueue(1, DISCONNECT_POLICY)
+    assert queue.put_event("e1")
+    assert not queue.put_event("e2")
+    assert drain(queue) == ["e1"]
+
+
+def test_closed_queue_wakes_reader():
+    queue = OutboundQueue(1)
+    queue.put("last")
+    queue.close()
+    queue.put("ignored")
+    assert queue.get() == "last"
+    assert queue.get() is None
+
+
+def test_resync_is_encoded_in_the_clients_protocol():
+    queue = OutboundQueue(1, RESYNC_POLICY, encode=lambda message: encode_frame(message, BINARY_PROTOCOL))
+    queue.put_event(b"e1")
+
+    queue.put_event(b"e2")
+
+    resync, frame = drain(queue)
+    assert isinstance(resync, bytes)
+    assert client_wire.decode_message(resync)["event"] == RESYNC_EVENT
+    assert frame == b"e2"
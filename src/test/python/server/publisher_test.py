@@ -0,0 +1,223 @@
+import base64
+import json
+import zlib
+
+from model import AttackEvent, TurnEvent
+from model.events import BaseEvent
+from server.outbound import OutboundQueue, COALESCE_POLICY
+from server.publisher import GamePublisher, SubscriberSet, BATCH_EVENT, EVENTS_KEY, SNAPSHOT_EVENT
+from server.wire import BINARY_PROTOCOL
+
+
+class MockConnection:
+    """A stand-in for a client connection that records what was sent to it."""
+
+    def __init__(self, uid: str = None):
+        self.uid = uid
+        self.frames = []
+
+    def send(self, message):
+        self.frames.append(json.dumps(message))
+
+    def send_frame(self, frame):
+        self.frames.append(frame)
+
+
+class PlainConnection:
+    """A connection that only accepts messages to encode."""
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+
+def test_publish_encodes_event_once_per_audience():
+    publisher = GamePublisher()
+    subscribers = [MockConnection("player1"), MockConnection("player2"), MockConnection()]
+    for subscriber in subscribers:
+        publisher.add_subscriber(subscriber)
+
+    publisher.publish_event(AttackEvent("player1", 3, 4, "hit"))
+
+    frame = subscribers[0].frames[0]
+    assert all(subscriber.frames[0] is frame for subscriber in subscribers)
+    assert json.loads(frame) == {
+        "event": "AttackEvent",
+        "attacker_id": "player1",
+        "row": 3,
+        "col": 4,
+        "result": "hit",
+        "seq": 1,
+    }
+
+
+def test_publish_leaves_event_message_unrendered():
+    publisher = GamePublisher()
+    publisher.add_subscriber(MockConnection("player1"))
+    event = AttackEvent("player1", 3, 4, "hit")
+
+    publisher.publish_event(event)
+
+    assert event._message is None
+
+
+def test_publish_decodes_frame_for_connection_without_send_frame():
+    publisher = GamePublisher()
+    subscriber = PlainConnection()
+    publisher.add_subscriber(subscriber)
+
+    publisher.publish_event(AttackEvent("player1", 0, 0, "miss"))
+
+    assert subscriber.messages[0]["result"] == "miss"
+
+
+def test_batch_publishes_one_frame_in_order():
+    publisher = GamePublisher()
+    subscriber = MockConnection("player1")
+    publisher.add_subscriber(subscriber)
+
+    with publisher.batch():
+        publisher.publish_event(AttackEvent("player1", 0, 0, "miss"))
+        with publisher.batch():
+            publisher.publish_event(TurnEvent("player2"))
+        assert subscriber.frames == []
+
+    assert len(subscriber.frames) == 1
+    batch = json.loads(subscriber.frames[0])
+    assert batch["event"] == BATCH_EVENT
+    assert [event["event"] for event in batch[EVENTS_KEY]] == ["AttackEvent", "TurnEvent"]
+
+
+def test_publish_encodes_event_once_per_protocol():
+    publisher = GamePublisher()
+    subscribers = [MockConnection("player1"), MockConnection("player2"), MockConnection()]
+    subscribers[1].wire_protocol = subscribers[2].wire_protocol = BINARY_PROTOCOL
+    for subscriber in subscribers:
+        publisher.add_subscriber(subscriber)
+
+    publisher.publish_event(TurnEvent("player2"))
+
+    assert isinstance(subscribers[0].frames[0], str)
+    assert isinstance(subscribers[1].frames[0], bytes)
+    assert subscribers[2].frames[0] is subscribers[1].frames[0]
+
+
+class PrivateEvent(BaseEvent):
+    """An event that only players may see."""
+
+    def _render_message(self):
+        return "secret"
+
+
+def test_spectators_see_only_public_events():
+    publisher = GamePublisher()
+    player = MockConnection("player1")
+    spectators = [MockConnection(f"watcher{i}") for i in range(3)]
+    publisher.add_subscriber(player)
+    for spectator in spectators:
+        publisher.add_subscriber(spectator, spectator=True)
+
+    with publisher.batch():
+        publisher.publish_event(PrivateEvent())
+        publisher.publish_event(TurnEvent("player1"))
+    publisher.publish_event(PrivateEvent())
+    publisher.publish_message({"event": "ChatEvent", "message": "watcher0: hi"})
+    publisher._fanout.shutdown(wait=True)
+
+    assert len(player.frames) == 3
+    assert json.loads(player.frames[0])["event"] == BATCH_EVENT
+    frame = spectators[0].frames[0]
+    assert all(spectator.frames == [frame, spectators[0].frames[1]] for spectator in spectators)
+    assert json.loads(frame)["event"] == "TurnEvent"
+    assert json.loads(spectators[0].frames[1])["event"] == "ChatEvent"
+
+
+def test_subscriber_set_snapshot_is_reused_until_changed():
+    subscribers = SubscriberSet()
+    a, b = MockConnection("a"), MockConnection("b")
+    subscribers.add(a)
+    subscribers.add(b)
+
+    snapshot = subscribers.snapshot()
+    assert snapshot == (a, b)
+    assert subscribers.snapshot() is snapshot
+
+    assert subscribers.discard(a)
+    assert not subscribers.discard(a)
+    assert subscribers.snapshot() == (b,)
+
+
+def test_replay_sends_missed_events_while_they_are_kept():
+    publisher = GamePublisher(replay_size=3)
+    for player_id in ("p1", "p2", "p1", "p2"):
+        publisher.publish_event(TurnEvent(player_id))
+    subscriber = MockConnection("p1")
+
+    assert publisher.replay(subscriber, 4)
+    assert subscriber.frames == []
+
+    assert publisher.replay(subscriber, 2)
+    batch = json.loads(subscriber.frames[0])
+    assert [event["seq"] for event in batch[EVENTS_KEY]] == [3, 4]
+
+    # Event 2 has left the buffer, and event 5 hasn't happened
+    assert not publisher.replay(subscriber, 0)
+    assert not publisher.replay(subscriber, 5)
+
+
+def test_snapshot_encodes_bitmaps():
+    publisher = GamePublisher()
+    publisher.publish_event(TurnEvent("p1"))
+    subscriber = MockConnection("p1")
+
+    publisher.send_snapshot(subscriber, {"turn": "p1", "boards": {"p1": {"shots": b"\x01", "hits": b"", "sunk": []}}})
+
+    snapshot = json.loads(subscriber.frames[0])
+    assert snapshot["event"] == SNAPSHOT_EVENT and snapshot["seq"] == 1
+    assert zlib.decompress(base64.b64decode(snapshot["state"]["boards"]["p1"]["shots"])) == b"\x01"
+
+
+class QueuedConnection(MockConnection):
+    """A connection whose frames wait in an outbound queue, as a slow client's do."""
+
+    def __init__(self, uid: str, limit: int):
+        super().__init__(uid)
+        self.outbound = OutboundQueue(limit, COALESCE_POLICY)
+
+    def drain(self) -> list[dict]:
+        frames = []
+        while self.outbound.depth:
+            frames.append(json.loads(self.outbound.get()))
+        return frames
+
+
+def test_coalesce_drops_batched_turn_changes_but_keeps_attacks():
+    publisher = GamePublisher()
+    player = QueuedConnection("player1", limit=3)
+    spectator = QueuedConnection("watcher", limit=2)
+    publisher.add_subscriber(player)
+    publisher.add_subscriber(spectator, spectator=True)
+
+    def publish(*events):
+        with publisher.batch():
+            for event in events:
+                publisher.publish_event(event)
+        publisher._fanout.submit(lambda: None).result()
+
+    publish(AttackEvent("player1", 0, 0, "miss"), TurnEvent("player2"))
+    publish(TurnEvent("player1"), TurnEvent("player2"))
+    publish(PrivateEvent(), TurnEvent("player1"))
+    publish(TurnEvent("player2"), TurnEvent("player1"))
+
+    # Only the batches of nothing but turn changes may be superseded
+    frames = player.drain()
+    assert [[event["seq"] for event in frame[EVENTS_KEY]] for frame in frames] == [[1, 2], [5, 6], [7, 8]]
+    assert player.outbound.dropped == 1
+
+    # Spectators don't see the private event, so for them the third frame is
+    # a lone turn change, which is superseded in turn
+    frames = spectator.drain()
+    assert [[event["seq"] for event in frame[EVENTS_KEY]] for frame in frames] == [[1, 2], [7, 8]]
+    assert spectator.outbound.dropped == 2
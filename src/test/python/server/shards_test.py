@@ -0,0 +1,28 @@
+from collections import Counter
+
+from server.shards import ShardRing
+
+
+def test_ring_is_stable_and_balanced():
+    ring = ShardRing(4)
+    gids = [f"game-{i}" for i in range(4000)]
+
+    assignments = [ring.shard_for(gid) for gid in gids]
+
+    same_ring = ShardRing(4)
+    assert assignments == [same_ring.shard_for(gid) for gid in gids]
+    counts = Counter(assignments)
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > 600
+
+
+def test_adding_a_shard_moves_few_games():
+    gids = [f"game-{i}" for i in range(4000)]
+    before = ShardRing(4)
+    after = ShardRing(5)
+
+    moved = [gid for gid in gids if before.shard_for(gid) != after.shard_for(gid)]
+
+    # Only games that now belong to the new shard should move
+    assert all(after.shard_for(gid) == 4 for gid in moved)
+    assert len(moved) < len(gids) / 3
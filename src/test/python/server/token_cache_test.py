@@ -0,0 +1,62 @@
+import pytest
+from gameauth import InvalidTokenError
+
+from server.token_cache import TokenCache
+
+
+class CountingValidator:
+    """A stand-in for TokenValidator that accepts tokens named "good-..."."""
+
+    def __init__(self, exp: float = 1000.0):
+        self.exp = exp
+        self.calls = 0
+
+    def validate(self, gid: str, token: str):
+        self.calls += 1
+        if not token.startswith("good"):
+            raise InvalidTokenError("bad signature")
+        return {"aud": gid, "sub": token, "exp": self.exp}
+
+
+def test_valid_token_is_cached_until_it_expires():
+    validator = CountingValidator(exp=100.0)
+    cache = TokenCache(validator, max_entries=10, negative_ttl=5.0)
+
+    assert cache.validate("g1", "good-a", now=0.0)["sub"] == "good-a"
+    assert cache.validate("g1", "good-a", now=99.0)["sub"] == "good-a"
+    assert validator.calls == 1
+
+    # A different game is a different entry, and an expired entry is checked again
+    cache.validate("g2", "good-a", now=99.0)
+    cache.validate("g1", "good-a", now=100.0)
+    assert validator.calls == 3
+
+
+def test_invalid_token_is_cached_briefly():
+    validator = CountingValidator()
+    cache = TokenCache(validator, max_entries=10, negative_ttl=5.0)
+
+    for now in (0.0, 4.0):
+        with pytest.raises(InvalidTokenError):
+            cache.validate("g1", "forged", now=now)
+    assert validator.calls == 1
+
+    with pytest.raises(InvalidTokenError):
+        cache.validate("g1", "forged", now=5.0)
+    assert validator.calls == 2
+    assert cache.stats() == {"entries": 1, "hits": 0, "negative_hits": 1, "misses": 2, "hit_rate": 0.3333}
+
+
+def test_least_recently_used_entry_is_evicted():
+    validator = CountingValidator()
+    cache = TokenCache(validator, max_entries=2, negative_ttl=5.0)
+    cache.validate("g1", "good-a", now=0.0)
+    cache.validate("g1", "good-b", now=0.0)
+    cache.validate("g1", "good-a", now=0.0)
+
+    cache.validate("g1", "good-c", now=0.0)
+
+    cache.validate("g1", "good-a", now=0.0)
+    assert validator.calls == 3
+    cache.validate("g1", "good-b", now=0.0)
+    assert validator.calls == 4
@@ -0,0 +1,43 @@
+import json
+
+from gui import wire as client_wire
+from server import wire
+
+
+def test_events_round_trip():
+    batch = {
+        "event": "EventBatch",
+        "events": [
+            {"event": "AttackEvent", "attacker_id": "player1", "row": 3, "col": 4, "result": "hit", "seq": 7},
+            {"event": "ShipSunkEvent", "attacker_id": "player1", "ship_name": "Destroyer", "seq": 8},
+            {"event": "TurnEvent", "player_id": "player2", "seq": 9},
+            {"event": "GameOverEvent", "winner_id": "player1", "seq": 70000},
+        ],
+    }
+
+    data = wire.encode_message(batch)
+
+    assert b"attacked" not in data
+    assert len(data) < len(json.dumps(batch)) / 4
+    assert client_wire.decode_message(data) == batch
+
+
+def test_other_messages_fall_back_to_json():
+    response = {"status": "error", "error": {"message": "GameError: Not your turn"}}
+    data = wire.encode_message(response)
+    assert data[0] == wire.JSON_TAG
+    assert client_wire.decode_message(data) == response
+    assert client_wire.decode_message(wire.encode_message({"status": "ok"})) == {"status": "ok"}
+
+
+def test_commands_round_trip():
+    for command in ({"command": "attack", "row": 9, "col": 0},
+                    {"command": "attack_batch", "cells": [[0, 1], [2, 3]]},
+                    {"command": "chat", "message": "hi"}):
+        assert wire.decode_request(client_wire.encode_command(command)) == command
+    assert wire.decode_request(json.dumps({"command": "add_bot"})) == {"command": "add_bot"}
+
+
+def test_malformed_command_decodes_as_empty_request():
+    assert wire.decode_request(bytes((wire.ATTACK_TAG, 1))) == {}
+    assert wire.decode_request(b"") == {}